@@ -0,0 +1,117 @@
+"""
+Latency summaries and JSON baselines shared by the load and micro benchmarks.
+
+A baseline is ``{"meta": {...}, "results": {name: summary}}``. A later run is
+compared against it metric by metric: latencies may not grow and throughput
+may not drop by more than the tolerance.
+"""
+import json
+import platform
+import subprocess
+import sys
+import time
+
+
+# Metric name -> True when bigger is better.
+COMPARED_METRICS = {
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'rps': True,
+    'us_per_op': False,
+}
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(name: str, latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+    """
+    ``latencies`` in seconds; ``elapsed`` is the wall time of the whole scenario.
+    """
+    ordered = sorted(latencies)
+    return dict(
+        scenario=name,
+        requests=len(ordered),
+        errors=errors,
+        rps=round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        p50_ms=round(percentile(ordered, 0.50) * 1000, 3),
+        p95_ms=round(percentile(ordered, 0.95) * 1000, 3),
+        p99_ms=round(percentile(ordered, 0.99) * 1000, 3),
+    )
+
+
+def run_meta(**extra) -> dict:
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return dict(
+        created_at=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        revision=revision,
+        python=platform.python_version(),
+        machine=platform.machine(),
+        **extra,
+    )
+
+
+def save_baseline(path: str, meta: dict, results: list[dict]) -> None:
+    with open(path, 'w') as file:
+        json.dump(dict(meta=meta, results={result['scenario']: result for result in results}), file, indent=2)
+
+
+def compare_baseline(path: str, results: list[dict], tolerance: float) -> list[dict]:
+    """
+    Prints one line per compared metric, returns the regressions.
+    """
+    with open(path) as file:
+        baseline = json.load(file)['results']
+
+    regressions = []
+    for result in results:
+        before = baseline.get(result['scenario'])
+        if before is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in result or not before.get(metric):
+                continue
+            change = (result[metric] - before[metric]) / before[metric]
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            line = dict(
+                scenario=result['scenario'],
+                metric=metric,
+                baseline=before[metric],
+                current=result[metric],
+                change=f'{change:+.1%}',
+                regressed=regressed,
+            )
+            print(json.dumps(line))
+            if regressed:
+                regressions.append(line)
+    return regressions
+
+
+def finish(args, meta: dict, results: list[dict]) -> int:
+    """
+    Saves and/or compares a baseline as asked on the command line, returns the exit code.
+    """
+    if args.save:
+        save_baseline(args.save, meta, results)
+    if args.compare:
+        regressions = compare_baseline(args.compare, results, args.tolerance)
+        for regression in regressions:
+            print(json.dumps(regression), file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+def add_baseline_arguments(parser) -> None:
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a saved baseline, exit 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative change before a regression')
@@ -0,0 +1,231 @@
+"""
+Decode benchmark against a local stand-in redirector.
+
+    python -m benchmarks.decode --requests 500 --concurrency 50
+
+Starts an aiohttp server on localhost whose urls redirect a few times before
+landing on a page with a large body. It checks the LinkResolver behaviour
+first: chains, the HEAD -> GET fallback, the hop cap, unreachable hosts and
+that no body is downloaded. Then it compares the former decode, a new
+session and a full GET per call, with the shared resolver with and without
+its cache, and one-by-one decoding with the batch decode of
+``ShortLinkServise.decode_short_links``.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from benchmarks.env import setup_env
+
+setup_env()
+
+import aiohttp
+from aiohttp import web
+
+from shortener_app.cache import TTLCache
+from shortener_app.link.short_link import dto as schemas
+from shortener_app.link.short_link.cache import get_redirect_cache
+from shortener_app.link.short_link.clicks import get_click_ingestor
+from shortener_app.link.short_link.counter import get_click_counter
+from shortener_app.link.short_link.devices import get_device_classifier
+from shortener_app.link.short_link.resolver import LinkResolver
+from shortener_app.link.short_link.rollup import RollupWriter
+from shortener_app.link.short_link.service import ShortLinkServise
+
+
+BODY = b'x' * (1 << 20)
+
+
+class Redirector:
+    def __init__(self, latency: float = 0) -> None:
+        self.latency = latency
+        self.requests = 0
+        self.body_requests = 0
+
+    @web.middleware
+    async def slow(self, request: web.Request, handler):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.slow])
+        app.router.add_route('*', '/chain/{n}', self.chain)
+        app.router.add_route('*', '/nohead/{n}', self.nohead)
+        app.router.add_route('*', '/loop', self.loop)
+        return app
+
+    async def chain(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        n = int(request.match_info['n'])
+        if n > 0:
+            raise web.HTTPFound(f'/chain/{n - 1}')
+        if request.method == 'GET':
+            self.body_requests += 1
+        return web.Response(body=BODY)
+
+    async def nohead(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        if request.method == 'HEAD':
+            raise web.HTTPMethodNotAllowed('HEAD', ['GET'])
+        raise web.HTTPFound(f"/chain/{request.match_info['n']}")
+
+    async def loop(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        raise web.HTTPFound('/loop')
+
+
+def make_resolver(cache_size: int, args: argparse.Namespace) -> LinkResolver:
+    return LinkResolver(
+        TTLCache(maxsize=cache_size, ttl=300),
+        max_hops=args.max_hops,
+        timeout=5,
+        connect_timeout=1,
+        limit=args.concurrency,
+        limit_per_host=args.concurrency,
+        dns_cache_ttl=300,
+    )
+
+
+async def legacy_decode(url: str) -> str:
+    connector = aiohttp.TCPConnector(ssl=False)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async with session.get(url, allow_redirects=True) as response:
+            return str(response.url)
+
+
+async def check(base: str, redirector: Redirector, args: argparse.Namespace) -> list[str]:
+    resolver = make_resolver(100, args)
+    await resolver.start()
+    failures = []
+
+    def expect(name: str, condition: bool) -> None:
+        print(json.dumps(dict(check=name, ok=condition)))
+        if not condition:
+            failures.append(name)
+
+    resolved = await resolver.resolve(f'{base}/chain/3')
+    expect('chain resolves to the last hop', resolved.url == f'{base}/chain/0' and len(resolved.hops) == 4)
+    expect('no body downloaded', redirector.body_requests == 0)
+
+    resolved = await resolver.resolve(f'{base}/nohead/2')
+    expect('HEAD falls back to GET', resolved.url == f'{base}/chain/0')
+
+    resolved = await resolver.resolve(f'{base}/loop')
+    expect('redirect loop stops at the hop cap', len(resolved.hops) == args.max_hops + 1)
+
+    resolved = await resolver.resolve('http://127.0.0.1:9/unreachable')
+    expect('unreachable host returns the input', resolved.url == 'http://127.0.0.1:9/unreachable' and not resolved.complete)
+
+    before = redirector.requests
+    # /chain/1 and /chain/0 are cached by the first check.
+    await asyncio.gather(*(resolver.resolve(f'{base}/chain/2?fresh=1') for _ in range(20)))
+    await resolver.resolve(f'{base}/chain/2?fresh=2')
+    expect('concurrent and cached lookups share requests', redirector.requests - before == 2)
+
+    await resolver.stop()
+    return failures
+
+
+async def timed(name: str, decode, urls: list[str], concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(url: str) -> None:
+        async with semaphore:
+            await decode(url)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(url) for url in urls))
+    elapsed = time.perf_counter() - started
+    return dict(scenario=name, requests=len(urls), seconds=round(elapsed, 3), per_second=round(len(urls) / elapsed, 1))
+
+
+def make_service(resolver: LinkResolver) -> ShortLinkServise:
+    return ShortLinkServise(
+        redirect_cache=get_redirect_cache(),
+        click_ingestor=get_click_ingestor(),
+        click_counter=get_click_counter(),
+        rollup_writer=RollupWriter(),
+        device_classifier=get_device_classifier(),
+        link_resolver=resolver,
+    )
+
+
+async def compare_batch(port: int, args: argparse.Namespace) -> list[dict]:
+    # Two host names for one server, so the per-host limit has something to split.
+    hosts = (f'http://127.0.0.1:{port}', f'http://localhost:{port}')
+    urls = [f'{hosts[i % 2]}/chain/2?batch={i % args.distinct}' for i in range(args.batch)]
+
+    results = []
+    for name, decode_all in (
+        ('decode one by one', decode_sequentially),
+        (f'batch, concurrency {args.concurrency}, per host {args.per_host}', decode_batch),
+    ):
+        resolver = make_resolver(10_000, args)
+        await resolver.start()
+        started = time.perf_counter()
+        decoded = await decode_all(make_service(resolver), urls, args)
+        elapsed = time.perf_counter() - started
+        await resolver.stop()
+        results.append(dict(scenario=name, urls=len(urls), results=decoded, seconds=round(elapsed, 3)))
+    return results
+
+
+async def decode_sequentially(service: ShortLinkServise, urls: list[str], args: argparse.Namespace) -> int:
+    decoded = 0
+    for url in urls:
+        decoded += await service.decode_short_link(schemas.URLBase(target_url=url)) is not None
+    return decoded
+
+
+async def decode_batch(service: ShortLinkServise, urls: list[str], args: argparse.Namespace) -> int:
+    decoded = 0
+    async for _, result in service.decode_short_links(urls, concurrency=args.concurrency, per_host=args.per_host):
+        decoded += result is not None
+    return decoded
+
+
+async def main(args: argparse.Namespace) -> int:
+    redirector = Redirector(latency=args.latency)
+    runner = web.AppRunner(redirector.app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base = f'http://127.0.0.1:{port}'
+
+    failures = await check(base, redirector, args)
+
+    urls = [f'{base}/chain/{i % 4}?link={i % args.distinct}' for i in range(args.requests)]
+    uncached, cached = make_resolver(0, args), make_resolver(10_000, args)
+    for resolver in (uncached, cached):
+        await resolver.start()
+    results = [
+        await timed('new session + GET per call', legacy_decode, urls, args.concurrency),
+        await timed('shared session, HEAD, no cache', uncached.resolve, urls, args.concurrency),
+        await timed('shared session, HEAD, cached', cached.resolve, urls, args.concurrency),
+    ]
+    for result in results:
+        print(json.dumps(result))
+    for resolver in (uncached, cached):
+        await resolver.stop()
+
+    for result in await compare_batch(port, args):
+        print(json.dumps(result))
+
+    await runner.cleanup()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--distinct', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--max-hops', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds the redirector waits per request')
+    parser.add_argument('--batch', type=int, default=400, help='urls per batch decode, duplicates included')
+    parser.add_argument('--per-host', type=int, default=10)
+    sys.exit(asyncio.run(main(parser.parse_args())))
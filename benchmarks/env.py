@@ -0,0 +1,25 @@
+import os
+
+
+# Settings declares required variables without defaults; benchmarks must be
+# importable without a .env, so fill in harmless placeholders first.
+_DEFAULTS = dict(
+    REDIS_HOST='localhost',
+    REDIS_PORT='6379',
+    API_SECRET='benchmark',
+    HASH_SALT='benchmark',
+    JWT_SECRET='benchmark-secret',
+    ACCESS_TOKEN_TTL='900',
+    REFRESH_TOKEN_TTL='86400',
+    SNOWFLAKE_CODE='1',
+    DB_HOST='localhost',
+    DB_PORT='5432',
+    DB_USER='postgres',
+    DB_PASS='postgres',
+    DB_NAME='postgres',
+)
+
+
+def setup_env() -> None:
+    for key, value in _DEFAULTS.items():
+        os.environ.setdefault(key, value)
@@ -0,0 +1,91 @@
+"""
+JWT sign and verify throughput per algorithm.
+
+    python -m benchmarks.jwt_keys --save jwt.json
+    python -m benchmarks.jwt_keys --compare jwt.json
+
+Writes a fresh RSA 2048, Ed25519 and P-256 key to a temporary key directory
+and times ``JWTAuth`` signing and verifying access tokens with each, next to
+the HS256 secret. ``verify, pem per call`` hands PyJWT the PEM text instead
+of the parsed key, as a verifier without the key ring cache would. Results
+are microseconds per call, baselines work as in ``benchmarks.load``.
+"""
+import argparse
+import dataclasses
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.env import setup_env
+
+setup_env()
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from benchmarks.baseline import add_baseline_arguments, finish, run_meta
+from benchmarks.micro import best_of
+from shortener_app.config import get_settings
+from shortener_app.security.auth.middleware.jwt.base.auth import JWTAuth
+
+
+KEYS = {
+    'RS256': lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    'EdDSA': ed25519.Ed25519PrivateKey.generate,
+    'ES256': lambda: ec.generate_private_key(ec.SECP256R1()),
+}
+PAYLOAD = {'device_id': 'benchmark', 'gen': [0, 0]}
+
+
+def write_keys(directory: Path) -> dict[str, bytes]:
+    public_pems = {}
+    for kid, generate in KEYS.items():
+        key = generate()
+        (directory / f'{kid}.pem').write_bytes(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+        ))
+        public_pems[kid] = key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    return public_pems
+
+
+def cases(directory: Path, public_pems: dict[str, bytes]) -> dict:
+    config = get_settings().jwt_config
+    result = {}
+    for kid in ['HS256', *KEYS]:
+        active_kid = None if kid == 'HS256' else kid
+        jwt_auth = JWTAuth(config=dataclasses.replace(config, keys_dir=str(directory), active_kid=active_kid))
+        token = jwt_auth.generate_access_token(subject='1', payload=PAYLOAD)
+        result[f'{kid} sign'] = lambda jwt_auth=jwt_auth: jwt_auth.generate_access_token(subject='1', payload=PAYLOAD)
+        result[f'{kid} verify'] = lambda jwt_auth=jwt_auth, token=token: jwt_auth.verify_token(token)
+        if active_kid:
+            result[f'{kid} verify, pem per call'] = lambda kid=kid, token=token: jwt.decode(
+                token, public_pems[kid], algorithms=[kid],
+            )
+    return result
+
+
+def main(args: argparse.Namespace) -> int:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        public_pems = write_keys(Path(directory))
+        for name, function in cases(Path(directory), public_pems).items():
+            # RSA signing is two orders slower than the rest, a tenth of the calls is plenty.
+            number = args.number // 10 if name == 'RS256 sign' else args.number
+            result = best_of(name, function, number, args.repeat)
+            result['ops_per_s'] = round(1e6 / result['us_per_op'])
+            print(json.dumps(result))
+            results.append(result)
+    meta = run_meta(number=args.number, repeat=args.repeat)
+    return finish(args, meta, results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    add_baseline_arguments(parser)
+    sys.exit(main(parser.parse_args()))
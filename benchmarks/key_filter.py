@@ -0,0 +1,87 @@
+"""
+Key filter check and micro-benchmark.
+
+    python -m benchmarks.key_filter --keys 1000000 --error-rate 0.001
+
+Fills a ``BloomFilter`` with base62 keys the way the service generates them,
+checks that every added key is reported as present and that a save/load
+round trip keeps the filter intact (exit 1 otherwise), then probes random
+unknown keys: the observed false positive rate should stay close to the
+configured one. Reports memory, build time and microseconds per lookup.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from benchmarks.env import setup_env
+
+setup_env()
+
+from shortener_app.link.short_link.bloom import BloomFilter
+from shortener_app.link.short_link.keys import BASE62_ALPHABET
+
+
+def random_keys(rng: random.Random, count: int, length: int) -> list[str]:
+    return [''.join(rng.choices(BASE62_ALPHABET, k=length)) for _ in range(count)]
+
+
+def timed_lookups(bloom: BloomFilter, keys: list[str]) -> tuple[int, float]:
+    started = time.perf_counter()
+    hits = sum(1 for key in keys if key in bloom)
+    return hits, (time.perf_counter() - started) / len(keys) * 1e6
+
+
+def main(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)
+    keys = random_keys(rng, args.keys, args.length)
+
+    started = time.perf_counter()
+    bloom = BloomFilter(args.keys, args.error_rate)
+    for key in keys:
+        bloom.add(key)
+    build_seconds = time.perf_counter() - started
+
+    sample = keys[:args.probes]
+    known_hits, known_us = timed_lookups(bloom, sample)
+    restored = BloomFilter.from_bytes(bloom.to_bytes())
+    restored_hits = sum(1 for key in sample if key in restored)
+
+    # A longer length than the stored keys, so none of the probes can be a real member.
+    unknown = random_keys(rng, args.probes, args.length + 1)
+    false_positives, unknown_us = timed_lookups(bloom, unknown)
+
+    failures = []
+    if known_hits != len(sample):
+        failures.append(dict(check='known keys', missing=len(sample) - known_hits))
+    if restored_hits != len(sample) or restored.count != bloom.count:
+        failures.append(dict(check='save/load', missing=len(sample) - restored_hits))
+
+    print(json.dumps(dict(
+        keys=args.keys,
+        distinct_keys=bloom.count,
+        bytes=bloom.size_bytes,
+        bits_per_key=round(bloom.size_bytes * 8 / args.keys, 2),
+        build_seconds=round(build_seconds, 3),
+    )))
+    print(json.dumps(dict(
+        configured_error_rate=args.error_rate,
+        expected_error_rate=round(bloom.false_positive_rate(), 6),
+        observed_error_rate=round(false_positives / len(unknown), 6),
+    )))
+    print(json.dumps(dict(scenario='known key', us_per_lookup=round(known_us, 3))))
+    print(json.dumps(dict(scenario='unknown key', us_per_lookup=round(unknown_us, 3))))
+    for failure in failures:
+        print(json.dumps(failure), file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=1_000_000)
+    parser.add_argument('--error-rate', type=float, default=0.001)
+    parser.add_argument('--probes', type=int, default=200_000)
+    parser.add_argument('--length', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=1)
+    sys.exit(main(parser.parse_args()))
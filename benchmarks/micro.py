@@ -0,0 +1,91 @@
+"""
+Micro-benchmarks of the per-request helpers.
+
+    python -m benchmarks.micro --save micro.json
+    python -m benchmarks.micro --compare micro.json
+
+Times random and snowflake key generation, JWT signing and verification,
+the auth cache lookup that replaces verification on repeated tokens, and
+user agent classification with and without the LRU. Every case runs
+``--repeat`` rounds of ``--number`` calls; the best round is reported in
+microseconds per call. Baselines work as in ``benchmarks.load``.
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+import time
+
+from benchmarks.env import setup_env
+
+setup_env()
+
+from benchmarks.baseline import add_baseline_arguments, finish, run_meta
+from benchmarks.user_agents import CORPUS
+from shortener_app.config import get_settings
+from shortener_app.link.short_link.devices import DeviceClassifier, classify_user_agent
+from shortener_app.link.short_link.keys import SnowflakeKeyEncoder
+from shortener_app.link.short_link.service import ShortLinkServise
+from shortener_app.security.auth.middleware.jwt.base.auth import JWTAuth
+from shortener_app.security.auth.middleware.jwt.cache import AuthCache
+
+
+def best_of(name: str, function, number: int, repeat: int) -> dict:
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        rounds.append(time.perf_counter() - started)
+    return dict(scenario=name, calls=number, us_per_op=round(min(rounds) / number * 1e6, 3))
+
+
+def cases(args: argparse.Namespace) -> dict:
+    # create_random_key does not touch the service state.
+    service = ShortLinkServise.__new__(ShortLinkServise)
+    encoder = SnowflakeKeyEncoder(secret='benchmark')
+    ids = iter(range(1 << 40, (1 << 40) + args.number * args.repeat + 1))
+
+    jwt_auth = JWTAuth(config=get_settings().jwt_config)
+    token = jwt_auth.generate_access_token(subject='1', payload={'device_id': 'benchmark'})
+    auth_cache = AuthCache(maxsize=1000, payload_ttl=60, user_ttl=60, revoked_ttl=60)
+    auth_cache.put_payload(token, jwt_auth.verify_token(token))
+
+    rng = random.Random(args.seed)
+    weights = [1 / rank ** 1.2 for rank in range(1, len(CORPUS) + 1)]
+    user_agents = itertools.cycle(rng.choices(CORPUS, weights=weights, k=args.number))
+    uncached = DeviceClassifier(cache_size=0)
+    cached = DeviceClassifier(cache_size=10_000)
+
+    return {
+        'create_random_key': service.create_random_key,
+        'snowflake key encode': lambda: encoder.encode(next(ids)),
+        'jwt sign access token': lambda: jwt_auth.generate_access_token(subject='1', payload={'device_id': 'benchmark'}),
+        'jwt verify': lambda: jwt_auth.verify_token(token),
+        'auth cache payload hit': lambda: auth_cache.get_payload(token),
+        'user_agents.parse': lambda: classify_user_agent(next(user_agents)),
+        'classifier, no cache': lambda: uncached.classify(next(user_agents)),
+        'classifier, lru': lambda: cached.classify(next(user_agents)),
+    }
+
+
+def main(args: argparse.Namespace) -> int:
+    results = []
+    for name, function in cases(args).items():
+        # The full parse is two orders slower, a tenth of the calls is plenty.
+        number = args.number // 10 if name == 'user_agents.parse' else args.number
+        result = best_of(name, function, number, args.repeat)
+        print(json.dumps(result))
+        results.append(result)
+    meta = run_meta(number=args.number, repeat=args.repeat)
+    return finish(args, meta, results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    add_baseline_arguments(parser)
+    sys.exit(main(parser.parse_args()))
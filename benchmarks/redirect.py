@@ -0,0 +1,147 @@
+"""
+Redirect path benchmark, in process over ASGI.
+
+    python -m benchmarks.redirect --requests 20000 --links 1000
+
+Creates ``--links`` links in a fresh SQLite file and replays Zipf-distributed
+``GET /{key}`` requests straight into the ASGI app, once through the FastAPI
+route and once through ``FastRedirectMiddleware``. Leaving the HTTP server out
+shows the per-request cost of each path on one worker. It first checks that
+both give the same 307 and ``Location``, that unknown keys still get a 404
+and that CORS requests still get their headers (exit 1 otherwise).
+
+For the same comparison over HTTP run ``benchmarks.load --scenarios redirect``
+with ``FAST_REDIRECT_ENABLED`` set to false and to true.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.env import setup_env
+
+setup_env()
+_workdir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite+aiosqlite:///{os.path.join(_workdir, "redirect.db")}'
+os.environ['FAST_REDIRECT_ENABLED'] = 'false'
+os.environ['KEY_FILTER_PATH'] = ''
+
+from shortener_app.database import async_session
+from shortener_app.database.migrate import run_migrations
+from shortener_app.link.short_link import dto as schemas
+from shortener_app.link.short_link.clicks import get_click_ingestor
+from shortener_app.link.short_link.transport.fast_redirect import FastRedirectMiddleware
+from shortener_app.link.short_link.transport.router import get_short_link_servise
+from shortener_app.main import app
+
+
+USER_AGENT = b'Mozilla/5.0 (iPhone; CPU iPhone OS 18_0 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148'
+
+
+async def call(asgi_app, path: str, headers: list[tuple[bytes, bytes]] = ()) -> tuple[int, dict]:
+    scope = dict(
+        type='http',
+        asgi=dict(version='3.0'),
+        http_version='1.1',
+        method='GET',
+        scheme='http',
+        path=path,
+        raw_path=path.encode(),
+        query_string=b'',
+        root_path='',
+        headers=[(b'host', b'sho.rt'), (b'user-agent', USER_AGENT), *headers],
+        client=('127.0.0.1', 50000),
+        server=('sho.rt', 80),
+        # Set by Starlette for middleware inside the app; the wrapper here sits outside.
+        app=app,
+    )
+    response = {}
+
+    async def receive():
+        return dict(type='http.request', body=b'', more_body=False)
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = dict(message['headers'])
+
+    await asgi_app(scope, receive, send)
+    return response['status'], response['headers']
+
+
+async def create_links(count: int) -> list[str]:
+    service = get_short_link_servise()
+    keys = []
+    async with async_session() as session:
+        for index in range(count):
+            db_url = await service.create_db_url(session, schemas.URLBase(target_url=f'https://example.com/{index}?q=1'))
+            keys.append(db_url.key)
+    return keys
+
+
+async def check(route_app, fast_app, key: str) -> list[str]:
+    failures = []
+    route_status, route_headers = await call(route_app, f'/{key}')
+    fast_status, fast_headers = await call(fast_app, f'/{key}')
+    if (route_status, route_headers.get(b'location')) != (fast_status, fast_headers.get(b'location')):
+        failures.append(f'redirects differ: {route_status} {route_headers} vs {fast_status} {fast_headers}')
+    if (await call(fast_app, '/unknownkey'))[0] != 404:
+        failures.append('unknown key is not a 404')
+    status, headers = await call(fast_app, f'/{key}', [(b'origin', b'https://example.org')])
+    if status != 307 or b'access-control-allow-origin' not in headers:
+        failures.append('CORS request lost its headers')
+    if (await call(fast_app, '/openapi.json'))[0] != 200:
+        failures.append('reserved path was taken for a key')
+    return failures
+
+
+async def timed(name: str, asgi_app, paths: list[str]) -> dict:
+    started = time.perf_counter()
+    for path in paths:
+        await call(asgi_app, path)
+    elapsed = time.perf_counter() - started
+    return dict(scenario=name, requests=len(paths), rps=round(len(paths) / elapsed, 1),
+                us_per_request=round(elapsed / len(paths) * 1e6, 1))
+
+
+async def main(args: argparse.Namespace) -> int:
+    await run_migrations()
+    keys = await create_links(args.links)
+    ingestor = get_click_ingestor()
+    ingestor.start()
+
+    route_app, fast_app = app, FastRedirectMiddleware(app)
+    failures = await check(route_app, fast_app, keys[0])
+    for failure in failures:
+        print(json.dumps(dict(check=failure)), file=sys.stderr)
+
+    rng = random.Random(args.seed)
+    weights = [1 / rank ** args.zipf for rank in range(1, len(keys) + 1)]
+    paths = [f'/{key}' for key in rng.choices(keys, weights=weights, k=args.requests)]
+    # Warm the redirect cache, so both runs measure the hit path that dominates traffic.
+    for path in set(paths):
+        await call(fast_app, path)
+
+    results = [
+        await timed('fastapi route', route_app, paths),
+        await timed('fast redirect middleware', fast_app, paths),
+    ]
+    for result in results:
+        print(json.dumps(result))
+    print(json.dumps(dict(speedup=round(results[1]['rps'] / results[0]['rps'], 2))))
+
+    await ingestor.stop()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--links', type=int, default=1000)
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--seed', type=int, default=1)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,135 @@
+"""
+Multi-process uniqueness stress test of snowflake id allocation.
+
+    python -m benchmarks.snowflake_ids --processes 8 --ids 200000 --lease file
+    python -m benchmarks.snowflake_ids --lease database --clock-jitter 0.01
+    python -m benchmarks.snowflake_ids --lease static
+
+Starts ``--processes`` processes at once, like uvicorn workers. Each leases a
+worker id through ``WorkerIdAllocator`` (file locks in a shared directory, or
+rows of a shared SQLite database), then generates ``--ids`` ids, alternating
+single ids with blocks of ``--block`` from ``allocate``. ``--clock-jitter``
+makes that share of clock reads jump back up to 50 ms. Processes that finish
+early hand their worker id back, so the later ones also exercise the takeover.
+
+Prints the generation rate per process and the duplicates found over all
+ids; exits 1 on any duplicate or an id going backwards within a process.
+``--lease static`` gives every process SNOWFLAKE_CODE, as before leasing,
+and is expected to fail.
+"""
+import argparse
+import array
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.env import setup_env
+
+
+def configure(args: argparse.Namespace, workdir: str) -> None:
+    setup_env()
+    os.environ['DATABASE_URL'] = f'sqlite+aiosqlite:///{os.path.join(workdir, "ids.db")}'
+    os.environ['SNOWFLAKE_WORKER_LEASE'] = args.lease
+    os.environ['SNOWFLAKE_LOCK_DIR'] = os.path.join(workdir, 'locks')
+
+
+def jittery_clock(share: float, seed: int):
+    from shortener_app.link.short_link.ids import now_ms
+
+    rng = random.Random(seed)
+
+    def clock() -> int:
+        if rng.random() < share:
+            return now_ms() - rng.randint(1, 50)
+        return now_ms()
+    return clock
+
+
+async def generate(args: argparse.Namespace, index: int, barrier, path: str) -> dict:
+    from shortener_app.link.short_link.ids import get_snowflake_ids
+    from shortener_app.link.short_link.workers import get_worker_allocator
+
+    ids = get_snowflake_ids()
+    allocator = get_worker_allocator()
+    if allocator is not None:
+        await allocator.start()
+    if args.clock_jitter:
+        ids._clock = jittery_clock(args.clock_jitter, seed=index)
+
+    generated = array.array('Q')
+    barrier.wait()
+    started = time.perf_counter()
+    while len(generated) < args.ids:
+        generated.append(ids.next_id())
+        generated.extend(ids.allocate(min(args.block, args.ids - len(generated))))
+    elapsed = time.perf_counter() - started
+
+    worker_id = ids.worker_id
+    if allocator is not None:
+        await allocator.stop()
+    with open(path, 'wb') as file:
+        generated.tofile(file)
+    return dict(process=index, worker_id=worker_id, ids=len(generated), ids_per_s=round(len(generated) / elapsed))
+
+
+def run_process(args: argparse.Namespace, workdir: str, index: int, barrier) -> None:
+    configure(args, workdir)
+    result = asyncio.run(generate(args, index, barrier, os.path.join(workdir, f'{index}.ids')))
+    with open(os.path.join(workdir, f'{index}.json'), 'w') as file:
+        json.dump(result, file)
+
+
+async def migrate() -> None:
+    from shortener_app.database.migrate import run_migrations
+
+    await run_migrations()
+
+
+def main(args: argparse.Namespace) -> int:
+    workdir = tempfile.mkdtemp()
+    configure(args, workdir)
+    asyncio.run(migrate())
+
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(args.processes)
+    processes = [
+        context.Process(target=run_process, args=(args, workdir, index, barrier))
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    if any(process.exitcode for process in processes):
+        print(json.dumps(dict(error='a generating process failed')), file=sys.stderr)
+        return 1
+
+    seen = set()
+    total = backwards = 0
+    for index in range(args.processes):
+        with open(os.path.join(workdir, f'{index}.json')) as file:
+            print(file.read())
+        generated = array.array('Q')
+        with open(os.path.join(workdir, f'{index}.ids'), 'rb') as file:
+            generated.frombytes(file.read())
+        backwards += sum(1 for before, after in zip(generated, generated[1:]) if after <= before)
+        total += len(generated)
+        seen.update(generated)
+    duplicates = total - len(seen)
+    print(json.dumps(dict(lease=args.lease, processes=args.processes, ids=total, duplicates=duplicates, backwards=backwards)))
+    return 1 if duplicates or backwards else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--ids', type=int, default=200_000, help='ids per process')
+    parser.add_argument('--block', type=int, default=100, help='size of the allocate() blocks')
+    parser.add_argument('--lease', choices=['file', 'database', 'static'], default='file')
+    parser.add_argument('--clock-jitter', type=float, default=0.0, help='share of clock reads that jump back')
+    sys.exit(main(parser.parse_args()))
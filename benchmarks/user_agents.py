@@ -0,0 +1,64 @@
+"""
+Device classification micro-benchmark.
+
+    python -m benchmarks.user_agents --requests 200000
+
+Replays a Zipf-distributed stream of the User-Agent corpus of
+``test_devices``, the way real traffic repeats a few strings, through the
+full parse, the uncached classifier and the cached one, and reports
+microseconds per call. That the labels agree is checked by the test itself.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from benchmarks.env import setup_env
+
+setup_env()
+
+from shortener_app.link.short_link.devices import (
+    DeviceClassifier,
+    classify_user_agent,
+    fast_classify_user_agent,
+)
+from shortener_app.link.short_link.test.test_devices import CORPUS
+
+
+def timed(name: str, function, stream: list[str]) -> dict:
+    started = time.perf_counter()
+    for user_agent in stream:
+        function(user_agent)
+    elapsed = time.perf_counter() - started
+    return dict(scenario=name, calls=len(stream), us_per_call=round(elapsed / len(stream) * 1e6, 3))
+
+
+def main(args: argparse.Namespace) -> int:
+    fast_hits = sum(1 for user_agent in CORPUS if user_agent and fast_classify_user_agent(user_agent))
+    print(json.dumps(dict(corpus=len(CORPUS), fast_path_hits=fast_hits)))
+
+    rng = random.Random(args.seed)
+    weights = [1 / rank ** args.zipf for rank in range(1, len(CORPUS) + 1)]
+    stream = rng.choices(CORPUS, weights=weights, k=args.requests)
+
+    uncached = DeviceClassifier(cache_size=0)
+    cached = DeviceClassifier(cache_size=args.cache_size)
+    results = [
+        timed('user_agents.parse', classify_user_agent, stream[:args.requests // 10]),
+        timed('fast path + parse, no cache', uncached.classify, stream),
+        timed('fast path + parse, lru', cached.classify, stream),
+    ]
+    for result in results:
+        print(json.dumps(result))
+    print(json.dumps(dict(lru=cached.cache_info()._asdict())))
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100_000)
+    parser.add_argument('--cache-size', type=int, default=10_000)
+    parser.add_argument('--zipf', type=float, default=1.2)
+    parser.add_argument('--seed', type=int, default=1)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,2 @@
+from .memory import MISSING, TTLCache
+from .redis_client import get_redis
@@ -0,0 +1,13 @@
+from functools import lru_cache
+
+from redis.asyncio import Redis
+
+from shortener_app.config import get_settings
+
+
+@lru_cache
+def get_redis() -> Redis | None:
+    settings = get_settings()
+    if not settings.REDIS_ENABLED:
+        return None
+    return Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, decode_responses=True)
@@ -19,6 +19,91 @@ class Settings(BaseSettings):
 
     REDIS_HOST: str = env('REDIS_HOST')
     REDIS_PORT: int = env('REDIS_PORT')
+    REDIS_ENABLED: bool = env.bool('REDIS_ENABLED', False)
+
+    REDIRECT_CACHE_SIZE: int = env.int('REDIRECT_CACHE_SIZE', 100_000)
+    REDIRECT_CACHE_TTL: int = env.int('REDIRECT_CACHE_TTL', 60)
+    REDIRECT_CACHE_NEGATIVE_TTL: int = env.int('REDIRECT_CACHE_NEGATIVE_TTL', 5)
+    REDIRECT_CACHE_REDIS_TTL: int = env.int('REDIRECT_CACHE_REDIS_TTL', 3600)
+    REDIRECT_CACHE_TOMBSTONE_TTL: int = env.int('REDIRECT_CACHE_TOMBSTONE_TTL', 10)
+    # Serve GET /{url_key} from a raw ASGI middleware instead of the FastAPI route.
+    FAST_REDIRECT_ENABLED: bool = env.bool('FAST_REDIRECT_ENABLED', True)
+
+    CLICK_QUEUE_ENABLED: bool = env.bool('CLICK_QUEUE_ENABLED', True)
+    CLICK_QUEUE_SIZE: int = env.int('CLICK_QUEUE_SIZE', 10_000)
+    CLICK_BATCH_SIZE: int = env.int('CLICK_BATCH_SIZE', 500)
+    CLICK_FLUSH_INTERVAL: float = env.float('CLICK_FLUSH_INTERVAL', 1.0)
+    CLICK_QUEUE_OVERFLOW: str = env('CLICK_QUEUE_OVERFLOW', 'block')
+    CLICK_QUEUE_PUT_TIMEOUT: float = env.float('CLICK_QUEUE_PUT_TIMEOUT', 0.05)
+    CLICK_COUNTER_MODE: str = env('CLICK_COUNTER_MODE', 'row')
+    CLICK_COUNTER_SHARDS: int = env.int('CLICK_COUNTER_SHARDS', 16)
+    CLICK_WRITE_MODE: str = env('CLICK_WRITE_MODE', 'direct')
+    CLICK_RECONCILE_INTERVAL: float = env.float('CLICK_RECONCILE_INTERVAL', 5.0)
+    CLICK_FLUSH_LOG_RETENTION_DAYS: int = env.int('CLICK_FLUSH_LOG_RETENTION_DAYS', 7)
+
+    KEY_GENERATION_MODE: str = env('KEY_GENERATION_MODE', 'random')
+    KEY_SHUFFLE_SECRET: str = env('KEY_SHUFFLE_SECRET', '')
+
+    # Off without Redis: other workers would only learn of a new key at the next
+    # catch-up, and 404 it until then.
+    KEY_FILTER_ENABLED: bool = env.bool('KEY_FILTER_ENABLED', REDIS_ENABLED)
+    KEY_FILTER_CAPACITY: int = env.int('KEY_FILTER_CAPACITY', 1_000_000)
+    KEY_FILTER_ERROR_RATE: float = env.float('KEY_FILTER_ERROR_RATE', 0.001)
+    # Catch-up with keys created by other workers, on top of Redis pub/sub.
+    KEY_FILTER_SYNC_INTERVAL: float = env.float('KEY_FILTER_SYNC_INTERVAL', 5.0)
+    # Saved on shutdown and loaded at startup; empty to rebuild from the database every time.
+    KEY_FILTER_PATH: str = env('KEY_FILTER_PATH', 'key_filter.bin')
+
+    USER_AGENT_CACHE_SIZE: int = env.int('USER_AGENT_CACHE_SIZE', 10_000)
+
+    # Extra hosts serving our short links, besides the one of base_url.
+    SHORT_LINK_HOSTS: list[str] = env.list('SHORT_LINK_HOSTS', [])
+    DECODE_MAX_HOPS: int = env.int('DECODE_MAX_HOPS', 10)
+    DECODE_TIMEOUT: float = env.float('DECODE_TIMEOUT', 5.0)
+    DECODE_CONNECT_TIMEOUT: float = env.float('DECODE_CONNECT_TIMEOUT', 2.0)
+    DECODE_POOL_LIMIT: int = env.int('DECODE_POOL_LIMIT', 100)
+    DECODE_POOL_LIMIT_PER_HOST: int = env.int('DECODE_POOL_LIMIT_PER_HOST', 10)
+    DECODE_DNS_CACHE_TTL: int = env.int('DECODE_DNS_CACHE_TTL', 300)
+    DECODE_VERIFY_SSL: bool = env.bool('DECODE_VERIFY_SSL', False)
+    DECODE_CACHE_SIZE: int = env.int('DECODE_CACHE_SIZE', 10_000)
+    DECODE_CACHE_TTL: int = env.int('DECODE_CACHE_TTL', 300)
+    DECODE_BATCH_MAX_ITEMS: int = env.int('DECODE_BATCH_MAX_ITEMS', 1000)
+    DECODE_BATCH_CONCURRENCY: int = env.int('DECODE_BATCH_CONCURRENCY', 50)
+    DECODE_BATCH_PER_HOST: int = env.int('DECODE_BATCH_PER_HOST', 5)
+
+    BULK_MAX_ITEMS: int = env.int('BULK_MAX_ITEMS', 50_000)
+
+    AUTH_CACHE_SIZE: int = env.int('AUTH_CACHE_SIZE', 100_000)
+    AUTH_PAYLOAD_CACHE_TTL: int = env.int('AUTH_PAYLOAD_CACHE_TTL', 60)
+    # Used instead when Redis is off: revocations then reach the other workers only
+    # as their cached payloads expire, so a revoked token passes there this long at most.
+    AUTH_PAYLOAD_CACHE_LOCAL_TTL: int = env.int('AUTH_PAYLOAD_CACHE_LOCAL_TTL', 2)
+    AUTH_USER_CACHE_TTL: int = env.int('AUTH_USER_CACHE_TTL', 60)
+    # Unknown emails are remembered briefly, a fresh registration on another worker shows up after this.
+    AUTH_EMAIL_NEGATIVE_CACHE_TTL: int = env.int('AUTH_EMAIL_NEGATIVE_CACHE_TTL', 5)
+
+    # 'sha256' keeps the stored format; 'pbkdf2_sha256' hashes new passwords and upgrades old ones on login.
+    PASSWORD_HASH_SCHEME: str = env('PASSWORD_HASH_SCHEME', 'sha256')
+    PASSWORD_HASH_ITERATIONS: int = env.int('PASSWORD_HASH_ITERATIONS', 600_000)
+    PASSWORD_HASH_WORKERS: int = env.int('PASSWORD_HASH_WORKERS', 4)
+
+    # 'jti' stores and checks every issued token; 'generation' embeds per-device
+    # revocation counters in the tokens instead, kept in Redis (needs REDIS_ENABLED).
+    TOKEN_REVOCATION_MODE: str = env('TOKEN_REVOCATION_MODE', 'jti')
+    TOKEN_PRUNE_ENABLED: bool = env.bool('TOKEN_PRUNE_ENABLED', True)
+    TOKEN_PRUNE_INTERVAL: float = env.float('TOKEN_PRUNE_INTERVAL', 300.0)
+    TOKEN_PRUNE_BATCH_SIZE: int = env.int('TOKEN_PRUNE_BATCH_SIZE', 1000)
+    # Kept past exp a little longer, for clock skew between workers.
+    TOKEN_PRUNE_GRACE: int = env.int('TOKEN_PRUNE_GRACE', 60)
+
+    LOGIN_RATE_LIMIT_ENABLED: bool = env.bool('LOGIN_RATE_LIMIT_ENABLED', True)
+    LOGIN_IP_BURST: int = env.int('LOGIN_IP_BURST', 20)
+    LOGIN_IP_RATE: float = env.float('LOGIN_IP_RATE', 1.0)
+    LOGIN_EMAIL_BURST: int = env.int('LOGIN_EMAIL_BURST', 5)
+    LOGIN_EMAIL_RATE: float = env.float('LOGIN_EMAIL_RATE', 0.1)
+    # Addresses or networks of the proxies in front of the app; X-Forwarded-For
+    # is only read from them, other clients are keyed by their own address.
+    TRUSTED_PROXIES: list[str] = env.list('TRUSTED_PROXIES', [])
 
 
     API_SECRET: str = env('API_SECRET')
@@ -28,13 +113,31 @@ class Settings(BaseSettings):
     JWT_SECRET: str = env('JWT_SECRET')
     ACCESS_TOKEN_TTL: int = env.int('ACCESS_TOKEN_TTL')
     REFRESH_TOKEN_TTL: int = env.int('REFRESH_TOKEN_TTL')
+    JWT_KEYS_DIR: str = env('JWT_KEYS_DIR', '')
+    JWT_ACTIVE_KID: str = env('JWT_ACTIVE_KID', '')
+    # Unix time until which tokens signed with JWT_SECRET still pass after
+    # JWT_ACTIVE_KID is set; the switch time plus REFRESH_TOKEN_TTL is enough.
+    JWT_LEGACY_SECRET_UNTIL: int = env.int('JWT_LEGACY_SECRET_UNTIL', 0)
+    JWKS_MAX_AGE: int = env.int('JWKS_MAX_AGE', 300)
     jwt_config: JWTConfig = JWTConfig(
     secret=JWT_SECRET,
     algorithm=ALGORITHM,
     access_token_ttl=timedelta(seconds=ACCESS_TOKEN_TTL),
     refresh_token_ttl=timedelta(seconds=REFRESH_TOKEN_TTL),
+    keys_dir=JWT_KEYS_DIR or None,
+    active_kid=JWT_ACTIVE_KID or None,
+    legacy_secret_until=JWT_LEGACY_SECRET_UNTIL,
     )
     snowflake_code: int = env.int("SNOWFLAKE_CODE")  
+    # How each process gets a worker id of its own: 'database', 'redis', 'file'
+    # (one host) or 'static' (SNOWFLAKE_CODE, a single process only).
+    SNOWFLAKE_WORKER_LEASE: str = env('SNOWFLAKE_WORKER_LEASE', 'database')
+    SNOWFLAKE_LEASE_TTL: float = env.float('SNOWFLAKE_LEASE_TTL', 60.0)
+    SNOWFLAKE_LOCK_DIR: str = env('SNOWFLAKE_LOCK_DIR', '')
+
+    # With PROMETHEUS_MULTIPROC_DIR set, how often each worker copies its pool,
+    # queue and key filter gauges to the shared files.
+    METRICS_REFRESH_INTERVAL: float = env.float('METRICS_REFRESH_INTERVAL', 5.0)
 
 
     DB_HOST: str = env("DB_HOST")
@@ -42,11 +145,25 @@ class Settings(BaseSettings):
     DB_USER: str = env("DB_USER")
     DB_PASS: str = env("DB_PASS")
     DB_NAME: str = env("DB_NAME")
+    # Full SQLAlchemy url, takes precedence over the DB_* parts when set.
+    DATABASE_URL: str = env("DATABASE_URL", "")
+
+    DB_POOL_SIZE: int = env.int('DB_POOL_SIZE', 10)
+    DB_MAX_OVERFLOW: int = env.int('DB_MAX_OVERFLOW', 5)
+    DB_POOL_TIMEOUT: float = env.float('DB_POOL_TIMEOUT', 5.0)
+    DB_POOL_RECYCLE: int = env.int('DB_POOL_RECYCLE', 1800)
+    DB_POOL_PRE_PING: bool = env.bool('DB_POOL_PRE_PING', True)
+    # Prepared statements cached per connection; 0 behind pgbouncer in transaction mode.
+    DB_STATEMENT_CACHE_SIZE: int = env.int('DB_STATEMENT_CACHE_SIZE', 500)
 
     @property
     def DATABASE_URL_asyncpg(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_USER}"
     
+    @property
+    def DATABASE_URL_async(self):
+        return self.DATABASE_URL or self.DATABASE_URL_asyncpg
+
     @property
     def DATABASE_URL_psycopg(self):
         return f"postgresql+psycopg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_USER}"
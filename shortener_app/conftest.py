@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+
+# Settings declares required variables without defaults and the engine is
+# built on import, so both have to be in place before the app is imported.
+_DEFAULTS = dict(
+    REDIS_HOST='localhost',
+    REDIS_PORT='6379',
+    API_SECRET='test',
+    HASH_SALT='test',
+    JWT_SECRET='test-secret',
+    ACCESS_TOKEN_TTL='900',
+    REFRESH_TOKEN_TTL='86400',
+    SNOWFLAKE_CODE='1',
+    DB_HOST='localhost',
+    DB_PORT='5432',
+    DB_USER='postgres',
+    DB_PASS='postgres',
+    DB_NAME='postgres',
+    KEY_FILTER_PATH='',
+)
+
+for key, value in _DEFAULTS.items():
+    os.environ.setdefault(key, value)
+
+# TEST_DATABASE_URL points the tests at a throwaway PostgreSQL database, it is wiped.
+os.environ['DATABASE_URL'] = (
+    os.environ.get('TEST_DATABASE_URL')
+    or f'sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), "test.db")}'
+)
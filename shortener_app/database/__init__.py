@@ -4,5 +4,6 @@ from .config import (
     async_session,
     create_tables, 
     delete_tables,
+    dialect_insert,
     get_db,
     str_36)
\ No newline at end of file
@@ -1,10 +1,13 @@
 from typing import Annotated, AsyncGenerator
 from sqlalchemy import String
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 
-from ..config import get_settings
+from ..config import Settings, get_settings
+from ..monitoring import InstrumentedQueuePool, instrument_engine, instrument_pool
 
 
 str_36 = Annotated[str, 36]
@@ -13,9 +16,33 @@ class Model(DeclarativeBase):
         str_36: String(36)
     }
 
+def engine_options(settings: Settings) -> dict:
+    url = make_url(settings.DATABASE_URL_async)
+    if url.get_backend_name() == 'sqlite':
+        return dict(connect_args={"check_same_thread": False})
+
+    connect_args = {}
+    if url.get_driver_name() == 'asyncpg':
+        connect_args = dict(
+            prepared_statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+            statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+        )
+    return dict(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
 async_engine = create_async_engine(
-    get_settings().DATABASE_URL_asyncpg, connect_args={"check_same_thread": False}
+    get_settings().DATABASE_URL_async, **engine_options(get_settings())
 )
+instrument_pool(async_engine.pool)
+instrument_engine(async_engine.sync_engine)
 
 async_session = async_sessionmaker(
     bind=async_engine,
@@ -25,16 +52,25 @@ async_session = async_sessionmaker(
 )
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    # Writes commit explicitly; closing the session ends whatever read-only
+    # transaction is left and returns the connection to the pool.
     async with async_session() as session:
         try:
             yield session
-            await session.commit()
-            await session.close()
-        except SQLAlchemyError as error:
+        except SQLAlchemyError:
             await session.rollback()
             raise
 
 
+def dialect_insert(session: AsyncSession):
+    """
+    ``insert`` of the session's dialect, for ON CONFLICT clauses.
+    """
+    if session.bind.dialect.name == 'postgresql':
+        return postgresql.insert
+    return sqlite.insert
+
+
 async def create_tables():
     async with async_engine.begin() as conn:
         await conn.run_sync(Model.metadata.create_all)
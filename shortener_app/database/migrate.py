@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+from .config import async_engine
+
+
+MIGRATIONS_PATH = Path(__file__).resolve().parent.parent / 'migrations'
+BASELINE_REVISION = '0001'
+# Arbitrary constant shared by every worker, only one of them migrates at a time.
+MIGRATION_LOCK_KEY = 7_201_530_129
+
+
+def get_alembic_config(connection: Connection | None = None) -> Config:
+    config = Config()
+    config.set_main_option('script_location', str(MIGRATIONS_PATH))
+    config.attributes['connection'] = connection
+    return config
+
+
+def _upgrade(connection: Connection) -> None:
+    config = get_alembic_config(connection)
+    tables = inspect(connection).get_table_names()
+    # Databases built by the old create_tables() get the baseline recorded, not recreated.
+    if 'url' in tables and 'alembic_version' not in tables:
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, 'head')
+
+
+async def run_migrations() -> None:
+    async with async_engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            await connection.execute(
+                text('SELECT pg_advisory_xact_lock(:key)'),
+                {'key': MIGRATION_LOCK_KEY},
+            )
+        await connection.run_sync(_upgrade)
+        await connection.commit()
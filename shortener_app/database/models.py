@@ -5,4 +5,4 @@ from sqlalchemy.orm import Mapped, mapped_column
 from . import Model
 from ..user.model import APIUser
 from ..security.auth.model import IssuedJWTToken
-from ..link.short_link.model import URL, AuthUserUrl, UrlMetric
\ No newline at end of file
+from ..link.short_link.model import URL, AuthUserUrl, UrlMetric, UrlClickShard, UrlMetricDaily, ClickFlushLog
\ No newline at end of file
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.explain_hot_queries import explain, hot_queries, load_data, rebuild_schema
+from shortener_app.config import get_settings
+
+
+ROWS = 2000
+
+
+async def _build(db_url: str) -> None:
+    engine = create_async_engine(db_url)
+    async with engine.connect() as connection:
+        await connection.run_sync(rebuild_schema)
+        await connection.commit()
+        await load_data(connection, ROWS)
+        await connection.exec_driver_sql('ANALYZE')
+        await connection.commit()
+    await engine.dispose()
+
+
+async def _seq_scans(db_url: str, name: str) -> tuple[list[str], list[str]]:
+    engine = create_async_engine(db_url)
+    async with engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            # Left a Seq Scan with this off, the planner had no index to use.
+            await connection.exec_driver_sql('SET enable_seqscan = off')
+        result = await explain(connection, hot_queries()[name])
+        await connection.rollback()
+    await engine.dispose()
+    return result
+
+
+@pytest.fixture(scope='module')
+def db_url() -> str:
+    url = get_settings().DATABASE_URL_async
+    asyncio.run(_build(url))
+    return url
+
+
+@pytest.mark.parametrize('name', list(hot_queries()))
+def test_hot_query_uses_index(db_url: str, name: str) -> None:
+    scans, plan = asyncio.run(_seq_scans(db_url, name))
+    assert not scans, plan
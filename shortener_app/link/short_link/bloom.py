@@ -0,0 +1,94 @@
+import hashlib
+import math
+import struct
+from typing import Iterator
+
+
+_HEADER = struct.Struct('>4sQBQQ')
+_MAGIC = b'BLM1'
+
+
+class BloomFilter:
+    """
+    Set membership without false negatives: ``key in bloom`` is ``False`` only
+    for keys that were never added. Sized for ``capacity`` keys at ``error_rate``
+    false positives; past the capacity the error rate grows.
+    """
+
+    def __init__(
+            self,
+            capacity: int,
+            error_rate: float = 0.001,
+            *,
+            bits: int | None = None,
+            hashes: int | None = None,
+        ) -> None:
+        capacity = max(capacity, 1)
+        self._capacity = capacity
+        self._bits = bits or math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self._hashes = hashes or max(1, round(self._bits / capacity * math.log(2)))
+        self._array = bytearray((self._bits + 7) // 8)
+        self._count = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def count(self) -> int:
+        """
+        Distinct keys added so far; a key whose bits were all set already is not counted.
+        """
+        return self._count
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._array)
+
+    def positions(self, key: str) -> Iterator[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        for i in range(self._hashes):
+            yield (first + i * second) % self._bits
+
+    def add(self, key: str) -> None:
+        array = self._array
+        added = False
+        for position in self.positions(key):
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not array[byte] & bit:
+                array[byte] |= bit
+                added = True
+        self._count += added
+
+    def __contains__(self, key: str) -> bool:
+        # Most unknown keys are turned away by the first unset bit or two.
+        array = self._array
+        for position in self.positions(key):
+            if not array[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def false_positive_rate(self) -> float:
+        """
+        Expected false positive rate for the keys added so far.
+        """
+        return (1 - math.exp(-self._hashes * self._count / self._bits)) ** self._hashes
+
+    def to_bytes(self) -> bytes:
+        return _HEADER.pack(_MAGIC, self._bits, self._hashes, self._count, self._capacity) + bytes(self._array)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BloomFilter':
+        if len(data) < _HEADER.size:
+            raise ValueError("Not a bloom filter")
+        magic, bits, hashes, count, capacity = _HEADER.unpack_from(data)
+        array = data[_HEADER.size:]
+        if magic != _MAGIC or len(array) != (bits + 7) // 8:
+            raise ValueError("Not a bloom filter")
+
+        bloom = cls(capacity, bits=bits, hashes=hashes)
+        bloom._array = bytearray(array)
+        bloom._count = count
+        return bloom
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from shortener_app.cache import MISSING, TTLCache, get_redis
+from shortener_app.config import get_settings
+from shortener_app.monitoring import REDIRECT_CACHE_LOOKUPS
+
+
+logger = logging.getLogger(__name__)
+
+_LOCAL_HITS = REDIRECT_CACHE_LOOKUPS.labels(result='local')
+_REDIS_HITS = REDIRECT_CACHE_LOOKUPS.labels(result='redis')
+_MISSES = REDIRECT_CACHE_LOOKUPS.labels(result='miss')
+
+# Left in both tiers by an invalidation, so that a request which read the row
+# before the change cannot put the old entry back afterwards.
+_TOMBSTONE = '-'
+
+
+@dataclass(frozen=True, slots=True)
+class CachedLink:
+    id: int
+    target_url: str
+
+
+class RedirectCache:
+    """
+    Read-through key -> target cache used by the redirect path.
+    The in-process layer is always on, Redis is an optional shared second tier.
+    Unknown keys are cached as ``None`` with a shorter TTL.
+
+    Invalidations leave a tombstone for ``tombstone_ttl`` seconds, during which
+    the key is read from the database and ``set`` is ignored. New keys only
+    need a cached "unknown" gone, which a late ``set`` could bring back for
+    ``negative_ttl`` at most, so they are dropped without one. With Redis
+    both are also published to the other workers, which drop their local
+    copy; without it a worker's local copy lives out its TTL.
+    """
+
+    def __init__(
+            self,
+            local: TTLCache,
+            redis: Redis | None = None,
+            *,
+            ttl: int,
+            negative_ttl: int,
+            redis_ttl: int,
+            tombstone_ttl: int,
+            prefix: str = 'redirect:',
+            channel: str = 'redirect:invalidated',
+        ) -> None:
+        self._local = local
+        self._redis = redis
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._redis_ttl = redis_ttl
+        self._tombstone_ttl = tombstone_ttl
+        self._prefix = prefix
+        self._channel = channel
+        self._listener: asyncio.Task | None = None
+
+    async def get(self, key: str) -> CachedLink | None | object:
+        link = self._local.get(key)
+        if link is _TOMBSTONE:
+            _MISSES.inc()
+            return MISSING
+        if link is not MISSING:
+            _LOCAL_HITS.inc()
+            return link
+        if self._redis is None:
+            _MISSES.inc()
+            return MISSING
+
+        try:
+            raw = await self._redis.get(self._prefix + key)
+        except RedisError:
+            logger.warning("Redirect cache: redis get failed", exc_info=True)
+            _MISSES.inc()
+            return MISSING
+
+        if raw is None or raw == _TOMBSTONE:
+            _MISSES.inc()
+            return MISSING
+
+        _REDIS_HITS.inc()
+        link = self._decode(raw)
+        self._local.set(key, link, ttl=self._local_ttl(link))
+        return link
+
+    async def set(self, key: str, link: CachedLink | None) -> None:
+        if self._local.get(key) is _TOMBSTONE:
+            return
+        self._local.set(key, link, ttl=self._local_ttl(link))
+        if self._redis is None:
+            return
+
+        try:
+            # NX: a tombstone or a fresher entry already there wins.
+            await self._redis.set(
+                self._prefix + key,
+                self._encode(link),
+                ex=self._redis_ttl if link else self._negative_ttl,
+                nx=True,
+            )
+        except RedisError:
+            logger.warning("Redirect cache: redis set failed", exc_info=True)
+
+    async def invalidate(self, key: str, *, tombstone: bool = True) -> None:
+        await self.invalidate_many([key], tombstone=tombstone)
+
+    async def invalidate_many(self, keys: list[str], *, tombstone: bool = True) -> None:
+        if not keys:
+            return
+        self._apply_invalidated(keys, tombstone)
+        if self._redis is None:
+            return
+
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                if tombstone:
+                    for key in keys:
+                        pipe.set(self._prefix + key, _TOMBSTONE, ex=self._tombstone_ttl)
+                else:
+                    pipe.delete(*(self._prefix + key for key in keys))
+                pipe.publish(self._channel, json.dumps([keys, tombstone]))
+                await pipe.execute()
+        except RedisError:
+            logger.warning("Redirect cache: redis invalidation failed", exc_info=True)
+
+    def _apply_invalidated(self, keys: list[str], tombstone: bool) -> None:
+        for key in keys:
+            if tombstone:
+                self._local.set(key, _TOMBSTONE, ttl=self._tombstone_ttl)
+            else:
+                self._local.delete(key)
+
+    def start(self) -> None:
+        if self._redis is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen(), name='redirect-cache-listener')
+
+    async def stop(self) -> None:
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        try:
+            await self._listener
+        except asyncio.CancelledError:
+            pass
+        self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self._channel)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self._apply_invalidated(*json.loads(message['data']))
+            except RedisError:
+                logger.warning("Redirect cache: invalidation listener lost redis, reconnecting", exc_info=True)
+                # Anything published meanwhile is missed, so forget what may be stale.
+                self._local.clear()
+                await asyncio.sleep(1)
+
+    def _local_ttl(self, link: CachedLink | None) -> int:
+        return self._ttl if link else self._negative_ttl
+
+    @staticmethod
+    def _encode(link: CachedLink | None) -> str:
+        if link is None:
+            return ''
+        return json.dumps([link.id, link.target_url])
+
+    @staticmethod
+    def _decode(raw: str) -> CachedLink | None:
+        if not raw:
+            return None
+        id, target_url = json.loads(raw)
+        return CachedLink(id=id, target_url=target_url)
+
+
+@lru_cache
+def get_redirect_cache() -> RedirectCache:
+    settings = get_settings()
+    return RedirectCache(
+        local=TTLCache(maxsize=settings.REDIRECT_CACHE_SIZE, ttl=settings.REDIRECT_CACHE_TTL),
+        redis=get_redis(),
+        ttl=settings.REDIRECT_CACHE_TTL,
+        negative_ttl=settings.REDIRECT_CACHE_NEGATIVE_TTL,
+        redis_ttl=settings.REDIRECT_CACHE_REDIS_TTL,
+        tombstone_ttl=settings.REDIRECT_CACHE_TOMBSTONE_TTL,
+    )
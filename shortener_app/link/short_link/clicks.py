@@ -0,0 +1,231 @@
+import asyncio
+import datetime
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from shortener_app.config import get_settings
+from shortener_app.database import async_session
+from shortener_app.monitoring import CLICK_CLASSIFY_SECONDS, CLICK_QUEUE_DROPPED
+from .counter import ClickCounter, get_click_counter
+from .devices import DeviceClassifier, get_device_classifier
+from .model import UrlMetric
+from .rollup import RollupWriter
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class OverflowPolicy:
+    BLOCK = 'block'
+    DROP = 'drop'
+
+
+@dataclass(slots=True)
+class ClickEvent:
+    """
+    Either ``device`` or the raw ``user_agent`` is set; queued clicks carry
+    the user agent and are classified by the worker, off the request path.
+    """
+    url_id: int
+    ip: str
+    device: str | None = None
+    user_agent: str | None = None
+    clicked_at: datetime.datetime = field(
+        default_factory=lambda: datetime.datetime.now(datetime.timezone.utc),
+    )
+
+
+async def write_clicks(
+        session: AsyncSession,
+        events: list[ClickEvent],
+        *,
+        click_counter: ClickCounter,
+        rollup_writer: RollupWriter,
+        device_classifier: DeviceClassifier,
+        counts: dict[int, int] | None = None,
+    ) -> None:
+    """
+    Writes a batch of clicks without committing: a multi-row insert into
+    ``url_metric``, one counter increment per url and the daily rollups.
+    """
+    with CLICK_CLASSIFY_SECONDS.time():
+        for event in events:
+            if event.device is None:
+                event.device = device_classifier.classify(event.user_agent)
+
+    if events:
+        await session.execute(
+            insert(UrlMetric)
+            .values([
+                dict(
+                    url_id=event.url_id,
+                    ip=event.ip,
+                    device=event.device,
+                    date=event.clicked_at,
+                )
+                for event in events
+            ])
+        )
+    if counts is None:
+        counts = Counter(event.url_id for event in events)
+    await click_counter.increment(session, counts)
+    await rollup_writer.apply(session, events)
+
+
+class ClickIngestor:
+    """
+    Bounded in-process queue of redirect clicks drained by a background worker.
+    The worker writes a whole batch in one transaction: a multi-row insert into
+    ``url_metric``, one aggregated counter increment per url and the daily rollups.
+    """
+
+    def __init__(
+            self,
+            session_factory: async_sessionmaker[AsyncSession],
+            click_counter: ClickCounter,
+            rollup_writer: RollupWriter,
+            device_classifier: DeviceClassifier,
+            *,
+            queue_size: int,
+            batch_size: int,
+            flush_interval: float,
+            overflow_policy: str = OverflowPolicy.BLOCK,
+            put_timeout: float = 0.05,
+            flush_retries: int = 3,
+        ) -> None:
+        self._session_factory = session_factory
+        self._click_counter = click_counter
+        self._rollup_writer = rollup_writer
+        self._device_classifier = device_classifier
+        self._queue_size = queue_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._overflow_policy = overflow_policy
+        self._put_timeout = put_timeout
+        self._flush_retries = flush_retries
+        self._task: asyncio.Task | None = None
+        self._closed = True
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closed
+
+    @property
+    def maxsize(self) -> int:
+        return self._queue_size
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._closed = False
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._task = asyncio.create_task(self._run(), name='click-ingestor')
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        # New clicks are refused from here on, everything already queued
+        # before the stop marker is flushed by the worker before it exits.
+        self._closed = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def submit(self, event: ClickEvent) -> bool:
+        if self._closed:
+            return False
+
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self._overflow_policy == OverflowPolicy.BLOCK:
+            try:
+                async with asyncio.timeout(self._put_timeout):
+                    await self._queue.put(event)
+                return True
+            except TimeoutError:
+                pass
+
+        self.dropped += 1
+        CLICK_QUEUE_DROPPED.inc()
+        return False
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch.append(item)
+
+            deadline = loop.time() + self._flush_interval
+            while len(batch) < self._batch_size:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        item = await self._queue.get()
+                except TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush_with_retry(batch)
+
+    async def _flush_with_retry(self, batch: list[ClickEvent]) -> None:
+        for attempt in range(1, self._flush_retries + 1):
+            try:
+                await self.flush(batch)
+                return
+            except Exception:
+                logger.exception("Click flush failed (attempt %s/%s)", attempt, self._flush_retries)
+                await asyncio.sleep(min(2 ** attempt * 0.1, 2))
+        self.dropped += len(batch)
+        CLICK_QUEUE_DROPPED.inc(len(batch))
+
+    async def flush(self, batch: list[ClickEvent]) -> None:
+        if not batch:
+            return
+
+        async with self._session_factory() as session:
+            await write_clicks(
+                session,
+                batch,
+                click_counter=self._click_counter,
+                rollup_writer=self._rollup_writer,
+                device_classifier=self._device_classifier,
+            )
+            await session.commit()
+
+
+@lru_cache
+def get_click_ingestor() -> ClickIngestor:
+    settings = get_settings()
+    return ClickIngestor(
+        session_factory=async_session,
+        click_counter=get_click_counter(),
+        rollup_writer=RollupWriter(),
+        device_classifier=get_device_classifier(),
+        queue_size=settings.CLICK_QUEUE_SIZE,
+        batch_size=settings.CLICK_BATCH_SIZE,
+        flush_interval=settings.CLICK_FLUSH_INTERVAL,
+        overflow_policy=settings.CLICK_QUEUE_OVERFLOW,
+        put_timeout=settings.CLICK_QUEUE_PUT_TIMEOUT,
+    )
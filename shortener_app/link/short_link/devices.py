@@ -0,0 +1,86 @@
+from functools import lru_cache
+
+from user_agents import parse
+
+from shortener_app.config import get_settings
+
+
+class Device:
+    MOBILE = 'mobile'
+    DESKTOP = 'desktop'
+    TABLET = 'tablet'
+    UNKNOWN = ''
+
+
+# Substrings that make ``user_agents`` report a mobile device no matter what else is in the string.
+_MOBILE_MARKERS = ('iPhone;', 'J2ME', 'MIDP', 'Googlebot-Mobile')
+# Platform tokens that ``user_agents`` reports as a PC.
+_DESKTOP_PLATFORMS = ('Windows NT', 'Macintosh', 'X11')
+# Anything hinting at a phone, tablet or an exotic platform goes through the full parse.
+_FAST_PATH_EXCLUDED = (
+    'Mobi', 'Mini', 'Android', 'Phone', 'iPad', 'iPod', 'Tablet', 'Touch',
+    'BlackBerry', 'BB10', 'PlayBook', 'Kindle', 'Silk', 'Maemo', 'Symbian',
+    'SymbOS', 'Series', 'Nokia', 'Bada', 'Windows CE', 'PlayStation',
+    'webOS', 'Fennec', 'Tizen', 'KAIOS', 'Opera M',
+)
+
+
+def classify_user_agent(user_agent: str | None) -> str:
+    """
+    Full parse, the reference for every other path.
+    """
+    if not user_agent:
+        return Device.UNKNOWN
+    parsed = parse(user_agent)
+    if parsed.is_mobile:
+        return Device.MOBILE
+    if parsed.is_pc:
+        return Device.DESKTOP
+    return Device.TABLET
+
+
+def fast_classify_user_agent(user_agent: str) -> str | None:
+    """
+    Labels the common browsers from a few substring checks, giving the same
+    answer as the full parse. ``None`` when the string needs the full parse.
+    """
+    for marker in _MOBILE_MARKERS:
+        if marker in user_agent:
+            return Device.MOBILE
+
+    if not user_agent.startswith('Mozilla/5.0 ('):
+        return None
+    platform = user_agent[len('Mozilla/5.0 ('):]
+    if not platform.startswith(_DESKTOP_PLATFORMS):
+        return None
+    if platform.startswith('X11') and 'Linux' not in user_agent:
+        return None
+    for token in _FAST_PATH_EXCLUDED:
+        if token in user_agent:
+            return None
+    return Device.DESKTOP
+
+
+class DeviceClassifier:
+    """
+    Maps a raw User-Agent to ``mobile``, ``desktop`` or ``tablet``.
+    Real traffic repeats a handful of strings, so results are kept in a
+    bounded LRU; misses try the fast path before the full parse.
+    """
+
+    def __init__(self, cache_size: int) -> None:
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    @staticmethod
+    def _classify(user_agent: str | None) -> str:
+        if not user_agent:
+            return Device.UNKNOWN
+        return fast_classify_user_agent(user_agent) or classify_user_agent(user_agent)
+
+    def cache_info(self):
+        return self.classify.cache_info()
+
+
+@lru_cache
+def get_device_classifier() -> DeviceClassifier:
+    return DeviceClassifier(cache_size=get_settings().USER_AGENT_CACHE_SIZE)
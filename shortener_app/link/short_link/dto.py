@@ -1,3 +1,6 @@
+import datetime
+from enum import Enum
+
 from pydantic import BaseModel
 
 class URLBase(BaseModel):
@@ -24,10 +27,15 @@ class URLCustom(URLBase):
     name: str
 
 
+class URLBulkItem(URLBase):
+    name: str | None = None
+
+
 class UserLinks(URLBase):
     clicks: int
     key: str
     secret_key: str
+    is_active: bool = True
 
     class Config:
         orm_mode = True
@@ -35,7 +43,53 @@ class UserLinks(URLBase):
 class UrlMetric(BaseModel):
     device: str
     ip: str
-    date: str
+    date: datetime.datetime
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+class MetricMode(str, Enum):
+    ROLLUP = 'rollup'
+    RAW = 'raw'
+
+
+class MetricGroupBy(str, Enum):
+    DATE = 'date'
+    DEVICE = 'device'
+    NONE = 'none'
+
+
+class MetricGranularity(str, Enum):
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+
+
+class UrlMetricRollup(BaseModel):
+    period: datetime.date | None = None
+    device: str | None = None
+    clicks: int
+    unique_ips: int
+
+
+class UrlMetricPage(BaseModel):
+    items: list[UrlMetric]
+    next_cursor: int | None = None
+
+
+class LinkStatus(str, Enum):
+    ACTIVE = 'active'
+    INACTIVE = 'inactive'
+    ALL = 'all'
+
+
+class ExportFormat(str, Enum):
+    JSON = 'json'
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
+class UserLinksPage(BaseModel):
+    items: list[UserLinks]
+    next_cursor: int | None = None
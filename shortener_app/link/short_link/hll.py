@@ -0,0 +1,47 @@
+import hashlib
+import math
+
+
+class HyperLogLog:
+    """
+    Mergeable cardinality sketch with ``2 ** precision`` one-byte registers.
+    The default precision gives about 3% standard error in 1 KiB.
+    """
+
+    def __init__(self, precision: int = 10, registers: bytes | None = None) -> None:
+        self._precision = precision
+        self._size = 1 << precision
+        if registers is not None and len(registers) != self._size:
+            raise ValueError("Register size does not match the precision")
+        self._registers = bytearray(registers) if registers else bytearray(self._size)
+
+    @classmethod
+    def from_bytes(cls, data: bytes | None, precision: int = 10) -> 'HyperLogLog':
+        return cls(precision=precision, registers=data or None)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._registers)
+
+    def add(self, value: str) -> None:
+        index, rank = self.position(value)
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def position(self, value: str) -> tuple[int, int]:
+        hashed = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+        index = hashed >> (64 - self._precision)
+        rest_bits = 64 - self._precision
+        rest = hashed & ((1 << rest_bits) - 1)
+        return index, rest_bits - rest.bit_length() + 1
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        self._registers = bytearray(map(max, self._registers, other._registers))
+
+    def count(self) -> int:
+        m = self._size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self._registers)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
@@ -0,0 +1,102 @@
+import time
+from functools import lru_cache
+
+from shortener_app.config import get_settings
+from shortener_app.monitoring import SNOWFLAKE_BORROWED_MS, SNOWFLAKE_CLOCK_REGRESSIONS
+
+
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+_TIMESTAMP_SHIFT = WORKER_ID_BITS + SEQUENCE_BITS
+
+
+class WorkerLeaseExpired(RuntimeError):
+    """
+    The worker id could not be renewed in time, another process may own it by now.
+    """
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+class SnowflakeIds:
+    """
+    Snowflake ids: Unix milliseconds, a 10-bit worker id and a 12-bit sequence,
+    laid out like ``snowflake.SnowflakeGenerator`` so that new ids keep sorting
+    after the old ones (and ``snowflake_id_at`` still holds).
+
+    It never waits and never repeats itself: when the clock steps back, or the
+    sequence of a millisecond runs out, ids go on from the last millisecond
+    used, borrowing the next ones until the clock catches up. ``last_ms`` is
+    handed over with the worker id, so the next owner starts after it.
+    Not thread-safe: one per process, called from the event loop.
+    """
+
+    def __init__(self, worker_id: int, *, last_ms: int = 0, clock=now_ms) -> None:
+        self._clock = clock
+        self.reset(worker_id, last_ms)
+
+    def reset(self, worker_id: int, last_ms: int = 0, lease_deadline: float | None = None) -> None:
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"Worker id must be between 0 and {MAX_WORKER_ID}")
+        self.worker_id = worker_id
+        self._worker_bits = worker_id << SEQUENCE_BITS
+        # The last millisecond used and its last sequence number; a full one
+        # makes the first id land on a later millisecond.
+        self._ms = last_ms
+        self._sequence = MAX_SEQUENCE
+        self._clock_ms = 0
+        self.lease_deadline = lease_deadline
+
+    @property
+    def last_ms(self) -> int:
+        return self._ms
+
+    def _advance(self) -> None:
+        if self.lease_deadline is not None and time.monotonic() > self.lease_deadline:
+            raise WorkerLeaseExpired(f"Lease of worker id {self.worker_id} expired")
+
+        now = self._clock()
+        if now < self._clock_ms:
+            SNOWFLAKE_CLOCK_REGRESSIONS.inc()
+        self._clock_ms = now
+        if now > self._ms:
+            self._ms, self._sequence = now, -1
+
+    def next_id(self) -> int:
+        self._advance()
+        if self._sequence == MAX_SEQUENCE:
+            self._borrow()
+        self._sequence += 1
+        return self._ms << _TIMESTAMP_SHIFT | self._worker_bits | self._sequence
+
+    def allocate(self, count: int) -> list[int]:
+        """
+        Reserves ``count`` ids in one step, for bulk creation: whole runs of a
+        millisecond's sequence at a time instead of a call per id.
+        """
+        self._advance()
+        ids: list[int] = []
+        while len(ids) < count:
+            if self._sequence == MAX_SEQUENCE:
+                self._borrow()
+            taken = min(count - len(ids), MAX_SEQUENCE - self._sequence)
+            first = (self._ms << _TIMESTAMP_SHIFT | self._worker_bits) + self._sequence + 1
+            ids.extend(range(first, first + taken))
+            self._sequence += taken
+        return ids
+
+    def _borrow(self) -> None:
+        self._ms += 1
+        self._sequence = -1
+        if self._ms > self._clock_ms:
+            SNOWFLAKE_BORROWED_MS.inc()
+
+
+@lru_cache
+def get_snowflake_ids() -> SnowflakeIds:
+    # SNOWFLAKE_CODE until the app lifespan leases a worker id, see workers.py.
+    return SnowflakeIds(get_settings().snowflake_code)
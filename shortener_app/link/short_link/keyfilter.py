@@ -0,0 +1,232 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import struct
+from functools import lru_cache
+from typing import Iterable
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from shortener_app.cache import get_redis
+from shortener_app.config import get_settings
+from shortener_app.database import async_session
+from .bloom import BloomFilter
+from .keys import snowflake_id_at
+from .repository import LinkRepository
+
+
+logger = logging.getLogger(__name__)
+
+_SYNCED_AT = struct.Struct('>d')
+# Ids are generated before the insert commits, and by workers whose clocks
+# differ a little: catch-up re-reads this much before the last sync.
+SYNC_OVERLAP = datetime.timedelta(minutes=1)
+
+
+class KeyFilter:
+    """
+    Bloom filter of the active short keys, so the redirect path can turn away
+    unknown keys without a database query. Built from ``url`` at startup, or
+    loaded from ``path`` and caught up with the links created since.
+    New keys are added locally, fanned out over Redis pub/sub and picked up
+    by a periodic catch-up from the database as a fallback; without Redis a
+    key created by another worker is rejected until that catch-up.
+    Once the keys outgrow the capacity the filter is rebuilt at twice their
+    count. Until the filter is loaded every key is reported as possibly existing.
+    """
+
+    def __init__(
+            self,
+            session_factory: async_sessionmaker[AsyncSession],
+            *,
+            capacity: int,
+            error_rate: float,
+            sync_interval: float,
+            path: str = '',
+            redis: Redis | None = None,
+            channel: str = 'url:keys',
+        ) -> None:
+        self._session_factory = session_factory
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._sync_interval = sync_interval
+        self._path = path
+        self._redis = redis
+        self._channel = channel
+        self._bloom: BloomFilter | None = None
+        # Keys added while a rebuild reads the table, for the new filter.
+        self._added_during_rebuild: list[str] | None = None
+        self._synced_at: datetime.datetime | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def bloom(self) -> BloomFilter | None:
+        return self._bloom
+
+    def might_exist(self, key: str) -> bool:
+        return self._bloom is None or key in self._bloom
+
+    def add(self, keys: Iterable[str]) -> None:
+        if self._bloom is None:
+            return
+        keys = list(keys)
+        for key in keys:
+            self._bloom.add(key)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.extend(keys)
+
+    async def publish(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if not keys:
+            return
+
+        self.add(keys)
+        if self._redis is None:
+            return
+
+        try:
+            await self._redis.publish(self._channel, json.dumps(keys))
+        except RedisError:
+            logger.warning("Key filter: failed to publish new keys", exc_info=True)
+
+    async def start(self) -> None:
+        await self.load()
+        if not self._tasks:
+            self._tasks.append(asyncio.create_task(self._run(), name='key-filter-sync'))
+            if self._redis is not None:
+                self._tasks.append(asyncio.create_task(self._listen(), name='key-filter-listener'))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks.clear()
+        await self.save()
+
+    async def load(self) -> None:
+        loaded = await asyncio.to_thread(self._read) if self._path else None
+        if loaded is None:
+            await self.rebuild()
+            await self.save()
+            return
+
+        self._synced_at, self._bloom = loaded
+        await self.sync()
+        await self.rebuild_if_full()
+
+    async def rebuild_if_full(self) -> None:
+        if self._bloom is None or self._bloom.count <= self._bloom.capacity:
+            return
+        logger.info("Key filter: %d keys over a capacity of %d, rebuilding", self._bloom.count, self._bloom.capacity)
+        await self.rebuild()
+        await self.save()
+
+    async def rebuild(self) -> None:
+        started = datetime.datetime.now(datetime.timezone.utc)
+        self._added_during_rebuild = []
+        try:
+            async with self._session_factory() as session:
+                total = await LinkRepository.count_active_links(session)
+                bloom = BloomFilter(max(self._capacity, 2 * total), self._error_rate)
+                async for keys in LinkRepository.iter_active_keys(session):
+                    for key in keys:
+                        bloom.add(key)
+            for key in self._added_during_rebuild:
+                bloom.add(key)
+        finally:
+            self._added_during_rebuild = None
+        self._bloom = bloom
+        self._synced_at = started
+
+    async def sync(self) -> None:
+        """
+        Adds the keys created since the last sync, including those of other workers.
+        """
+        if self._bloom is None or self._synced_at is None:
+            return
+
+        started = datetime.datetime.now(datetime.timezone.utc)
+        async with self._session_factory() as session:
+            async for keys in LinkRepository.iter_active_keys(
+                    session,
+                    id_from=snowflake_id_at(self._synced_at - SYNC_OVERLAP),
+                ):
+                self.add(keys)
+        self._synced_at = started
+
+    async def save(self) -> None:
+        if not self._path or self._bloom is None:
+            return
+        try:
+            await asyncio.to_thread(self._write, self._synced_at, self._bloom.to_bytes())
+        except OSError:
+            logger.warning("Key filter: failed to save %s", self._path, exc_info=True)
+
+    def _read(self) -> tuple[datetime.datetime, BloomFilter] | None:
+        try:
+            with open(self._path, 'rb') as file:
+                data = file.read()
+            (synced_at,) = _SYNCED_AT.unpack_from(data)
+            bloom = BloomFilter.from_bytes(data[_SYNCED_AT.size:])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error):
+            logger.warning("Key filter: cannot read %s, rebuilding", self._path, exc_info=True)
+            return None
+        return datetime.datetime.fromtimestamp(synced_at, datetime.timezone.utc), bloom
+
+    def _write(self, synced_at: datetime.datetime, data: bytes) -> None:
+        # Every worker saves on shutdown, the rename keeps the file whole.
+        tmp_path = f'{self._path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(_SYNCED_AT.pack(synced_at.timestamp()))
+            file.write(data)
+        os.replace(tmp_path, self._path)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._sync_interval)
+            try:
+                await self.sync()
+                await self.rebuild_if_full()
+            except Exception:
+                logger.exception("Key filter: catch-up failed, retrying on the next tick")
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self._channel)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self.add(json.loads(message['data']))
+            except RedisError:
+                # Anything published meanwhile is found by the next catch-up.
+                logger.warning("Key filter: listener lost redis, reconnecting", exc_info=True)
+                await asyncio.sleep(1)
+
+
+@lru_cache
+def get_key_filter() -> KeyFilter | None:
+    settings = get_settings()
+    if not settings.KEY_FILTER_ENABLED:
+        return None
+    redis = get_redis()
+    if redis is None:
+        logger.warning("Key filter without Redis: keys created by other workers 404 until the next catch-up")
+    return KeyFilter(
+        async_session,
+        capacity=settings.KEY_FILTER_CAPACITY,
+        error_rate=settings.KEY_FILTER_ERROR_RATE,
+        sync_interval=settings.KEY_FILTER_SYNC_INTERVAL,
+        path=settings.KEY_FILTER_PATH,
+        redis=redis,
+    )
@@ -0,0 +1,113 @@
+import datetime
+import hashlib
+import string
+from functools import lru_cache
+
+from shortener_app.config import get_settings
+
+
+BASE62_ALPHABET = string.digits + string.ascii_letters
+KEY_LENGTH = 11  # 62 ** 11 > 2 ** 64, so every 64-bit value fits
+
+_HALF_BITS = 32
+_HALF_MASK = (1 << _HALF_BITS) - 1
+
+
+class KeyGenerationMode:
+    RANDOM = 'random'
+    SNOWFLAKE = 'snowflake'
+
+
+def snowflake_id_at(moment: datetime.datetime) -> int:
+    """
+    Smallest snowflake id that can be generated at ``moment``.
+    """
+    return int(moment.timestamp() * 1000) << 22
+
+
+def base62_encode(number: int, length: int = KEY_LENGTH) -> str:
+    if number < 0:
+        raise ValueError("Only non-negative numbers can be encoded")
+
+    chars = []
+    while number:
+        number, rest = divmod(number, 62)
+        chars.append(BASE62_ALPHABET[rest])
+    return ''.join(reversed(chars)).rjust(length, BASE62_ALPHABET[0])
+
+
+def base62_decode(key: str) -> int:
+    number = 0
+    for char in key:
+        number = number * 62 + BASE62_ALPHABET.index(char)
+    return number
+
+
+class SnowflakeKeyEncoder:
+    """
+    Derives a short key from a snowflake id without touching the database.
+    Snowflake ids are unique, so the keys are too. With a secret the id is
+    first run through a keyed 64-bit Feistel permutation, which stays a
+    bijection but stops neighbouring ids from producing guessable keys.
+    """
+
+    def __init__(self, secret: str = '', rounds: int = 4) -> None:
+        secret = secret.encode()
+        # blake2b takes keys of up to 64 bytes, longer secrets are hashed down to that.
+        if len(secret) > hashlib.blake2b.MAX_KEY_SIZE:
+            secret = hashlib.blake2b(secret).digest()
+        self._secret = secret
+        self._rounds = rounds
+
+    def encode(self, id: int) -> str:
+        if self._secret:
+            id = self._permute(id)
+        return base62_encode(id)
+
+    def decode(self, key: str) -> int:
+        id = base62_decode(key)
+        if self._secret:
+            id = self._unpermute(id)
+        return id
+
+    @staticmethod
+    def is_reserved(key: str) -> bool:
+        """
+        Whether ``encode`` could produce ``key``: custom names must stay out of that space.
+        """
+        return (
+            len(key) == KEY_LENGTH
+            and all(char in BASE62_ALPHABET for char in key)
+            and base62_decode(key) < 1 << 64
+        )
+
+    def _round(self, round: int, half: int) -> int:
+        digest = hashlib.blake2b(
+            half.to_bytes(4, 'big'),
+            key=self._secret,
+            digest_size=4,
+            person=round.to_bytes(16, 'big'),
+        ).digest()
+        return int.from_bytes(digest, 'big')
+
+    def _permute(self, value: int) -> int:
+        left, right = value >> _HALF_BITS, value & _HALF_MASK
+        for round in range(self._rounds):
+            left, right = right, left ^ self._round(round, right)
+        return left << _HALF_BITS | right
+
+    def _unpermute(self, value: int) -> int:
+        left, right = value >> _HALF_BITS, value & _HALF_MASK
+        for round in reversed(range(self._rounds)):
+            left, right = right ^ self._round(round, left), left
+        return left << _HALF_BITS | right
+
+
+@lru_cache
+def get_key_encoder() -> SnowflakeKeyEncoder | None:
+    settings = get_settings()
+    if settings.KEY_GENERATION_MODE == KeyGenerationMode.RANDOM:
+        return None
+    if settings.KEY_GENERATION_MODE != KeyGenerationMode.SNOWFLAKE:
+        raise ValueError(f"Unknown key generation mode: {settings.KEY_GENERATION_MODE}")
+    return SnowflakeKeyEncoder(secret=settings.KEY_SHUFFLE_SECRET)
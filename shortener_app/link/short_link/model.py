@@ -1,33 +1,97 @@
+import datetime
+
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import ForeignKey, BigInteger
+from sqlalchemy import ForeignKey, BigInteger, DateTime, Index, Integer, LargeBinary, String, text
 
-from shortener_app.database import Model
+from shortener_app.database import Model, str_36
 
 
 class URL(Model):
     __tablename__ = "url"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
     key: Mapped[str] = mapped_column(unique=True, index=True)
     secret_key: Mapped[str] = mapped_column(unique=True, index=True)
-    target_url: Mapped[str] = mapped_column(index=True)
+    target_url: Mapped[str]
     is_active: Mapped[bool] = mapped_column(default=True)
     clicks: Mapped[int] = mapped_column(default=0)
 
+    __table_args__ = (
+        # Redirect lookup: key of an active link -> id, target_url without touching the heap.
+        Index(
+            "ix_url_key_active",
+            "key",
+            unique=True,
+            postgresql_include=["id", "target_url"],
+            postgresql_where=text("is_active"),
+            sqlite_where=text("is_active"),
+        ),
+    )
+
 
 class AuthUserUrl(Model):
     __tablename__ = "auth_user_url"
     
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("api_user.id", ondelete="CASCADE"), nullable=False)
-    url_id: Mapped[int] = mapped_column(ForeignKey("url.id", ondelete="CASCADE"), nullable=False)
+    url_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("url.id", ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        Index("ix_auth_user_url_user_id_url_id", "user_id", "url_id"),
+        Index("ix_auth_user_url_url_id", "url_id"),
+    )
 
 
 class UrlMetric(Model):
     __tablename__ = "url_metric"
     
-    id: Mapped[int] = mapped_column(primary_key=True)
-    url_id: Mapped[int] = mapped_column(ForeignKey("url.id", ondelete="CASCADE"), nullable=False)
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    url_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("url.id", ondelete="CASCADE"), nullable=False)
     ip: Mapped[str]
     device: Mapped[str]
-    date: Mapped[str]
+    date: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_url_metric_url_id_id", "url_id", "id"),
+    )
+
+
+class UrlClickShard(Model):
+    __tablename__ = "url_click_shard"
+
+    url_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("url.id", ondelete="CASCADE"), primary_key=True)
+    shard: Mapped[int] = mapped_column(primary_key=True)
+    clicks: Mapped[int] = mapped_column(default=0)
+
+
+class UrlMetricDaily(Model):
+    __tablename__ = "url_metric_daily"
+
+    url_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("url.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[datetime.date] = mapped_column(primary_key=True)
+    device: Mapped[str] = mapped_column(primary_key=True)
+    clicks: Mapped[int] = mapped_column(default=0)
+    unique_ips: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+class ClickFlushLog(Model):
+    """
+    Write-behind click snapshots already applied, so a retried flush is a no-op.
+    """
+    __tablename__ = "click_flush_log"
+
+    flush_id: Mapped[str_36] = mapped_column(primary_key=True)
+    flushed_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), index=True)
+
+
+class SnowflakeWorker(Model):
+    """
+    Leases of snowflake worker ids, one row per id ever handed out.
+    """
+    __tablename__ = "snowflake_worker"
+
+    worker_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    owner: Mapped[str] = mapped_column(String(128))
+    expires_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True))
+    # Last millisecond used under this id, the next owner starts after it.
+    last_ms: Mapped[int] = mapped_column(BigInteger, default=0)
\ No newline at end of file
@@ -0,0 +1,307 @@
+import asyncio
+import datetime
+import json
+import logging
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Iterable
+
+from redis.asyncio import Redis
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from shortener_app.cache import get_redis
+from shortener_app.config import get_settings
+from shortener_app.database import async_session, dialect_insert
+from .clicks import ClickEvent, write_clicks
+from .counter import ClickCounter, get_click_counter
+from .devices import DeviceClassifier, get_device_classifier
+from .model import ClickFlushLog
+from .rollup import RollupWriter
+
+
+logger = logging.getLogger(__name__)
+
+
+class ClickWriteMode:
+    DIRECT = 'direct'
+    WRITE_BEHIND = 'write_behind'
+
+
+@dataclass(slots=True)
+class PendingSnapshot:
+    id: str
+    counts: dict[int, int] = field(default_factory=dict)
+    events: list[ClickEvent] = field(default_factory=list)
+
+
+def _dump_event(event: ClickEvent) -> str:
+    return json.dumps([event.url_id, event.ip, event.device, event.user_agent, event.clicked_at.isoformat()])
+
+
+def _load_event(raw: str) -> ClickEvent:
+    url_id, ip, device, user_agent, clicked_at = json.loads(raw)
+    return ClickEvent(
+        url_id=url_id,
+        ip=ip,
+        device=device,
+        user_agent=user_agent,
+        clicked_at=datetime.datetime.fromisoformat(clicked_at),
+    )
+
+
+class MemoryPendingClicks:
+    """
+    In-process stand-in for ``RedisPendingClicks``, for tests only: its clicks
+    are lost with the process and other workers never see them.
+    """
+
+    def __init__(self) -> None:
+        self._counts: Counter[int] = Counter()
+        self._events: list[ClickEvent] = []
+        self._flushing: dict[str, PendingSnapshot] = {}
+
+    async def add(self, event: ClickEvent) -> None:
+        self._counts[event.url_id] += 1
+        self._events.append(event)
+
+    async def pending(self, url_ids: Iterable[int]) -> dict[int, int]:
+        snapshots = [self._counts, *(snapshot.counts for snapshot in self._flushing.values())]
+        return {
+            url_id: total
+            for url_id in url_ids
+            if (total := sum(counts.get(url_id, 0) for counts in snapshots))
+        }
+
+    async def snapshot(self) -> PendingSnapshot | None:
+        if not self._events:
+            return None
+        snapshot = PendingSnapshot(id=str(uuid.uuid4()), counts=dict(self._counts), events=self._events)
+        self._counts, self._events = Counter(), []
+        self._flushing[snapshot.id] = snapshot
+        return snapshot
+
+    async def leftovers(self) -> list[PendingSnapshot]:
+        return list(self._flushing.values())
+
+    async def discard(self, snapshot_id: str) -> None:
+        self._flushing.pop(snapshot_id, None)
+
+
+# Moves the live hash and event list under snapshot keys in one step, so a
+# click lands either in this snapshot or in the next one, never in both.
+_SNAPSHOT_SCRIPT = """
+local moved = 0
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RENAME', KEYS[1], KEYS[3])
+    moved = 1
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('RENAME', KEYS[2], KEYS[4])
+    moved = 1
+end
+if moved == 1 then
+    redis.call('SADD', KEYS[5], ARGV[1])
+end
+return moved
+"""
+
+
+class RedisPendingClicks:
+    """
+    Clicks waiting for the reconciler: per-url counts in a Redis hash and the
+    click details in a list next to it, both updated in one transaction.
+    A flush renames them to snapshot keys that stay until the flush is committed.
+    """
+
+    def __init__(self, redis: Redis, prefix: str = 'clicks:') -> None:
+        self._redis = redis
+        self._counts_key = prefix + 'pending'
+        self._events_key = prefix + 'pending:events'
+        self._flushing_key = prefix + 'flushing'
+        self._prefix = prefix
+        self._snapshot_script = redis.register_script(_SNAPSHOT_SCRIPT)
+
+    def _snapshot_keys(self, snapshot_id: str) -> tuple[str, str]:
+        return (
+            f'{self._prefix}flushing:{snapshot_id}',
+            f'{self._prefix}flushing:{snapshot_id}:events',
+        )
+
+    async def add(self, event: ClickEvent) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(self._counts_key, str(event.url_id), 1)
+            pipe.rpush(self._events_key, _dump_event(event))
+            await pipe.execute()
+
+    async def pending(self, url_ids: Iterable[int]) -> dict[int, int]:
+        fields = [str(url_id) for url_id in url_ids]
+        if not fields:
+            return {}
+
+        snapshot_ids = await self._redis.smembers(self._flushing_key)
+        hashes = [self._counts_key, *(self._snapshot_keys(snapshot_id)[0] for snapshot_id in snapshot_ids)]
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in hashes:
+                pipe.hmget(key, fields)
+            rows = await pipe.execute()
+
+        totals: Counter[int] = Counter()
+        for values in rows:
+            for field_name, value in zip(fields, values):
+                if value is not None:
+                    totals[int(field_name)] += int(value)
+        return dict(totals)
+
+    async def snapshot(self) -> PendingSnapshot | None:
+        snapshot_id = str(uuid.uuid4())
+        counts_key, events_key = self._snapshot_keys(snapshot_id)
+        moved = await self._snapshot_script(
+            keys=[self._counts_key, self._events_key, counts_key, events_key, self._flushing_key],
+            args=[snapshot_id],
+        )
+        if not moved:
+            return None
+        return await self._load(snapshot_id)
+
+    async def leftovers(self) -> list[PendingSnapshot]:
+        return [await self._load(snapshot_id) for snapshot_id in await self._redis.smembers(self._flushing_key)]
+
+    async def discard(self, snapshot_id: str) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(*self._snapshot_keys(snapshot_id))
+            pipe.srem(self._flushing_key, snapshot_id)
+            await pipe.execute()
+
+    async def _load(self, snapshot_id: str) -> PendingSnapshot:
+        counts_key, events_key = self._snapshot_keys(snapshot_id)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(counts_key)
+            pipe.lrange(events_key, 0, -1)
+            counts, events = await pipe.execute()
+        return PendingSnapshot(
+            id=snapshot_id,
+            counts={int(url_id): int(clicks) for url_id, clicks in counts.items()},
+            events=[_load_event(raw) for raw in events],
+        )
+
+
+PendingClicks = MemoryPendingClicks | RedisPendingClicks
+
+
+class ClickReconciler:
+    """
+    Periodically moves write-behind clicks into the database.
+    A snapshot is applied in one transaction together with its ``click_flush_log``
+    row and dropped from the store only after the commit: a crash in between means
+    the snapshot is retried (at least once) and the log turns the retry into a no-op.
+    """
+
+    def __init__(
+            self,
+            store: PendingClicks,
+            session_factory: async_sessionmaker[AsyncSession],
+            click_counter: ClickCounter,
+            rollup_writer: RollupWriter,
+            device_classifier: DeviceClassifier,
+            *,
+            interval: float,
+            log_retention: datetime.timedelta,
+        ) -> None:
+        self._store = store
+        self._session_factory = session_factory
+        self._click_counter = click_counter
+        self._rollup_writer = rollup_writer
+        self._device_classifier = device_classifier
+        self._interval = interval
+        self._log_retention = log_retention
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='click-reconciler')
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.reconcile()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.reconcile()
+            except Exception:
+                logger.exception("Click reconciliation failed, retrying on the next tick")
+
+    async def reconcile(self) -> None:
+        # Snapshots of earlier, failed or interrupted, flushes go first.
+        for snapshot in await self._store.leftovers():
+            await self.apply(snapshot)
+        snapshot = await self._store.snapshot()
+        if snapshot is not None:
+            await self.apply(snapshot)
+
+    async def apply(self, snapshot: PendingSnapshot) -> None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        async with self._session_factory() as session:
+            insert = dialect_insert(session)
+            result = await session.execute(
+                insert(ClickFlushLog)
+                .values(flush_id=snapshot.id, flushed_at=now)
+                .on_conflict_do_nothing()
+                .returning(ClickFlushLog.flush_id)
+            )
+            if result.scalar_one_or_none() is not None:
+                await write_clicks(
+                    session,
+                    snapshot.events,
+                    click_counter=self._click_counter,
+                    rollup_writer=self._rollup_writer,
+                    device_classifier=self._device_classifier,
+                    counts=snapshot.counts,
+                )
+                await session.execute(
+                    delete(ClickFlushLog)
+                    .where(ClickFlushLog.flushed_at < now - self._log_retention)
+                )
+            await session.commit()
+        await self._store.discard(snapshot.id)
+
+
+@lru_cache
+def get_pending_clicks() -> PendingClicks | None:
+    settings = get_settings()
+    if settings.CLICK_WRITE_MODE == ClickWriteMode.DIRECT:
+        return None
+    if settings.CLICK_WRITE_MODE != ClickWriteMode.WRITE_BEHIND:
+        raise ValueError(f"Unknown click write mode: {settings.CLICK_WRITE_MODE}")
+    redis = get_redis()
+    if redis is None:
+        raise ValueError("CLICK_WRITE_MODE=write_behind needs REDIS_ENABLED")
+    return RedisPendingClicks(redis)
+
+
+@lru_cache
+def get_click_reconciler() -> ClickReconciler | None:
+    store = get_pending_clicks()
+    if store is None:
+        return None
+    settings = get_settings()
+    return ClickReconciler(
+        store,
+        async_session,
+        get_click_counter(),
+        RollupWriter(),
+        get_device_classifier(),
+        interval=settings.CLICK_RECONCILE_INTERVAL,
+        log_retention=datetime.timedelta(days=settings.CLICK_FLUSH_LOG_RETENTION_DAYS),
+    )
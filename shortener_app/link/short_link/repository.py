@@ -1,8 +1,12 @@
+import datetime
+from typing import AsyncIterator
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import Select, func, insert, select
 
-from shortener_app.database.models import URL, AuthUserUrl, APIUser, UrlMetric
-from .dto import UserLinks, UrlMetric as UM
+from shortener_app.database import dialect_insert
+from shortener_app.database.models import URL, AuthUserUrl, APIUser, UrlMetric, UrlMetricDaily
+from .dto import LinkStatus
 
 
 class LinkRepository:
@@ -29,39 +33,170 @@ class LinkRepository:
         await session.refresh(db_url)
 
         return db_url
+
+    @classmethod
+    async def add_user_links_bulk(
+            cls,
+            *,
+            session: AsyncSession,
+            user: APIUser,
+            urls: list[URL],
+            chunk_size: int = 1000,
+        ) -> set[int]:
+        """
+        Multi-row insert of ``url`` and ``auth_user_url`` rows without committing.
+        Rows whose key or secret key is already taken are skipped,
+        the ids of the inserted urls are returned.
+        """
+        inserted: set[int] = set()
+        insert_url = dialect_insert(session)
+        for start in range(0, len(urls), chunk_size):
+            chunk = urls[start:start + chunk_size]
+            # executemany over a Core insert is sent as batched multi-row
+            # INSERT ... VALUES statements whose compiled form is cached.
+            result = await session.execute(
+                insert_url(URL.__table__)
+                .on_conflict_do_nothing()
+                .returning(URL.id),
+                [
+                    dict(
+                        id=db_url.id,
+                        key=db_url.key,
+                        secret_key=db_url.secret_key,
+                        target_url=db_url.target_url,
+                        is_active=True,
+                        clicks=0,
+                    )
+                    for db_url in chunk
+                ],
+            )
+            chunk_ids = set(result.scalars().all())
+            if chunk_ids:
+                await session.execute(
+                    insert(AuthUserUrl.__table__),
+                    [dict(user_id=user.id, url_id=url_id) for url_id in chunk_ids],
+                )
+            inserted |= chunk_ids
+        return inserted
+
+    @classmethod
+    async def get_existing_keys(
+            cls,
+            session: AsyncSession,
+            keys: set[str],
+            chunk_size: int = 1000,
+        ) -> set[str]:
+        keys = list(keys)
+        existing: set[str] = set()
+        for start in range(0, len(keys), chunk_size):
+            result = await session.execute(
+                select(URL.key)
+                .where(URL.key.in_(keys[start:start + chunk_size]))
+            )
+            existing.update(result.scalars().all())
+        return existing
+
+    @classmethod
+    async def count_active_links(cls, session: AsyncSession) -> int:
+        return await session.scalar(select(func.count()).select_from(URL).where(URL.is_active))
+
+    @classmethod
+    async def iter_active_keys(
+            cls,
+            session: AsyncSession,
+            id_from: int | None = None,
+            chunk_size: int = 10_000,
+        ) -> AsyncIterator[list[str]]:
+        query = select(URL.key).where(URL.is_active)
+        if id_from is not None:
+            query = query.where(URL.id >= id_from)
+        result = await session.stream_scalars(query.execution_options(yield_per=chunk_size))
+        async for keys in result.partitions():
+            yield keys
     
     @classmethod
-    async def get_all_user_urls(
+    def user_urls_query(
         cls,
-        session: AsyncSession,
-        user: APIUser,
-        ) -> list[UserLinks] | list:
-        query = await (
-            session
-            .execute(
-                select(URL)
-                .join(AuthUserUrl, URL.id == AuthUserUrl.url_id)
-                .where(AuthUserUrl.user_id == user.id, URL.is_active)                
-            )
+        user_id: int,
+        *columns,
+        status: LinkStatus = LinkStatus.ACTIVE,
+        cursor: int | None = None,
+        id_from: int | None = None,
+        id_to: int | None = None,
+        ) -> Select:
+        """
+        Newest first, keyset-paginated on ``URL.id``: snowflake ids grow with time,
+        so creation time bounds turn into id bounds as well.
+        """
+        query = (
+            select(*(columns or (URL,)))
+            .join(AuthUserUrl, URL.id == AuthUserUrl.url_id)
+            .where(AuthUserUrl.user_id == user_id)
         )
+        if status == LinkStatus.ACTIVE:
+            query = query.where(URL.is_active)
+        elif status == LinkStatus.INACTIVE:
+            query = query.where(~URL.is_active)
+        if cursor is not None:
+            query = query.where(URL.id < cursor)
+        if id_from is not None:
+            query = query.where(URL.id >= id_from)
+        if id_to is not None:
+            query = query.where(URL.id < id_to)
+        return query.order_by(URL.id.desc())
 
-        return [UserLinks.model_validate(data, from_attributes=True) for data in query.scalars().all()]
+    @classmethod
+    async def get_user_urls_page(
+        cls,
+        session: AsyncSession,
+        user: APIUser,
+        limit: int,
+        **filters,
+        ) -> list[URL]:
+        result = await session.execute(cls.user_urls_query(user.id, **filters).limit(limit))
+        return list(result.scalars().all())
     
     
+    @staticmethod
+    def _day_start(day: datetime.date) -> datetime.datetime:
+        return datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
+
     @classmethod
     async def get_url_metric(
         cls,
         session: AsyncSession,
         user: APIUser,
         url: URL,
-        ) -> list[UM] | list:
-        query = await (
-            session
-            .execute(
-                select(UrlMetric)
-                .where(UrlMetric.url_id == url.id)                
-            )
-        )
+        cursor: int | None = None,
+        limit: int = 100,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+        ) -> list[UrlMetric]:
+        query = select(UrlMetric).where(UrlMetric.url_id == url.id)
+        if cursor is not None:
+            query = query.where(UrlMetric.id > cursor)
+        if start is not None:
+            query = query.where(UrlMetric.date >= cls._day_start(start))
+        if end is not None:
+            query = query.where(UrlMetric.date < cls._day_start(end + datetime.timedelta(days=1)))
+
+        result = await session.execute(query.order_by(UrlMetric.id).limit(limit))
+        return list(result.scalars().all())
+
+    @classmethod
+    async def get_url_metric_rollups(
+        cls,
+        session: AsyncSession,
+        url: URL,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+        ) -> list[UrlMetricDaily]:
+        query = select(UrlMetricDaily).where(UrlMetricDaily.url_id == url.id)
+        if start is not None:
+            query = query.where(UrlMetricDaily.day >= start)
+        if end is not None:
+            query = query.where(UrlMetricDaily.day <= end)
 
-        return [UM.model_validate(data, from_attributes=True) for data in query.scalars().all()]
+        result = await session.execute(query)
+        return list(result.scalars().all())
 
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from urllib.parse import urljoin
+
+import aiohttp
+
+from shortener_app.cache import MISSING, TTLCache
+from shortener_app.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+REDIRECT_STATUSES = frozenset((301, 302, 303, 307, 308))
+# Servers that do not implement HEAD properly answer with one of these.
+HEAD_UNSUPPORTED_STATUSES = frozenset((405, 501))
+
+
+@dataclass(frozen=True, slots=True)
+class ResolvedLink:
+    url: str
+    hops: tuple[str, ...]
+    complete: bool = True
+
+
+class LinkResolver:
+    """
+    Follows redirect chains over one app-lifetime ``aiohttp`` session.
+    Every hop is a HEAD (GET when HEAD is refused) whose body is never read;
+    finished chains are cached and concurrent lookups of one url share a request.
+    """
+
+    def __init__(
+            self,
+            cache: TTLCache,
+            *,
+            max_hops: int,
+            timeout: float,
+            connect_timeout: float,
+            limit: int,
+            limit_per_host: int,
+            dns_cache_ttl: int,
+            verify_ssl: bool = False,
+        ) -> None:
+        self._cache = cache
+        self._max_hops = max_hops
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._dns_cache_ttl = dns_cache_ttl
+        self._verify_ssl = verify_ssl
+        self._session: aiohttp.ClientSession | None = None
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def start(self) -> None:
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self._limit,
+            limit_per_host=self._limit_per_host,
+            ttl_dns_cache=self._dns_cache_ttl,
+            ssl=None if self._verify_ssl else False,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+
+    async def stop(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def resolve(self, url: str) -> ResolvedLink:
+        cached = self._cache.get(url)
+        if cached is not MISSING:
+            return cached
+
+        inflight = self._inflight.get(url)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            resolved = await self._follow(url)
+        except BaseException as error:
+            future.set_exception(error)
+            # Nobody else may be waiting, do not let the loop warn about it.
+            future.exception()
+            raise
+        else:
+            future.set_result(resolved)
+            if resolved.complete:
+                # Every hop of a finished chain resolves to the same target.
+                for index, hop in enumerate(resolved.hops):
+                    self._cache.set(hop, ResolvedLink(url=resolved.url, hops=resolved.hops[index:]))
+            return resolved
+        finally:
+            del self._inflight[url]
+
+    async def _follow(self, url: str) -> ResolvedLink:
+        await self.start()
+        hops = [url]
+        current = url
+        while True:
+            try:
+                location = await self._probe(current)
+            except aiohttp.ClientConnectorError:
+                return ResolvedLink(url=current, hops=tuple(hops), complete=False)
+
+            if location is None:
+                return ResolvedLink(url=current, hops=tuple(hops))
+            if len(hops) > self._max_hops:
+                logger.info("Decode: more than %s redirects from %s", self._max_hops, url)
+                return ResolvedLink(url=current, hops=tuple(hops))
+
+            current = urljoin(current, location)
+            cached = self._cache.get(current)
+            if cached is not MISSING:
+                return ResolvedLink(url=cached.url, hops=(*hops, *cached.hops))
+            hops.append(current)
+
+    async def _probe(self, url: str) -> str | None:
+        """
+        Location of the redirect ``url`` answers with, ``None`` if it does not redirect.
+        """
+        async with self._session.head(url, allow_redirects=False) as response:
+            status, location = response.status, response.headers.get('Location')
+
+        if status in HEAD_UNSUPPORTED_STATUSES:
+            # Only the status line and headers are needed, leaving the block
+            # without reading the body drops the connection instead of draining it.
+            async with self._session.get(url, allow_redirects=False) as response:
+                status, location = response.status, response.headers.get('Location')
+
+        if status in REDIRECT_STATUSES and location:
+            return location
+        return None
+
+
+@lru_cache
+def get_link_resolver() -> LinkResolver:
+    settings = get_settings()
+    return LinkResolver(
+        TTLCache(maxsize=settings.DECODE_CACHE_SIZE, ttl=settings.DECODE_CACHE_TTL),
+        max_hops=settings.DECODE_MAX_HOPS,
+        timeout=settings.DECODE_TIMEOUT,
+        connect_timeout=settings.DECODE_CONNECT_TIMEOUT,
+        limit=settings.DECODE_POOL_LIMIT,
+        limit_per_host=settings.DECODE_POOL_LIMIT_PER_HOST,
+        dns_cache_ttl=settings.DECODE_DNS_CACHE_TTL,
+        verify_ssl=settings.DECODE_VERIFY_SSL,
+    )
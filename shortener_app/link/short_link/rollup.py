@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+from collections import defaultdict
+from typing import TYPE_CHECKING, Iterable
+
+from sqlalchemy import bindparam, delete, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shortener_app.database import async_session, dialect_insert
+from . import dto as schemas
+from .hll import HyperLogLog
+from .model import UrlMetric, UrlMetricDaily
+
+if TYPE_CHECKING:
+    from .clicks import ClickEvent
+
+
+BucketKey = tuple[int, datetime.date, str]
+
+
+class RollupWriter:
+    """
+    Maintains ``url_metric_daily``: clicks and a HyperLogLog of client ips
+    per ``(url_id, day, device)``, updated incrementally with every click batch.
+    """
+
+    async def apply(self, session: AsyncSession, events: Iterable['ClickEvent']) -> None:
+        buckets: dict[BucketKey, tuple[int, HyperLogLog]] = {}
+        for event in events:
+            key = (event.url_id, event.clicked_at.date(), event.device)
+            clicks, sketch = buckets.get(key) or (0, HyperLogLog())
+            sketch.add(event.ip)
+            buckets[key] = (clicks + 1, sketch)
+        await self.apply_buckets(session, buckets)
+
+    async def apply_buckets(self, session: AsyncSession, buckets: dict[BucketKey, tuple[int, HyperLogLog]]) -> None:
+        if not buckets:
+            return
+
+        keys = sorted(buckets)
+        table = UrlMetricDaily.__table__
+        insert = dialect_insert(session)
+        # Make sure every bucket exists, then lock them in key order and merge
+        # the sketches in Python; concurrent writers never overwrite each other.
+        await session.execute(
+            insert(table).on_conflict_do_nothing(),
+            [
+                dict(url_id=url_id, day=day, device=device, clicks=0, unique_ips=b'')
+                for url_id, day, device in keys
+            ],
+        )
+        result = await session.execute(
+            select(table.c.url_id, table.c.day, table.c.device, table.c.unique_ips)
+            .where(tuple_(table.c.url_id, table.c.day, table.c.device).in_(keys))
+            .order_by(table.c.url_id, table.c.day, table.c.device)
+            .with_for_update()
+        )
+
+        updates = []
+        for url_id, day, device, registers in result.all():
+            clicks, sketch = buckets[(url_id, day, device)]
+            merged = HyperLogLog.from_bytes(registers)
+            merged.merge(sketch)
+            updates.append(dict(
+                b_url_id=url_id,
+                b_day=day,
+                b_device=device,
+                b_clicks=clicks,
+                b_unique_ips=merged.to_bytes(),
+            ))
+
+        await session.execute(
+            update(table)
+            .where(
+                table.c.url_id == bindparam('b_url_id'),
+                table.c.day == bindparam('b_day'),
+                table.c.device == bindparam('b_device'),
+            )
+            .values(
+                clicks=table.c.clicks + bindparam('b_clicks'),
+                unique_ips=bindparam('b_unique_ips'),
+            ),
+            updates,
+        )
+
+
+def period_start(day: datetime.date, granularity: schemas.MetricGranularity) -> datetime.date:
+    if granularity == schemas.MetricGranularity.WEEK:
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == schemas.MetricGranularity.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def aggregate_rollups(
+        rows: Iterable[UrlMetricDaily],
+        group_by: set[schemas.MetricGroupBy],
+        granularity: schemas.MetricGranularity,
+    ) -> list[schemas.UrlMetricRollup]:
+    by_date = schemas.MetricGroupBy.DATE in group_by
+    by_device = schemas.MetricGroupBy.DEVICE in group_by
+
+    clicks: dict[tuple, int] = defaultdict(int)
+    sketches: dict[tuple, HyperLogLog] = {}
+    for row in rows:
+        key = (
+            period_start(row.day, granularity) if by_date else None,
+            row.device if by_device else None,
+        )
+        clicks[key] += row.clicks
+        sketches.setdefault(key, HyperLogLog()).merge(HyperLogLog.from_bytes(row.unique_ips))
+
+    return [
+        schemas.UrlMetricRollup(
+            period=period,
+            device=device,
+            clicks=clicks[(period, device)],
+            unique_ips=sketches[(period, device)].count(),
+        )
+        for period, device in sorted(clicks, key=lambda key: (key[0] or datetime.date.min, key[1] or ''))
+    ]
+
+
+async def rebuild_rollups(session: AsyncSession, chunk_size: int = 10_000) -> None:
+    """
+    Recomputes ``url_metric_daily`` from the raw ``url_metric`` rows.
+    """
+    await session.execute(delete(UrlMetricDaily))
+    writer = RollupWriter()
+    result = await session.stream(
+        select(UrlMetric.url_id, UrlMetric.date, UrlMetric.device, UrlMetric.ip)
+        .order_by(UrlMetric.url_id, UrlMetric.date)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for rows in result.partitions():
+        buckets: dict[BucketKey, tuple[int, HyperLogLog]] = {}
+        for url_id, date, device, ip in rows:
+            key = (url_id, date.date(), device)
+            clicks, sketch = buckets.get(key) or (0, HyperLogLog())
+            sketch.add(ip)
+            buckets[key] = (clicks + 1, sketch)
+        await writer.apply_buckets(session, buckets)
+    await session.commit()
+
+
+async def main() -> None:
+    async with async_session() as session:
+        await rebuild_rollups(session)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
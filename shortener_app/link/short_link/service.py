@@ -1,31 +1,89 @@
+import asyncio
+import csv
 import datetime
+import io
+import json
+import logging
 import secrets
 import string
+from collections import defaultdict
 from functools import lru_cache
+from typing import AsyncIterator, Iterable
+from urllib.parse import unquote, urlsplit
 
-import aiohttp
 from fastapi import Request, Security
 from fastapi.security import APIKeyHeader
-from snowflake import SnowflakeGenerator
+from redis.exceptions import RedisError
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from shortener_app.link.short_link.model import URL, UrlMetric
+from shortener_app.link.short_link.model import URL
 from shortener_app.security.auth.middleware.jwt.service import __try_to_get_clear_token
 
 
 from . import dto as schemas
 from shortener_app.config import get_settings
-from shortener_app.database import models
+from shortener_app.database import async_session, models
+from shortener_app.monitoring import KEY_FILTER_CHECKS, REDIRECT_STAGE_SECONDS
 from .repository import LinkRepository
+from .cache import CachedLink, RedirectCache, MISSING
+from .clicks import ClickEvent, ClickIngestor, write_clicks
+from .counter import ClickCounter
+from .devices import DeviceClassifier
+from .resolver import LinkResolver
+from .ids import get_snowflake_ids
+from .keys import SnowflakeKeyEncoder, snowflake_id_at
+from .keyfilter import KeyFilter
+from .pending import PendingClicks
+from .rollup import RollupWriter, aggregate_rollups
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ('key', 'secret_key', 'target_url', 'is_active', 'clicks')
+EXPORT_CHUNK_SIZE = 1000
+
+_KEY_FILTER_STAGE = REDIRECT_STAGE_SECONDS.labels(stage='key_filter')
+_CACHE_STAGE = REDIRECT_STAGE_SECONDS.labels(stage='cache')
+_DB_STAGE = REDIRECT_STAGE_SECONDS.labels(stage='db')
+_CLICK_STAGE = REDIRECT_STAGE_SECONDS.labels(stage='click')
+
 
 @lru_cache
-def get_snowflake_id()->int:
-    return SnowflakeGenerator(get_settings().snowflake_code)
+def get_own_hosts() -> frozenset[str]:
+    """
+    Hosts whose short links are resolved locally: the one of ``base_url`` and any aliases.
+    """
+    settings = get_settings()
+    hosts = {urlsplit(settings.base_url).netloc, *settings.SHORT_LINK_HOSTS}
+    return frozenset(host.lower() for host in hosts if host)
 
 
 class ShortLinkServise:
+    def __init__(
+            self,
+            redirect_cache: RedirectCache,
+            click_ingestor: ClickIngestor,
+            click_counter: ClickCounter,
+            rollup_writer: RollupWriter,
+            device_classifier: DeviceClassifier,
+            link_resolver: LinkResolver,
+            key_encoder: SnowflakeKeyEncoder | None = None,
+            own_hosts: frozenset[str] = frozenset(),
+            pending_clicks: PendingClicks | None = None,
+            key_filter: KeyFilter | None = None,
+        ) -> None:
+        self._redirect_cache = redirect_cache
+        self._click_ingestor = click_ingestor
+        self._click_counter = click_counter
+        self._rollup_writer = rollup_writer
+        self._device_classifier = device_classifier
+        self._link_resolver = link_resolver
+        self._key_encoder = key_encoder
+        self._own_hosts = own_hosts
+        self._pending_clicks = pending_clicks
+        self._key_filter = key_filter
+        self._max_hops = get_settings().DECODE_MAX_HOPS
 
     async def user_is_auth(
         request: Request,
@@ -39,6 +97,10 @@ class ShortLinkServise:
         return "".join(secrets.choice(chars) for _ in range(length))
 
 
+    def is_reserved_key(self, key: str) -> bool:
+        return self._key_encoder is not None and self._key_encoder.is_reserved(key)
+
+
     async def create_unique_random_key(self, db: Session) -> str:
         key = self.create_random_key()
         while await self.get_db_url_by_key(db, key):
@@ -52,9 +114,11 @@ class ShortLinkServise:
             url: schemas.URLBase,
             custom_key: str = ""
         ) -> models.URL:
-        id = self.__gen_snowflake_id()
+        id = get_snowflake_ids().next_id()
         if custom_key and custom_key.isalnum():
             key = custom_key
+        elif self._key_encoder:
+            key = self._key_encoder.encode(id)
         else: key = await self.create_unique_random_key(session)
         secret_key = f"{key}_{self.create_random_key(length=8)}"
         db_url = await (
@@ -67,11 +131,91 @@ class ShortLinkServise:
                 secret_key=secret_key,
             )
         )
+        await self._redirect_cache.invalidate(key, tombstone=False)
+        if self._key_filter is not None:
+            await self._key_filter.publish([key])
         return db_url
     
 
-    def __gen_snowflake_id(self) -> int:
-        return next(get_snowflake_id())
+    async def create_db_urls_bulk(
+            self,
+            session: AsyncSession,
+            user: models.APIUser,
+            items: list[schemas.URLBulkItem | None],
+        ) -> list[models.URL | str | None]:
+        """
+        Creates urls for all non-empty items in a single transaction.
+        The result is aligned with ``items``: a created url, an error message,
+        or ``None`` where the item was empty.
+        """
+        results: list[models.URL | str | None] = [None] * len(items)
+        custom: dict[str, int] = {}
+        generated: list[int] = []
+        for index, item in enumerate(items):
+            if item is None:
+                continue
+            if not item.name:
+                generated.append(index)
+            elif not item.name.isalnum():
+                results[index] = "Custom name must be alphanumeric"
+            elif self.is_reserved_key(item.name):
+                results[index] = "This name is reserved for generated links"
+            elif item.name in custom:
+                results[index] = "This name is already in use"
+            else:
+                custom[item.name] = index
+
+        for name in await LinkRepository.get_existing_keys(session, set(custom)):
+            results[custom.pop(name)] = "This name is already in use"
+
+        keys = {index: name for name, index in custom.items()}
+        if self._key_encoder is None:
+            random_keys = await self._allocate_random_keys(session, len(generated), taken=set(custom))
+            keys.update(zip(generated, random_keys))
+
+        db_urls = []
+        indexes = sorted(keys.keys() | set(generated))
+        # One block of ids for the whole batch.
+        for index, id in zip(indexes, get_snowflake_ids().allocate(len(indexes))):
+            key = keys[index] if index in keys else self._key_encoder.encode(id)
+            db_url = models.URL(
+                id=id,
+                key=key,
+                secret_key=f"{key}_{self.create_random_key(length=8)}",
+                target_url=items[index].target_url,
+                is_active=True,
+                clicks=0,
+            )
+            results[index] = db_url
+            db_urls.append(db_url)
+
+        inserted = await LinkRepository.add_user_links_bulk(session=session, user=user, urls=db_urls)
+        await session.commit()
+
+        for index, result in enumerate(results):
+            if isinstance(result, models.URL) and result.id not in inserted:
+                results[index] = "This name is already in use" if items[index].name else "Could not allocate a unique key"
+        created_keys = [db_url.key for db_url in db_urls if db_url.id in inserted]
+        await self._redirect_cache.invalidate_many(created_keys, tombstone=False)
+        if self._key_filter is not None:
+            await self._key_filter.publish(created_keys)
+        return results
+
+
+    async def _allocate_random_keys(
+            self,
+            session: AsyncSession,
+            count: int,
+            taken: set[str],
+        ) -> list[str]:
+        keys: list[str] = []
+        while len(keys) < count:
+            candidates = {self.create_random_key() for _ in range(count - len(keys))} - taken
+            existing = await LinkRepository.get_existing_keys(session, candidates)
+            fresh = candidates - existing
+            keys.extend(fresh)
+            taken |= candidates
+        return keys
     
 
     async def decode_short_link(
@@ -79,17 +223,69 @@ class ShortLinkServise:
             url: schemas.URLBase,
         ) -> schemas.URLBase:
         try:
-            connector = aiohttp.TCPConnector(ssl=False)
-            async with aiohttp.ClientSession(connector=connector) as sessn:
-                async with sessn.get(url.target_url, allow_redirects=True) as response:
-                    return schemas.URLDecode(url=str(response.url))
-                
-        except aiohttp.ClientConnectorError:
-            return schemas.URLDecode(url = url.target_url)
-        
+            target_url = await self._resolve_own_links(url.target_url)
+            if self._own_key(target_url) is not None:
+                return schemas.URLDecode(url=target_url)
+
+            resolved = await self._link_resolver.resolve(target_url)
+            return schemas.URLDecode(url=resolved.url)
+
         except Exception as e:
             return None
 
+    async def decode_short_links(
+            self,
+            urls: Iterable[str],
+            concurrency: int,
+            per_host: int,
+        ) -> AsyncIterator[tuple[str, schemas.URLDecode | None]]:
+        """
+        Decodes every distinct url once, at most ``concurrency`` at a time and
+        ``per_host`` against one host, yielding results as they complete.
+        """
+        limit = asyncio.Semaphore(concurrency)
+        host_limits: dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+        async def decode(url: str) -> tuple[str, schemas.URLDecode | None]:
+            # The host slot is taken first, so urls queued behind a busy host
+            # do not hold global slots that other hosts could use.
+            async with host_limits[urlsplit(url).netloc.lower()], limit:
+                return url, await self.decode_short_link(schemas.URLBase(target_url=url))
+
+        tasks = [asyncio.create_task(decode(url)) for url in dict.fromkeys(urls)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _own_key(self, url: str) -> str | None:
+        parts = urlsplit(url)
+        if parts.netloc.lower() not in self._own_hosts:
+            return None
+        key = unquote(parts.path).strip('/')
+        if not key or '/' in key:
+            return None
+        return key
+
+    async def _resolve_own_links(self, url: str) -> str:
+        """
+        Follows chains of our own short links through the redirect cache and
+        the key lookup, without an HTTP request and without counting a click.
+        Returns the first foreign url, or the last own one that does not resolve.
+        """
+        async with async_session() as session:
+            for _ in range(self._max_hops):
+                key = self._own_key(url)
+                if key is None:
+                    return url
+                link = await self.resolve_key(session, key)
+                if link is None:
+                    return url
+                url = link.target_url
+        return url
+
 
     async def get_db_url_by_key(
             self, 
@@ -110,6 +306,48 @@ class ShortLinkServise:
         return result.scalar_one_or_none()
 
 
+    async def resolve_key(
+            self,
+            session: AsyncSession,
+            url_key: str,
+        ) -> CachedLink|None:
+        link = await self.cached_link(url_key)
+        if link is not MISSING:
+            return link
+        return await self.load_link(session, url_key)
+
+
+    async def cached_link(self, url_key: str) -> CachedLink | None | object:
+        """
+        Answers from the key filter and the redirect cache alone,
+        ``MISSING`` means the database has to be asked.
+        """
+        # Unknown keys stop here, before the shared cache tier and the database.
+        if self._key_filter is not None:
+            with _KEY_FILTER_STAGE.time():
+                might_exist = self._key_filter.might_exist(url_key)
+            if not might_exist:
+                KEY_FILTER_CHECKS.labels(result='rejected').inc()
+                return None
+
+        with _CACHE_STAGE.time():
+            return await self._redirect_cache.get(url_key)
+
+
+    async def load_link(
+            self,
+            session: AsyncSession,
+            url_key: str,
+        ) -> CachedLink|None:
+        with _DB_STAGE.time():
+            db_url = await self.get_db_url_by_key(session, url_key)
+        link = CachedLink(id=db_url.id, target_url=db_url.target_url) if db_url else None
+        if self._key_filter is not None:
+            KEY_FILTER_CHECKS.labels(result='found' if link else 'missed').inc()
+        await self._redirect_cache.set(url_key, link)
+        return link
+
+
     async def get_db_url_by_secret_key(
             self,
             user: models.APIUser,
@@ -132,58 +370,198 @@ class ShortLinkServise:
         return result.scalar_one_or_none()
 
 
+    async def record_click(
+            self,
+            db: AsyncSession | None,
+            url_id: int,
+            user_agent: str | None,
+            ip: str,
+        ) -> None:
+        event = ClickEvent(url_id=url_id, ip=ip, user_agent=user_agent)
+        with _CLICK_STAGE.time():
+            if self._pending_clicks is None and self._click_ingestor.running:
+                await self._click_ingestor.submit(event)
+            else:
+                await self.update_db_clicks(db=db, event=event)
+
+
     async def update_db_clicks(
             self, 
-            db: AsyncSession, 
-            db_url: schemas.URL,
-            device: str,
-            ip: str,
-        ) -> models.URL:
-        
-        db_url.clicks += 1
-        await db.commit()
-        await db.refresh(db_url)
+            db: AsyncSession | None, 
+            event: ClickEvent,
+        ) -> None:
+        """
+        Without ``db`` a session is opened only if the click is written right away.
+        """
+        if self._pending_clicks is not None:
+            # Write-behind: the reconciler moves the click into the database later.
+            try:
+                await self._pending_clicks.add(event)
+                return
+            except RedisError:
+                logger.warning("Pending clicks: redis unavailable, writing the click directly", exc_info=True)
+
+        if db is None:
+            async with async_session() as session:
+                await self._write_click(session, event)
+        else:
+            await self._write_click(db, event)
 
-        metric = UrlMetric(
-            url_id=db_url.id,
-            device=device,
-            ip=ip,
-            date=datetime.datetime.now().strftime('%Y-%m-%d'),
+    async def _write_click(self, db: AsyncSession, event: ClickEvent) -> None:
+        await write_clicks(
+            db,
+            [event],
+            click_counter=self._click_counter,
+            rollup_writer=self._rollup_writer,
+            device_classifier=self._device_classifier,
         )
-        db.add(metric)
         await db.commit()
 
-        return db_url
+    async def click_totals(
+            self,
+            db: AsyncSession,
+            urls: Iterable[models.URL],
+            ) -> dict[int, int]:
+        """
+        Persisted clicks plus the ones still waiting in the write-behind store.
+        """
+        totals = await self._click_counter.totals(db, urls)
+        if self._pending_clicks is None or not totals:
+            return totals
+
+        try:
+            pending = await self._pending_clicks.pending(totals)
+        except RedisError:
+            logger.warning("Pending clicks: redis unavailable, returning persisted counts", exc_info=True)
+            return totals
+        return {url_id: clicks + pending.get(url_id, 0) for url_id, clicks in totals.items()}
     
     async def all_urls(
             self,
             db: AsyncSession,
             request: Request,
-            ):
+            cursor: int | None = None,
+            limit: int = 100,
+            status: schemas.LinkStatus = schemas.LinkStatus.ACTIVE,
+            created_from: datetime.datetime | None = None,
+            created_to: datetime.datetime | None = None,
+            ) -> schemas.UserLinksPage:
         
-        return await (
+        db_urls = await (
             LinkRepository
-            .get_all_user_urls(
+            .get_user_urls_page(
                 session=db, 
                 user=request.state.user,
+                limit=limit,
+                cursor=cursor,
+                status=status,
+                id_from=snowflake_id_at(created_from) if created_from else None,
+                id_to=snowflake_id_at(created_to) if created_to else None,
                 )
             )
+        clicks = await self.click_totals(db, db_urls)
+        return schemas.UserLinksPage(
+            items=[
+                schemas.UserLinks(
+                    target_url=db_url.target_url,
+                    clicks=clicks[db_url.id],
+                    key=db_url.key,
+                    secret_key=db_url.secret_key,
+                    is_active=db_url.is_active,
+                )
+                for db_url in db_urls
+            ],
+            next_cursor=db_urls[-1].id if len(db_urls) == limit else None,
+        )
+
+    async def export_urls(
+            self,
+            user_id: int,
+            format: schemas.ExportFormat,
+            status: schemas.LinkStatus = schemas.LinkStatus.ACTIVE,
+            created_from: datetime.datetime | None = None,
+            created_to: datetime.datetime | None = None,
+            ) -> AsyncIterator[str]:
+        """
+        Streams all matching links through a server-side cursor, one chunk at a time.
+        Runs after the request session is gone, so it opens its own.
+        """
+        query = LinkRepository.user_urls_query(
+            user_id,
+            models.URL.id, models.URL.key, models.URL.secret_key,
+            models.URL.target_url, models.URL.is_active, models.URL.clicks,
+            status=status,
+            id_from=snowflake_id_at(created_from) if created_from else None,
+            id_to=snowflake_id_at(created_to) if created_to else None,
+        )
+        if format == schemas.ExportFormat.CSV:
+            yield ','.join(EXPORT_COLUMNS) + '\r\n'
+
+        async with async_session() as session:
+            result = await session.stream(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+            async for rows in result.partitions():
+                clicks = await self.click_totals(session, rows)
+                records = [
+                    (row.key, row.secret_key, row.target_url, row.is_active, clicks[row.id])
+                    for row in rows
+                ]
+                if format == schemas.ExportFormat.CSV:
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows(records)
+                    yield buffer.getvalue()
+                else:
+                    yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, record))) + '\n' for record in records)
+
+    async def total_clicks(
+            self,
+            db: AsyncSession,
+            db_url: models.URL,
+            ) -> int:
+        clicks = await self.click_totals(db, [db_url])
+        return clicks[db_url.id]
     
     async def metric_url(
             self,
             db: AsyncSession,
             request: Request,
             url: URL,
-            ):
+            mode: schemas.MetricMode = schemas.MetricMode.ROLLUP,
+            group_by: set[schemas.MetricGroupBy] = frozenset({schemas.MetricGroupBy.DATE}),
+            granularity: schemas.MetricGranularity = schemas.MetricGranularity.DAY,
+            start: datetime.date | None = None,
+            end: datetime.date | None = None,
+            cursor: int | None = None,
+            limit: int = 100,
+            ) -> list[schemas.UrlMetricRollup] | schemas.UrlMetricPage:
         
-        return await (
+        if mode == schemas.MetricMode.ROLLUP:
+            rows = await (
+                LinkRepository
+                .get_url_metric_rollups(
+                    session=db,
+                    url=url,
+                    start=start,
+                    end=end,
+                    )
+                )
+            return aggregate_rollups(rows, group_by=group_by, granularity=granularity)
+
+        metrics = await (
             LinkRepository
             .get_url_metric(
                 session=db, 
                 user=request.state.user,
                 url=url,
+                cursor=cursor,
+                limit=limit,
+                start=start,
+                end=end,
                 )
             )
+        return schemas.UrlMetricPage(
+            items=[schemas.UrlMetric.model_validate(metric, from_attributes=True) for metric in metrics],
+            next_cursor=metrics[-1].id if len(metrics) == limit else None,
+        )
 
     async def deactivate_db_url_by_secret_key(
             self,
@@ -197,4 +575,5 @@ class ShortLinkServise:
             db_url.is_active = False
             await db.commit()
             await db.refresh(db_url)
+            await self._redirect_cache.invalidate(db_url.key)
         return db_url
\ No newline at end of file
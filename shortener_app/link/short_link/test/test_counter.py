@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from shortener_app.database import async_engine, async_session, models
+from shortener_app.database.migrate import run_migrations
+from shortener_app.link.short_link.cache import get_redirect_cache
+from shortener_app.link.short_link.clicks import get_click_ingestor
+from shortener_app.link.short_link.counter import ClickCounter, CounterMode
+from shortener_app.link.short_link.devices import get_device_classifier
+from shortener_app.link.short_link.resolver import get_link_resolver
+from shortener_app.link.short_link.rollup import RollupWriter
+from shortener_app.link.short_link.service import ShortLinkServise
+
+
+WORKERS = 8
+CLICKS = 25
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:131.0) Gecko/20100101 Firefox/131.0'
+
+
+def make_service(click_counter: ClickCounter) -> ShortLinkServise:
+    # The ingestor is never started, so every click is written by the caller.
+    return ShortLinkServise(
+        redirect_cache=get_redirect_cache(),
+        click_ingestor=get_click_ingestor(),
+        click_counter=click_counter,
+        rollup_writer=RollupWriter(),
+        device_classifier=get_device_classifier(),
+        link_resolver=get_link_resolver(),
+    )
+
+
+async def _count_concurrent_clicks(service: ShortLinkServise, url_id: int) -> int:
+    await run_migrations()
+    async with async_session() as session:
+        session.add(models.URL(id=url_id, key=f'clicks_{url_id}', secret_key=f'clicks_secret_{url_id}',
+                               target_url='https://example.com'))
+        await session.commit()
+
+    async def worker(index: int) -> None:
+        for click in range(CLICKS):
+            ip = f'10.0.{index}.{click}'
+            if click % 2:
+                await service.record_click(db=None, url_id=url_id, user_agent=USER_AGENT, ip=ip)
+            else:
+                async with async_session() as session:
+                    await service.record_click(db=session, url_id=url_id, user_agent=USER_AGENT, ip=ip)
+
+    await asyncio.gather(*(worker(index) for index in range(WORKERS)))
+
+    async with async_session() as session:
+        db_url = await session.get(models.URL, url_id)
+        total = (await service.click_totals(session, [db_url]))[url_id]
+    await async_engine.dispose()
+    return total
+
+
+# SQLite serializes the writers; TEST_DATABASE_URL on PostgreSQL races them for real.
+@pytest.mark.parametrize('mode, url_id', [(CounterMode.ROW, 1), (CounterMode.SHARDED, 2)])
+def test_concurrent_clicks_are_all_counted(mode, url_id):
+    service = make_service(ClickCounter(mode=mode, shards=4))
+    assert asyncio.run(_count_concurrent_clicks(service, url_id)) == WORKERS * CLICKS
@@ -0,0 +1,19 @@
+import pytest
+
+from shortener_app.config import get_settings
+from shortener_app.link.short_link.pending import ClickWriteMode, get_pending_clicks
+
+
+@pytest.fixture
+def write_behind(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, 'CLICK_WRITE_MODE', ClickWriteMode.WRITE_BEHIND)
+    monkeypatch.setattr(settings, 'REDIS_ENABLED', False)
+    get_pending_clicks.cache_clear()
+    yield
+    get_pending_clicks.cache_clear()
+
+
+def test_write_behind_needs_redis(write_behind):
+    with pytest.raises(ValueError, match='REDIS_ENABLED'):
+        get_pending_clicks()
@@ -0,0 +1,58 @@
+import argparse
+import array
+import asyncio
+import json
+import multiprocessing
+import os
+
+import pytest
+from alembic import command
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.snowflake_ids import run_process
+from shortener_app.database.migrate import get_alembic_config
+
+
+PROCESSES = 4
+
+
+async def _migrate(db_url: str) -> None:
+    engine = create_async_engine(db_url)
+    async with engine.begin() as connection:
+        await connection.run_sync(lambda sync: command.upgrade(get_alembic_config(sync), 'head'))
+    await engine.dispose()
+
+
+@pytest.mark.parametrize('lease', ['file', 'database'])
+def test_processes_lease_distinct_worker_ids(tmp_path, lease):
+    args = argparse.Namespace(processes=PROCESSES, ids=20_000, block=100, lease=lease, clock_jitter=0.01)
+    workdir = str(tmp_path)
+    asyncio.run(_migrate(f'sqlite+aiosqlite:///{os.path.join(workdir, "ids.db")}'))
+
+    # Started together like uvicorn workers; each holds its lease until all have generated.
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(PROCESSES)
+    processes = [
+        context.Process(target=run_process, args=(args, workdir, index, barrier))
+        for index in range(PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=120)
+    assert [process.exitcode for process in processes] == [0] * PROCESSES
+
+    worker_ids, seen, total = set(), set(), 0
+    for index in range(PROCESSES):
+        with open(os.path.join(workdir, f'{index}.json')) as file:
+            worker_ids.add(json.load(file)['worker_id'])
+        generated = array.array('Q')
+        with open(os.path.join(workdir, f'{index}.ids'), 'rb') as file:
+            generated.frombytes(file.read())
+        assert all(before < after for before, after in zip(generated, generated[1:]))
+        total += len(generated)
+        seen.update(generated)
+
+    assert len(worker_ids) == PROCESSES
+    assert total == PROCESSES * args.ids
+    assert len(seen) == total
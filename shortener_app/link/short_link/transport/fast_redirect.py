@@ -0,0 +1,93 @@
+from functools import lru_cache
+from urllib.parse import quote
+
+from starlette.routing import Mount, Route
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from shortener_app.cache import MISSING
+from shortener_app.database import async_session
+from shortener_app.monitoring import FAST_REDIRECTS
+from .router import get_short_link_servise
+
+
+_REDIRECTED = FAST_REDIRECTS.labels(result='redirected')
+_PASSED = FAST_REDIRECTS.labels(result='passed')
+
+_RESPONSE_HEADERS = [(b'content-length', b'0')]
+_EMPTY_BODY = {'type': 'http.response.body', 'body': b''}
+
+
+@lru_cache(maxsize=10_000)
+def location_header(target_url: str) -> tuple[bytes, bytes]:
+    # Quoted like starlette's RedirectResponse.
+    return b'location', quote(target_url, safe=":/%#?=@[]!$&'()*+,;").encode('latin-1')
+
+
+def _reserved_paths(app) -> frozenset[str]:
+    paths = set()
+    for route in app.routes:
+        if isinstance(route, (Route, Mount)) and '{' not in route.path:
+            paths.add(route.path)
+    return frozenset(paths)
+
+
+class FastRedirectMiddleware:
+    """
+    Serves ``GET /{url_key}`` straight from ASGI: no routing, dependencies or
+    models, and a database session only when the redirect cache misses.
+    Anything else, including CORS requests (they carry ``Origin``) and keys
+    that do not resolve, goes on to the app and its regular route.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._service = get_short_link_servise()
+        self._reserved: frozenset[str] | None = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            return await self.app(scope, receive, send)
+
+        path = scope['path']
+        if path.count('/') != 1 or len(path) < 2:
+            return await self.app(scope, receive, send)
+        if self._reserved is None:
+            # Routes are registered after the middleware, read them on first use.
+            self._reserved = _reserved_paths(scope['app'])
+        if path in self._reserved:
+            return await self.app(scope, receive, send)
+
+        user_agent = forwarded_for = None
+        for name, value in scope['headers']:
+            if name == b'user-agent':
+                user_agent = value.decode('latin-1')
+            elif name == b'x-forwarded-for':
+                forwarded_for = value.decode('latin-1')
+            elif name == b'origin':
+                _PASSED.inc()
+                return await self.app(scope, receive, send)
+
+        url_key = path[1:]
+        link = await self._service.cached_link(url_key)
+        if link is MISSING:
+            async with async_session() as session:
+                link = await self._service.load_link(session, url_key)
+        if link is None:
+            # The route answers unknown keys, from the cache entry just written.
+            _PASSED.inc()
+            return await self.app(scope, receive, send)
+
+        if forwarded_for:
+            ip = forwarded_for.split(',')[0]
+        else:
+            client = scope.get('client')
+            ip = client[0] if client else ''
+        await self._service.record_click(None, url_id=link.id, user_agent=user_agent, ip=ip)
+
+        _REDIRECTED.inc()
+        await send({
+            'type': 'http.response.start',
+            'status': 307,
+            'headers': [location_header(link.target_url), *_RESPONSE_HEADERS],
+        })
+        await send(_EMPTY_BODY)
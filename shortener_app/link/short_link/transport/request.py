@@ -0,0 +1,63 @@
+import json
+from typing import AsyncIterator
+
+from fastapi import Request
+from pydantic import BaseModel, ValidationError
+
+from .. import dto as schemas
+from ..errors import raise_bad_request
+
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+
+
+async def _iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buffer = b''
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line
+    yield buffer
+
+
+def _parse_item(model: type[BaseModel], raw) -> BaseModel | str:
+    try:
+        return model.model_validate(raw)
+    except ValidationError as error:
+        return error.errors()[0].get('msg', 'Invalid item')
+
+
+async def read_items(request: Request, model: type[BaseModel], max_items: int) -> list[BaseModel | str]:
+    """
+    Reads a JSON array or an NDJSON stream of ``model`` items.
+    Items that cannot be parsed are replaced with their error message.
+    """
+    content_type = request.headers.get('content-type', '').split(';')[0].strip()
+    items: list[BaseModel | str] = []
+
+    if content_type in NDJSON_CONTENT_TYPES:
+        async for line in _iter_lines(request.stream()):
+            if not line.strip():
+                continue
+            if len(items) >= max_items:
+                raise_bad_request(message=f"No more than {max_items} items per request")
+            try:
+                items.append(_parse_item(model, json.loads(line)))
+            except ValueError:
+                items.append("Invalid JSON")
+        return items
+
+    try:
+        body = await request.json()
+    except ValueError:
+        raise_bad_request(message="Body must be a JSON array or an NDJSON stream")
+    if not isinstance(body, list):
+        raise_bad_request(message="Body must be a JSON array or an NDJSON stream")
+    if len(body) > max_items:
+        raise_bad_request(message=f"No more than {max_items} items per request")
+    return [_parse_item(model, raw) for raw in body]
+
+
+async def read_bulk_items(request: Request, max_items: int) -> list[schemas.URLBulkItem | str]:
+    return await read_items(request, schemas.URLBulkItem, max_items)
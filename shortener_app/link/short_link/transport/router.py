@@ -1,22 +1,33 @@
+import datetime
+import json
 from functools import lru_cache
 
 import validators
-from fastapi import Depends, APIRouter, HTTPException, Request, Security
+from fastapi import Depends, APIRouter, HTTPException, Query, Request, Security
 from fastapi.security import APIKeyHeader
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.datastructures import URL
 from sqlalchemy.ext.asyncio import AsyncSession
-from user_agents import parse
 
 from shortener_app.security.auth.middleware.jwt.service import check_access_token
 from shortener_app.security.auth.service import AuthService
 from shortener_app.security.auth.transport.router import get_auth_service
 
-from ..service import ShortLinkServise
+from ..service import ShortLinkServise, get_own_hosts
+from ..cache import get_redirect_cache
+from ..clicks import get_click_ingestor
+from ..counter import get_click_counter
+from ..devices import get_device_classifier
+from ..keyfilter import get_key_filter
+from ..pending import get_pending_clicks
+from ..resolver import get_link_resolver
+from ..keys import get_key_encoder
+from ..rollup import RollupWriter
 from ..errors import raise_not_found, raise_bad_request
 from .. import dto as schemas
+from .request import read_bulk_items, read_items
 from shortener_app.database import models, get_db
 from shortener_app.config import get_settings
 
@@ -25,18 +36,36 @@ link_route = APIRouter(tags=["short-link"])
 
 @lru_cache
 def get_short_link_servise() -> ShortLinkServise:
-    return ShortLinkServise()
+    return ShortLinkServise(
+        redirect_cache=get_redirect_cache(),
+        click_ingestor=get_click_ingestor(),
+        click_counter=get_click_counter(),
+        rollup_writer=RollupWriter(),
+        device_classifier=get_device_classifier(),
+        link_resolver=get_link_resolver(),
+        key_encoder=get_key_encoder(),
+        own_hosts=get_own_hosts(),
+        pending_clicks=get_pending_clicks(),
+        key_filter=get_key_filter(),
+    )
 
 crud = get_short_link_servise()
 
-def get_admin_info(db_url: models.URL) -> schemas.URLInfo:
+@lru_cache
+def get_admin_path_template() -> str:
+    return link_route.url_path_for("administration info", secret_key="{secret_key}")
+
+
+def get_admin_info(db_url: models.URL, clicks: int | None = None) -> schemas.URLInfo:
     base_url = URL(get_settings().base_url)
-    admin_endpoint = link_route.url_path_for(
-        "administration info", secret_key=db_url.secret_key
+    admin_endpoint = get_admin_path_template().format(secret_key=db_url.secret_key)
+    return schemas.URLInfo(
+        target_url=db_url.target_url,
+        is_active=db_url.is_active,
+        clicks=db_url.clicks if clicks is None else clicks,
+        url=str(base_url.replace(path=db_url.key)),
+        admin_url=str(base_url.replace(path=admin_endpoint)),
     )
-    db_url.url = str(base_url.replace(path=db_url.key))
-    db_url.admin_url = str(base_url.replace(path=admin_endpoint))
-    return db_url
 
 
 @link_route.get("/")
@@ -99,6 +128,8 @@ async def create_url_c_u(
     if not validators.url(url.target_url):
         raise_bad_request(message="Your provided URL is not valid")
 
+    if crud.is_reserved_key(url.name):
+        raise_bad_request(message="This name is reserved for generated links")
     if await crud.get_db_url_by_key(db, url.name):
         raise_bad_request(message="This name is already in user")
     db_url: models.URL = await crud.create_db_url(session=db, url=url, custom_key=url.name)
@@ -112,6 +143,36 @@ async def create_url_c_u(
     return get_admin_info(db_url)
 
 
+@link_route.post(
+    "/auth/urls/bulk",
+    dependencies=[Security(check_access_token)],
+)
+async def create_urls_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    ):
+    items = await read_bulk_items(request, max_items=get_settings().BULK_MAX_ITEMS)
+    for index, item in enumerate(items):
+        if not isinstance(item, str) and not validators.url(item.target_url):
+            items[index] = "Your provided URL is not valid"
+
+    created = await crud.create_db_urls_bulk(
+        session=db,
+        user=request.state.user,
+        items=[None if isinstance(item, str) else item for item in items],
+    )
+
+    def lines():
+        for index, (item, result) in enumerate(zip(items, created)):
+            if isinstance(result, models.URL):
+                line = dict(index=index, **get_admin_info(result).model_dump())
+            else:
+                line = dict(index=index, error=item if isinstance(item, str) else result)
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @link_route.get("/{url_key}")
 async def forward_to_target_url(
         url_key: str,
@@ -119,22 +180,13 @@ async def forward_to_target_url(
         db: AsyncSession = Depends(get_db)
     ):
     user_agent = request.headers.get("User-Agent")
-    device = ""
     if request.headers.get("x-forwarded-for"):
         ip = request.headers["x-forwarded-for"].split(",")[0]
     else:
         ip = request.client.host
-    if user_agent:
-        user_agent = parse(user_agent)
-        if user_agent.is_mobile:
-            device = "mobile"
-        elif user_agent.is_pc:
-            device = "desktop"
-        else:
-            device = "tablet"
-    if db_url := await crud.get_db_url_by_key(session=db, url_key=url_key):
-        await crud.update_db_clicks(db=db, db_url=db_url, device=device, ip=ip)
-        return RedirectResponse(db_url.target_url)
+    if link := await crud.resolve_key(session=db, url_key=url_key):
+        await crud.record_click(db=db, url_id=link.id, user_agent=user_agent, ip=ip)
+        return RedirectResponse(link.target_url)
     else:
         raise_not_found(request)
 
@@ -152,6 +204,43 @@ async def decode_link(
     return await crud.decode_short_link(url=url)
 
 
+@link_route.post(
+    "/decode-shrt-link/batch",
+    dependencies=[Security(check_access_token)],
+)
+async def decode_links_batch(request: Request):
+    settings = get_settings()
+    items = await read_items(request, schemas.URLBase, max_items=settings.DECODE_BATCH_MAX_ITEMS)
+
+    invalid: list[dict] = []
+    indexes: dict[str, list[int]] = {}
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            invalid.append(dict(index=index, error=item))
+        elif not validators.url(item.target_url):
+            invalid.append(dict(index=index, error="Your provided URL is not valid"))
+        else:
+            indexes.setdefault(item.target_url, []).append(index)
+
+    async def lines():
+        for line in invalid:
+            yield json.dumps(line) + "\n"
+        results = crud.decode_short_links(
+            indexes,
+            concurrency=settings.DECODE_BATCH_CONCURRENCY,
+            per_host=settings.DECODE_BATCH_PER_HOST,
+        )
+        async for target_url, decoded in results:
+            line = dict(indexes=indexes[target_url], target_url=target_url)
+            if decoded is None:
+                line.update(error="Could not decode the URL")
+            else:
+                line.update(url=decoded.url)
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @link_route.get(
     "/admin/{secret_key}",
     name="administration info",
@@ -163,21 +252,48 @@ async def get_url_info(
     db: AsyncSession = Depends(get_db)
 ):
     if db_url := await crud.get_db_url_by_secret_key(db, secret_key=secret_key):
-        return get_admin_info(db_url)
+        return get_admin_info(db_url, clicks=await crud.total_clicks(db, db_url))
     else:
         raise_not_found(request)
 
 
 @link_route.get(
     path="/u/urls",
-    dependencies=[Security(check_access_token)]
+    dependencies=[Security(check_access_token)],
+    response_model=schemas.UserLinksPage,
+    responses={200: {"content": {"text/csv": {}, "application/x-ndjson": {}}}},
 )
 async def get_user_urls(
     request: Request, 
+    cursor: int | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    status: schemas.LinkStatus = schemas.LinkStatus.ACTIVE,
+    created_from: datetime.datetime | None = None,
+    created_to: datetime.datetime | None = None,
+    format: schemas.ExportFormat = schemas.ExportFormat.JSON,
     db: AsyncSession = Depends(get_db),
     short_link_service: ShortLinkServise = Depends(get_short_link_servise)
-):
-    return await short_link_service.all_urls(db, request=request)
+) -> schemas.UserLinksPage | StreamingResponse:
+    if format != schemas.ExportFormat.JSON:
+        return StreamingResponse(
+            short_link_service.export_urls(
+                user_id=request.state.user.id,
+                format=format,
+                status=status,
+                created_from=created_from,
+                created_to=created_to,
+            ),
+            media_type="text/csv" if format == schemas.ExportFormat.CSV else "application/x-ndjson",
+        )
+    return await short_link_service.all_urls(
+        db,
+        request=request,
+        cursor=cursor,
+        limit=limit,
+        status=status,
+        created_from=created_from,
+        created_to=created_to,
+    )
 
 
 @link_route.get(
@@ -187,11 +303,29 @@ async def get_user_urls(
 async def get_url_metric(
     url_key: str,
     request: Request, 
+    mode: schemas.MetricMode = schemas.MetricMode.ROLLUP,
+    group_by: list[schemas.MetricGroupBy] = Query(default=[schemas.MetricGroupBy.DATE]),
+    granularity: schemas.MetricGranularity = schemas.MetricGranularity.DAY,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    cursor: int | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
     db: AsyncSession = Depends(get_db),
     short_link_service: ShortLinkServise = Depends(get_short_link_servise)
 ):
     if db_url := await crud.get_db_url_by_key(session=db, url_key=url_key):
-        return await short_link_service.metric_url(db, request=request, url=db_url)
+        return await short_link_service.metric_url(
+            db,
+            request=request,
+            url=db_url,
+            mode=mode,
+            group_by=set(group_by),
+            granularity=granularity,
+            start=start,
+            end=end,
+            cursor=cursor,
+            limit=limit,
+        )
     else:
         raise_not_found(request)
 
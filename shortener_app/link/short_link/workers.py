@@ -0,0 +1,287 @@
+import asyncio
+import datetime
+import fcntl
+import logging
+import os
+import socket
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+
+from redis.asyncio import Redis
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from shortener_app.cache import get_redis
+from shortener_app.config import get_settings
+from shortener_app.database import async_session, dialect_insert
+from shortener_app.monitoring import SNOWFLAKE_WORKER_ID
+from .ids import MAX_WORKER_ID, SnowflakeIds, get_snowflake_ids
+from .model import SnowflakeWorker
+
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerLeaseMode:
+    # SNOWFLAKE_CODE as is, for a single process.
+    STATIC = 'static'
+    FILE = 'file'
+    REDIS = 'redis'
+    DATABASE = 'database'
+
+
+@dataclass(slots=True)
+class WorkerLease:
+    worker_id: int
+    # Last millisecond the previous owner used, ids continue after it.
+    last_ms: int = 0
+
+
+def _owner() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class FileWorkerLeases:
+    """
+    Worker ids from ``flock``-ed files in a local directory: unique among the
+    processes of one host, released by the kernel when a process dies.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+        self._fd: int | None = None
+
+    async def acquire(self) -> WorkerLease:
+        os.makedirs(self._directory, exist_ok=True)
+        for worker_id in range(MAX_WORKER_ID + 1):
+            fd = os.open(os.path.join(self._directory, f'worker-{worker_id}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            self._fd = fd
+            last_ms = os.pread(fd, 32, 0).strip()
+            return WorkerLease(worker_id=worker_id, last_ms=int(last_ms or 0))
+        raise RuntimeError(f"All {MAX_WORKER_ID + 1} worker ids in {self._directory} are locked")
+
+    async def renew(self, last_ms: int) -> bool:
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, str(last_ms).encode(), 0)
+        return True
+
+    async def release(self, last_ms: int) -> None:
+        await self.renew(last_ms)
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+# KEYS: key prefix. ARGV: owner, ttl in ms, highest worker id.
+_ACQUIRE_SCRIPT = """
+for worker_id = 0, tonumber(ARGV[3]) do
+    local key = KEYS[1] .. worker_id
+    if redis.call('SET', key, ARGV[1], 'NX', 'PX', ARGV[2]) then
+        return {worker_id, redis.call('GET', key .. ':last') or '0'}
+    end
+end
+return nil
+"""
+
+# KEYS: lease, last ms. ARGV: owner, ttl in ms (0 releases), last ms.
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[2], ARGV[3])
+if tonumber(ARGV[2]) > 0 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+else
+    redis.call('DEL', KEYS[1])
+end
+return 1
+"""
+
+
+class RedisWorkerLeases:
+    """
+    Worker ids as expiring Redis keys, unique across hosts sharing the Redis.
+    """
+
+    def __init__(self, redis: Redis, *, ttl: float, prefix: str = 'snowflake:worker:') -> None:
+        self._ttl_ms = int(ttl * 1000)
+        self._prefix = prefix
+        self._owner = _owner()
+        self._worker_id: int | None = None
+        self._acquire_script = redis.register_script(_ACQUIRE_SCRIPT)
+        self._renew_script = redis.register_script(_RENEW_SCRIPT)
+
+    async def acquire(self) -> WorkerLease:
+        leased = await self._acquire_script(keys=[self._prefix], args=[self._owner, self._ttl_ms, MAX_WORKER_ID])
+        if leased is None:
+            raise RuntimeError(f"All {MAX_WORKER_ID + 1} worker ids are leased in redis")
+        self._worker_id = int(leased[0])
+        return WorkerLease(worker_id=self._worker_id, last_ms=int(leased[1]))
+
+    async def renew(self, last_ms: int, ttl_ms: int | None = None) -> bool:
+        key = f'{self._prefix}{self._worker_id}'
+        renewed = await self._renew_script(
+            keys=[key, key + ':last'],
+            args=[self._owner, self._ttl_ms if ttl_ms is None else ttl_ms, last_ms],
+        )
+        return bool(renewed)
+
+    async def release(self, last_ms: int) -> None:
+        await self.renew(last_ms, ttl_ms=0)
+
+
+class DatabaseWorkerLeases:
+    """
+    Worker ids as expiring rows of ``snowflake_worker``, unique across hosts
+    sharing the database. A free id is one without a row or with an expired one.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession], *, ttl: float) -> None:
+        self._session_factory = session_factory
+        self._ttl = datetime.timedelta(seconds=ttl)
+        self._owner = _owner()
+        self._worker_id: int | None = None
+
+    async def acquire(self) -> WorkerLease:
+        async with self._session_factory() as session:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            result = await session.execute(
+                select(SnowflakeWorker.worker_id, SnowflakeWorker.expires_at > now)
+            )
+            live = dict(result.all())
+            for worker_id in range(MAX_WORKER_ID + 1):
+                if live.get(worker_id):
+                    continue
+                # Another process may take the same id meanwhile: both statements
+                # only succeed for one of them.
+                if worker_id in live:
+                    statement = (
+                        update(SnowflakeWorker)
+                        .where(SnowflakeWorker.worker_id == worker_id, SnowflakeWorker.expires_at <= now)
+                        .values(owner=self._owner, expires_at=now + self._ttl)
+                    )
+                else:
+                    statement = (
+                        dialect_insert(session)(SnowflakeWorker)
+                        .values(worker_id=worker_id, owner=self._owner, expires_at=now + self._ttl, last_ms=0)
+                        .on_conflict_do_nothing()
+                    )
+                result = await session.execute(statement.returning(SnowflakeWorker.last_ms))
+                last_ms = result.scalar_one_or_none()
+                if last_ms is not None:
+                    await session.commit()
+                    self._worker_id = worker_id
+                    return WorkerLease(worker_id=worker_id, last_ms=last_ms)
+        raise RuntimeError(f"All {MAX_WORKER_ID + 1} worker ids are leased in the database")
+
+    async def renew(self, last_ms: int, ttl: datetime.timedelta | None = None) -> bool:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        async with self._session_factory() as session:
+            result = await session.execute(
+                update(SnowflakeWorker)
+                .where(SnowflakeWorker.worker_id == self._worker_id, SnowflakeWorker.owner == self._owner)
+                .values(expires_at=now + (self._ttl if ttl is None else ttl), last_ms=last_ms)
+            )
+            await session.commit()
+        return result.rowcount == 1
+
+    async def release(self, last_ms: int) -> None:
+        await self.renew(last_ms, ttl=datetime.timedelta(0))
+
+
+WorkerLeases = FileWorkerLeases | RedisWorkerLeases | DatabaseWorkerLeases
+
+
+class WorkerIdAllocator:
+    """
+    Gives this process a worker id of its own: leased at startup, renewed every
+    third of the TTL and handed back, with the last millisecond used, on
+    shutdown. If the lease cannot be taken startup fails: file locks are no
+    fallback, as they know nothing of the ids leased through the database or
+    Redis, here or on other hosts. Should renewals keep failing until the
+    lease runs out, id generation stops rather than risk duplicates.
+    """
+
+    def __init__(
+            self,
+            ids: SnowflakeIds,
+            leases: WorkerLeases,
+            *,
+            ttl: float,
+        ) -> None:
+        self._ids = ids
+        self._leases = leases
+        self._ttl = ttl
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        started = time.monotonic()
+        self._apply(await self._leases.acquire(), started)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='snowflake-worker-lease')
+
+    def _apply(self, lease: WorkerLease, started: float) -> None:
+        self._ids.reset(lease.worker_id, lease.last_ms, lease_deadline=self._deadline(started))
+        SNOWFLAKE_WORKER_ID.set(lease.worker_id)
+        logger.info("Worker id %s leased", lease.worker_id)
+
+    def _deadline(self, started: float) -> float | None:
+        # File locks are held until the process exits, they cannot run out.
+        if isinstance(self._leases, FileWorkerLeases):
+            return None
+        # Counted from before the request, a fifth of the TTL spared for clock skew between hosts.
+        return started + self._ttl * 0.8
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._leases.release(self._ids.last_ms)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._ttl / 3)
+            started = time.monotonic()
+            try:
+                if await self._leases.renew(self._ids.last_ms):
+                    self._ids.lease_deadline = self._deadline(started)
+                else:
+                    logger.error("Worker id %s was taken over, leasing another one", self._ids.worker_id)
+                    self._apply(await self._leases.acquire(), started)
+            except Exception:
+                logger.exception("Worker id renewal failed, retrying")
+
+
+@lru_cache
+def get_worker_allocator() -> WorkerIdAllocator | None:
+    settings = get_settings()
+    mode = settings.SNOWFLAKE_WORKER_LEASE
+    if mode == WorkerLeaseMode.STATIC:
+        return None
+
+    if mode == WorkerLeaseMode.FILE:
+        lock_dir = settings.SNOWFLAKE_LOCK_DIR or os.path.join(tempfile.gettempdir(), 'shortener-snowflake')
+        leases = FileWorkerLeases(lock_dir)
+    elif mode == WorkerLeaseMode.REDIS:
+        redis = get_redis()
+        if redis is None:
+            raise ValueError("SNOWFLAKE_WORKER_LEASE=redis needs REDIS_ENABLED")
+        leases = RedisWorkerLeases(redis, ttl=settings.SNOWFLAKE_LEASE_TTL)
+    elif mode == WorkerLeaseMode.DATABASE:
+        leases = DatabaseWorkerLeases(async_session, ttl=settings.SNOWFLAKE_LEASE_TTL)
+    else:
+        raise ValueError(f"Unknown worker lease mode: {mode}")
+    return WorkerIdAllocator(get_snowflake_ids(), leases, ttl=settings.SNOWFLAKE_LEASE_TTL)
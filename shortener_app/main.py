@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Request, Response, status
@@ -19,23 +20,96 @@ from starlette_admin.exceptions import FormValidationError, LoginFailed
 
 from shortener_app.security.exceptions import JsonHTTPException
 
-from .link.short_link.service import get_snowflake_id
-from shortener_app.security.auth.transport.router import auth_router
+from .config import get_settings
+from .link.short_link.cache import get_redirect_cache
+from .link.short_link.clicks import get_click_ingestor
+from .link.short_link.keyfilter import get_key_filter
+from .link.short_link.pending import get_click_reconciler
+from .link.short_link.resolver import get_link_resolver
+from .link.short_link.workers import get_worker_allocator
+from .security.auth.middleware.jwt.cache import get_auth_cache
+from .security.auth.middleware.jwt.generations import get_token_generations
+from .security.auth.pruning import get_token_pruner
+from shortener_app.security.auth.transport.router import auth_router, jwks_router
 from .link.short_link.transport.router import link_route
+from .link.short_link.transport.fast_redirect import FastRedirectMiddleware
 from .user.transport.router import me_router
-from .database import create_tables, async_engine, models
+from .database import async_engine, models
+from .database.migrate import run_migrations
+from .monitoring import (
+    instrument_click_ingestor,
+    instrument_key_filter,
+    make_metrics_app,
+    mark_process_dead,
+    multiprocess_enabled,
+    refresh_gauge_functions,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await create_tables()
+    await run_migrations()
     print("Создание базы данных")
+    worker_allocator = get_worker_allocator()
+    if worker_allocator is not None:
+        await worker_allocator.start()
+    click_ingestor = get_click_ingestor()
+    if get_settings().CLICK_QUEUE_ENABLED:
+        click_ingestor.start()
+        instrument_click_ingestor(click_ingestor)
+    auth_cache = get_auth_cache()
+    auth_cache.start()
+    redirect_cache = get_redirect_cache()
+    redirect_cache.start()
+    token_generations = get_token_generations()
+    if token_generations is not None:
+        token_generations.start()
+    link_resolver = get_link_resolver()
+    await link_resolver.start()
+    click_reconciler = get_click_reconciler()
+    if click_reconciler is not None:
+        click_reconciler.start()
+    key_filter = get_key_filter()
+    if key_filter is not None:
+        await key_filter.start()
+        instrument_key_filter(key_filter)
+    token_pruner = get_token_pruner()
+    if token_pruner is not None:
+        token_pruner.start()
+    metrics_refresher = None
+    if multiprocess_enabled():
+        metrics_refresher = asyncio.create_task(
+            refresh_gauge_functions(get_settings().METRICS_REFRESH_INTERVAL),
+            name='metrics-refresher',
+        )
     yield
+    if metrics_refresher is not None:
+        metrics_refresher.cancel()
+    if token_pruner is not None:
+        await token_pruner.stop()
+    if key_filter is not None:
+        await key_filter.stop()
+    if click_reconciler is not None:
+        await click_reconciler.stop()
+    await link_resolver.stop()
+    if token_generations is not None:
+        await token_generations.stop()
+    await redirect_cache.stop()
+    await auth_cache.stop()
+    await click_ingestor.stop()
+    if worker_allocator is not None:
+        await worker_allocator.stop()
+    mark_process_dead()
     print("Запуск сервера")
 
 
 app = FastAPI(lifespan=lifespan)
-# Instrumentator().instrument(app).expose(app)
+# Handlers are route templates, so every short key shares the "/{url_key}" series;
+# unmatched paths are grouped under "none". Served by the /metrics mount below.
+Instrumentator(
+    should_group_status_codes=True,
+    excluded_handlers=["/metrics"],
+).instrument(app, latency_lowr_buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
 
 
 
@@ -90,6 +164,7 @@ admin.add_view(ModelView(models.IssuedJWTToken))
 admin_app = Starlette()
 admin.mount_to(admin_app)
 app.mount("/a", admin_app)
+app.mount("/metrics", make_metrics_app())
 
 
 @app.exception_handler(StarletteHTTPException)
@@ -115,6 +190,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 app.include_router(link_route)
 app.include_router(auth_router)
+app.include_router(jwks_router)
 app.include_router(me_router)
 
 
@@ -129,3 +205,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+if get_settings().FAST_REDIRECT_ENABLED:
+    # Added last, so it runs first: redirects skip the middleware above.
+    app.add_middleware(FastRedirectMiddleware)
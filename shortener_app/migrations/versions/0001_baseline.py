@@ -0,0 +1,82 @@
+"""Baseline: the schema create_tables() used to build
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'api_user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('password_hash', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_api_user_email', 'api_user', ['email'], unique=True)
+
+    op.create_table(
+        'url',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('secret_key', sa.String(), nullable=False),
+        sa.Column('target_url', sa.String(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('clicks', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_url_key', 'url', ['key'], unique=True)
+    op.create_index('ix_url_secret_key', 'url', ['secret_key'], unique=True)
+    op.create_index('ix_url_target_url', 'url', ['target_url'], unique=False)
+
+    op.create_table(
+        'issued_jwt_token',
+        sa.Column('jti', sa.String(length=36), nullable=False),
+        sa.Column('subject_id', sa.Integer(), nullable=False),
+        sa.Column('device_id', sa.String(length=36), nullable=False),
+        sa.Column('revoked', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['subject_id'], ['api_user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('jti'),
+    )
+
+    op.create_table(
+        'auth_user_url',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('url_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['url_id'], ['url.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['api_user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+    op.create_table(
+        'url_metric',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('url_id', sa.Integer(), nullable=False),
+        sa.Column('ip', sa.String(), nullable=False),
+        sa.Column('device', sa.String(), nullable=False),
+        sa.Column('date', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['url_id'], ['url.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('url_metric')
+    op.drop_table('auth_user_url')
+    op.drop_table('issued_jwt_token')
+    op.drop_index('ix_url_target_url', table_name='url')
+    op.drop_index('ix_url_secret_key', table_name='url')
+    op.drop_index('ix_url_key', table_name='url')
+    op.drop_table('url')
+    op.drop_index('ix_api_user_email', table_name='api_user')
+    op.drop_table('api_user')
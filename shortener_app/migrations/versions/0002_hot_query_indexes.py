@@ -0,0 +1,83 @@
+"""Indexes for the hot queries, 64-bit ids and a real click timestamp
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+URL_ID_COLUMNS = (
+    ('url', 'id'),
+    ('auth_user_url', 'url_id'),
+    ('url_metric', 'id'),
+    ('url_metric', 'url_id'),
+)
+
+
+def upgrade() -> None:
+    # Nothing filters on target_url, the index only slowed writes down.
+    op.drop_index('ix_url_target_url', table_name='url')
+    op.create_index(
+        'ix_url_key_active',
+        'url',
+        ['key'],
+        unique=True,
+        postgresql_include=['id', 'target_url'],
+        postgresql_where=sa.text('is_active'),
+        sqlite_where=sa.text('is_active'),
+    )
+    op.create_index('ix_auth_user_url_user_id_url_id', 'auth_user_url', ['user_id', 'url_id'])
+    op.create_index('ix_auth_user_url_url_id', 'auth_user_url', ['url_id'])
+    op.create_index('ix_url_metric_url_id_id', 'url_metric', ['url_id', 'id'])
+    op.create_index('ix_issued_jwt_token_subject_id_device_id', 'issued_jwt_token', ['subject_id', 'device_id'])
+
+    if op.get_bind().dialect.name == 'sqlite':
+        # SQLite integers are 64-bit already, only the stored date format changes.
+        op.execute("UPDATE url_metric SET date = date || ' 00:00:00.000000' WHERE length(date) = 10")
+        return
+
+    for table, column in URL_ID_COLUMNS:
+        op.alter_column(table, column, type_=sa.BigInteger(), existing_type=sa.Integer(), existing_nullable=False)
+    op.execute('ALTER SEQUENCE url_metric_id_seq AS bigint')
+    # Urls get snowflake ids, the serial default is never used.
+    op.alter_column('url', 'id', server_default=None, existing_type=sa.BigInteger())
+    op.alter_column(
+        'url_metric',
+        'date',
+        type_=sa.DateTime(timezone=True),
+        existing_type=sa.String(),
+        existing_nullable=False,
+        postgresql_using="date::date::timestamp AT TIME ZONE 'UTC'",
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE url_metric SET date = substr(date, 1, 10)")
+    else:
+        op.alter_column(
+            'url_metric',
+            'date',
+            type_=sa.String(),
+            existing_type=sa.DateTime(timezone=True),
+            existing_nullable=False,
+            postgresql_using="to_char(date AT TIME ZONE 'UTC', 'YYYY-MM-DD')",
+        )
+        op.execute('ALTER SEQUENCE url_metric_id_seq AS integer')
+        for table, column in reversed(URL_ID_COLUMNS):
+            op.alter_column(table, column, type_=sa.Integer(), existing_type=sa.BigInteger(), existing_nullable=False)
+
+    op.drop_index('ix_issued_jwt_token_subject_id_device_id', table_name='issued_jwt_token')
+    op.drop_index('ix_url_metric_url_id_id', table_name='url_metric')
+    op.drop_index('ix_auth_user_url_url_id', table_name='auth_user_url')
+    op.drop_index('ix_auth_user_url_user_id_url_id', table_name='auth_user_url')
+    op.drop_index('ix_url_key_active', table_name='url')
+    op.create_index('ix_url_target_url', 'url', ['target_url'], unique=False)
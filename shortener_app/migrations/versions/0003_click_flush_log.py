@@ -0,0 +1,29 @@
+"""Log of applied write-behind click flushes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'click_flush_log',
+        sa.Column('flush_id', sa.String(length=36), nullable=False),
+        sa.Column('flushed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('flush_id'),
+    )
+    op.create_index('ix_click_flush_log_flushed_at', 'click_flush_log', ['flushed_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_click_flush_log_flushed_at', table_name='click_flush_log')
+    op.drop_table('click_flush_log')
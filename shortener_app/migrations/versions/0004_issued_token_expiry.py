@@ -0,0 +1,41 @@
+"""Expiry of issued JWT tokens, for pruning
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+import datetime
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# Longer than any refresh token TTL in use; `alembic -x token_ttl=<seconds>` overrides it.
+BACKFILL_TTL = 30 * 24 * 3600
+
+
+def upgrade() -> None:
+    op.add_column('issued_jwt_token', sa.Column('expired_time', sa.DateTime(timezone=True), nullable=True))
+    # The exp of existing tokens is unknown: keep them as long as the longest-lived
+    # token issued now, so a revoked one cannot come back before it expires.
+    ttl = int(context.get_x_argument(as_dictionary=True).get('token_ttl', BACKFILL_TTL))
+    issued_jwt_token = sa.table('issued_jwt_token', sa.column('expired_time', sa.DateTime(timezone=True)))
+    op.execute(
+        issued_jwt_token
+        .update()
+        .values(expired_time=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=ttl))
+    )
+    with op.batch_alter_table('issued_jwt_token') as batch_op:
+        batch_op.alter_column('expired_time', existing_type=sa.DateTime(timezone=True), nullable=False)
+    op.create_index('ix_issued_jwt_token_expired_time', 'issued_jwt_token', ['expired_time'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_issued_jwt_token_expired_time', table_name='issued_jwt_token')
+    with op.batch_alter_table('issued_jwt_token') as batch_op:
+        batch_op.drop_column('expired_time')
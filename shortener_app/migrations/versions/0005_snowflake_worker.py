@@ -0,0 +1,29 @@
+"""Leases of snowflake worker ids
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'snowflake_worker',
+        sa.Column('worker_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('owner', sa.String(length=128), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_ms', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('worker_id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('snowflake_worker')
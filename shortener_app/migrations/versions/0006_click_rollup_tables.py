@@ -0,0 +1,40 @@
+"""Sharded click counters and daily metric rollups
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'url_click_shard',
+        sa.Column('url_id', sa.BigInteger(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('clicks', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['url_id'], ['url.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('url_id', 'shard'),
+    )
+    op.create_table(
+        'url_metric_daily',
+        sa.Column('url_id', sa.BigInteger(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('device', sa.String(), nullable=False),
+        sa.Column('clicks', sa.Integer(), nullable=False),
+        sa.Column('unique_ips', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['url_id'], ['url.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('url_id', 'day', 'device'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('url_metric_daily')
+    op.drop_table('url_click_shard')
@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, make_asgi_app, multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+
+logger = logging.getLogger(__name__)
+
+# Labels only ever take values from a fixed set (stages, statement kinds,
+# cache results); keys, urls and users are never used as label values.
+STAGE_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1,
+)
+
+
+DB_POOL_CHECKOUTS = Counter(
+    'db_pool_checkouts_total',
+    'Connections handed out by the pool',
+)
+DB_POOL_OVERFLOW_CHECKOUTS = Counter(
+    'db_pool_overflow_checkouts_total',
+    'Checkouts that found every pool_size connection busy',
+)
+DB_POOL_TIMEOUTS = Counter(
+    'db_pool_timeouts_total',
+    'Checkouts that gave up after pool_timeout',
+)
+DB_POOL_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds',
+    'Time spent waiting for a pooled connection',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections',
+    'Pool connections by state',
+    ['state'],
+    multiprocess_mode='livesum',
+)
+DB_QUERY_SECONDS = Histogram(
+    'db_query_seconds',
+    'Statement execution time by statement kind',
+    ['operation'],
+    buckets=STAGE_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter(
+    'db_query_errors_total',
+    'Statements that raised, by statement kind',
+    ['operation'],
+)
+DB_OPERATIONS = ('select', 'insert', 'update', 'delete')
+
+REDIRECT_STAGE_SECONDS = Histogram(
+    'redirect_stage_seconds',
+    'Time spent in each stage of the redirect path',
+    ['stage'],
+    buckets=STAGE_BUCKETS,
+)
+FAST_REDIRECTS = Counter(
+    'fast_redirects_total',
+    'Short key requests seen by the fast redirect path: redirected, or passed on to the app',
+    ['result'],
+)
+REDIRECT_CACHE_LOOKUPS = Counter(
+    'redirect_cache_lookups_total',
+    'Redirect cache lookups by the tier that answered: local, redis or miss',
+    ['result'],
+)
+CLICK_CLASSIFY_SECONDS = Histogram(
+    'click_classify_seconds',
+    'User agent classification time per batch of clicks',
+    buckets=STAGE_BUCKETS,
+)
+CLICK_QUEUE_DEPTH = Gauge(
+    'click_queue_depth',
+    'Clicks waiting in the in-process queues',
+    multiprocess_mode='livesum',
+)
+CLICK_QUEUE_CAPACITY = Gauge(
+    'click_queue_capacity',
+    'Size limit of the in-process click queues',
+    multiprocess_mode='livesum',
+)
+CLICK_QUEUE_DROPPED = Counter(
+    'click_queue_dropped_total',
+    'Clicks dropped on a full queue or after failed flushes',
+)
+AUTH_CACHE_LOOKUPS = Counter(
+    'auth_cache_lookups_total',
+    'check_access_token cache lookups, for verified payloads and token owners',
+    ['cache', 'result'],
+)
+ISSUED_TOKENS_ROWS = Gauge(
+    'issued_jwt_token_rows',
+    'Rows in issued_jwt_token after the last prune sweep (an estimate on PostgreSQL)',
+    multiprocess_mode='livemostrecent',
+)
+TOKEN_PRUNE_SECONDS = Histogram(
+    'token_prune_sweep_seconds',
+    'Duration of one sweep deleting expired issued_jwt_token rows',
+)
+TOKEN_PRUNE_DELETED = Counter(
+    'token_prune_deleted_total',
+    'Expired issued_jwt_token rows deleted',
+)
+SNOWFLAKE_WORKER_ID = Gauge(
+    'snowflake_worker_id',
+    'Snowflake worker id leased by each process',
+    multiprocess_mode='liveall',
+)
+SNOWFLAKE_CLOCK_REGRESSIONS = Counter(
+    'snowflake_clock_regressions_total',
+    'Times the wall clock was seen going back while generating ids',
+)
+SNOWFLAKE_BORROWED_MS = Counter(
+    'snowflake_borrowed_milliseconds_total',
+    'Milliseconds taken ahead of the clock, after a regression or an exhausted sequence',
+)
+LOGIN_LIMITER_REJECTIONS = Counter(
+    'login_limiter_rejections_total',
+    'Register and login requests turned away by the token buckets',
+    ['key'],
+)
+
+KEY_FILTER_CHECKS = Counter(
+    'key_filter_checks_total',
+    'Redirect keys checked against the key filter: rejected, found in the database, '
+    'or missed there; missed / (missed + rejected) is the observed false positive rate',
+    ['result'],
+)
+KEY_FILTER_FALSE_POSITIVE_RATE = Gauge(
+    'key_filter_expected_false_positive_rate',
+    'False positive rate expected from the key filter size and fill',
+    multiprocess_mode='livemax',
+)
+KEY_FILTER_BYTES = Gauge(
+    'key_filter_bytes',
+    'Memory held by the key filter bit arrays',
+    multiprocess_mode='livesum',
+)
+KEY_FILTER_KEYS = Gauge(
+    'key_filter_keys',
+    'Keys added to the key filter',
+    multiprocess_mode='livemax',
+)
+
+
+def multiprocess_enabled() -> bool:
+    return 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+
+def make_metrics_app():
+    """
+    The /metrics app. With several workers, PROMETHEUS_MULTIPROC_DIR makes each
+    of them write its metrics there and a scrape merges them all, whichever
+    worker answers; without it a scrape only sees the worker that answers.
+    """
+    if not multiprocess_enabled():
+        return make_asgi_app()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return make_asgi_app(registry)
+
+
+_gauge_functions: list[tuple[Gauge, Callable[[], float]]] = []
+
+
+def set_gauge_function(gauge: Gauge, function: Callable[[], float]) -> None:
+    """
+    ``gauge.set_function``, which multiprocess mode cannot merge: there the
+    value is copied into the gauge by ``refresh_gauge_functions`` instead.
+    """
+    if multiprocess_enabled():
+        _gauge_functions.append((gauge, function))
+    else:
+        gauge.set_function(function)
+
+
+async def refresh_gauge_functions(interval: float) -> None:
+    while True:
+        for gauge, function in _gauge_functions:
+            try:
+                gauge.set(function())
+            except Exception:
+                logger.exception("Metrics: failed to read a gauge")
+        await asyncio.sleep(interval)
+
+
+def mark_process_dead() -> None:
+    """
+    Drops this worker from the live* gauges, on shutdown.
+    """
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    ``AsyncAdaptedQueuePool`` that reports checkout wait time, overflow and timeouts.
+    """
+
+    def _do_get(self):
+        # Nothing idle and every pool_size slot already open: this checkout
+        # opens an overflow connection or waits for one to come back.
+        overflowing = self.checkedin() == 0 and self.overflow() >= 0
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+        DB_POOL_CHECKOUTS.inc()
+        if overflowing:
+            DB_POOL_OVERFLOW_CHECKOUTS.inc()
+        return connection
+
+
+def instrument_pool(pool: Pool) -> None:
+    """
+    Exposes the current pool state, read on every scrape.
+    """
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return
+    set_gauge_function(DB_POOL_CONNECTIONS.labels(state='size'), pool.size)
+    set_gauge_function(DB_POOL_CONNECTIONS.labels(state='checked_out'), pool.checkedout)
+    set_gauge_function(DB_POOL_CONNECTIONS.labels(state='checked_in'), pool.checkedin)
+    set_gauge_function(DB_POOL_CONNECTIONS.labels(state='overflow'), lambda: max(pool.overflow(), 0))
+
+
+def instrument_key_filter(key_filter) -> None:
+    """
+    Exposes the size and expected accuracy of a ``KeyFilter``, read on every scrape.
+    """
+    def read(attribute):
+        def value():
+            bloom = key_filter.bloom
+            return 0 if bloom is None else attribute(bloom)
+        return value
+
+    set_gauge_function(KEY_FILTER_FALSE_POSITIVE_RATE, read(lambda bloom: bloom.false_positive_rate()))
+    set_gauge_function(KEY_FILTER_BYTES, read(lambda bloom: bloom.size_bytes))
+    set_gauge_function(KEY_FILTER_KEYS, read(lambda bloom: bloom.count))
+
+
+def _operation(statement: str) -> str:
+    operation = statement.lstrip()[:6].lower()
+    return operation if operation in DB_OPERATIONS else 'other'
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Times every statement run by ``engine``, the sync engine of an async one.
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        DB_QUERY_SECONDS.labels(operation=_operation(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        started = context.connection.info.get('query_started') if context.connection is not None else None
+        if started:
+            started.pop()
+        DB_QUERY_ERRORS.labels(operation=_operation(context.statement or '')).inc()
+
+
+def instrument_click_ingestor(click_ingestor) -> None:
+    set_gauge_function(CLICK_QUEUE_DEPTH, click_ingestor.qsize)
+    set_gauge_function(CLICK_QUEUE_CAPACITY, lambda: click_ingestor.maxsize)
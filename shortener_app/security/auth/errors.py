@@ -6,6 +6,7 @@ from ..errors import ErrorObj
 class AuthErrorTypes(str, Enum):
     EMAIL_OCCUPIED = 'email_occupied'
     INVALID_CREDENTIALS = 'invalid_credentials'
+    TOO_MANY_ATTEMPTS = 'too_many_attempts'
 
 
 class AuthError:
@@ -21,4 +22,11 @@ class AuthError:
         return ErrorObj(
             type=AuthErrorTypes.INVALID_CREDENTIALS,
             message='Invalid email or password',
+        )
+
+    @staticmethod
+    def get_too_many_attempts_error() -> ErrorObj:
+        return ErrorObj(
+            type=AuthErrorTypes.TOO_MANY_ATTEMPTS,
+            message='Too many attempts, try again later',
         )
\ No newline at end of file
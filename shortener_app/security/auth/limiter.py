@@ -0,0 +1,172 @@
+import ipaddress
+import logging
+import math
+import time
+from functools import lru_cache
+from typing import Iterable
+
+from fastapi import Request
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from shortener_app.cache import MISSING, TTLCache, get_redis
+from shortener_app.config import get_settings
+from shortener_app.monitoring import LOGIN_LIMITER_REJECTIONS
+
+
+logger = logging.getLogger(__name__)
+
+
+Networks = tuple[ipaddress.IPv4Network | ipaddress.IPv6Network, ...]
+
+
+def parse_networks(values: Iterable[str]) -> Networks:
+    return tuple(ipaddress.ip_network(value.strip(), strict=False) for value in values if value.strip())
+
+
+def _is_trusted(address: str, trusted: Networks) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted)
+
+
+def client_ip(request: Request, trusted: Networks = ()) -> str:
+    """
+    The peer address, or when the peer is a trusted proxy the last
+    ``X-Forwarded-For`` entry not added by one of them: entries further left
+    come from the client and can say anything.
+    """
+    peer = request.client.host if request.client else ''
+    forwarded_for = request.headers.get('x-forwarded-for')
+    if not forwarded_for or not _is_trusted(peer, trusted):
+        return peer
+
+    hops = [hop.strip() for hop in forwarded_for.split(',')]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, trusted):
+            return hop
+    return hops[0]
+
+
+class MemoryTokenBuckets:
+    """
+    Token buckets per key: ``burst`` tokens, refilled at ``rate`` per second.
+    Each worker counts on its own, ``RedisTokenBuckets`` shares the counts.
+    """
+
+    def __init__(self, *, burst: int, rate: float, maxsize: int = 100_000) -> None:
+        self._burst = burst
+        self._rate = rate
+        # A bucket untouched for this long is full again, forgetting it is the same.
+        self._buckets = TTLCache(maxsize=maxsize, ttl=burst / rate)
+
+    async def take(self, key: str) -> float:
+        """
+        Takes a token, returns 0 or the seconds until one is available.
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        tokens, updated_at = (self._burst, now) if bucket is MISSING else bucket
+        tokens = min(self._burst, tokens + (now - updated_at) * self._rate)
+        if tokens < 1:
+            self._buckets.set(key, (tokens, now))
+            return (1 - tokens) / self._rate
+        self._buckets.set(key, (tokens - 1, now))
+        return 0.0
+
+
+# Same refill as MemoryTokenBuckets, atomic across workers. Time comes from
+# the Redis server so that worker clocks do not matter.
+_TAKE_SCRIPT = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - updated_at) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+else
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate))
+return tostring(wait)
+"""
+
+
+class RedisTokenBuckets:
+    """
+    Token buckets in Redis hashes, shared by all workers.
+    Falls back to the in-process buckets while Redis is unavailable.
+    """
+
+    def __init__(self, redis: Redis, *, burst: int, rate: float, prefix: str) -> None:
+        self._burst = burst
+        self._rate = rate
+        self._prefix = prefix
+        self._take_script = redis.register_script(_TAKE_SCRIPT)
+        self._fallback = MemoryTokenBuckets(burst=burst, rate=rate)
+
+    async def take(self, key: str) -> float:
+        try:
+            wait = await self._take_script(keys=[self._prefix + key], args=[self._burst, self._rate])
+        except RedisError:
+            logger.warning("Login limiter: redis unavailable, counting in process", exc_info=True)
+            return await self._fallback.take(key)
+        return float(wait)
+
+
+class LoginLimiter:
+    """
+    Turns away bursts of credential requests before they reach the database:
+    one bucket per client IP and, for logins, one per email.
+    """
+
+    def __init__(self, ip_buckets, email_buckets, enabled: bool = True, trusted_proxies: Networks = ()) -> None:
+        self._ip_buckets = ip_buckets
+        self._email_buckets = email_buckets
+        self._enabled = enabled
+        self._trusted_proxies = trusted_proxies
+
+    async def check(self, request: Request, email: str | None = None) -> int:
+        """
+        Returns 0 when the request may go on, otherwise the seconds for ``Retry-After``.
+        """
+        if not self._enabled:
+            return 0
+
+        wait = await self._ip_buckets.take(client_ip(request, self._trusted_proxies))
+        if wait:
+            LOGIN_LIMITER_REJECTIONS.labels(key='ip').inc()
+            return math.ceil(wait)
+
+        if email is not None:
+            wait = await self._email_buckets.take(email.lower())
+            if wait:
+                LOGIN_LIMITER_REJECTIONS.labels(key='email').inc()
+                return math.ceil(wait)
+        return 0
+
+
+def _buckets(redis: Redis | None, burst: int, rate: float, prefix: str):
+    if redis is None:
+        return MemoryTokenBuckets(burst=burst, rate=rate)
+    return RedisTokenBuckets(redis, burst=burst, rate=rate, prefix=prefix)
+
+
+@lru_cache
+def get_login_limiter() -> LoginLimiter:
+    settings = get_settings()
+    redis = get_redis()
+    return LoginLimiter(
+        ip_buckets=_buckets(redis, settings.LOGIN_IP_BURST, settings.LOGIN_IP_RATE, 'login:ip:'),
+        email_buckets=_buckets(redis, settings.LOGIN_EMAIL_BURST, settings.LOGIN_EMAIL_RATE, 'login:email:'),
+        enabled=settings.LOGIN_RATE_LIMIT_ENABLED,
+        trusted_proxies=parse_networks(settings.TRUSTED_PROXIES),
+    )
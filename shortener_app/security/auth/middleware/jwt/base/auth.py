@@ -4,6 +4,7 @@ from typing import Any
 from datetime import datetime, timedelta, timezone
 
 from .config import JWTConfig
+from .keys import KeyRing
 from .token_types import TokenType
 from shortener_app.security.utils import convert_to_timestamp
 
@@ -11,11 +12,25 @@ from shortener_app.security.utils import convert_to_timestamp
 class JWTAuth:
     def __init__(self, config: JWTConfig) -> None:
         self._config = config
+        self._key_ring = KeyRing.load(config.keys_dir, config.active_kid)
 
-    def generate_unlimited_access_token(self, subject: str, payload: dict[str, Any] = {}) -> str:
-        return self.__sign_token(type=TokenType.ACCESS.value, subject=subject, payload=payload)
+    @property
+    def jwks(self) -> dict[str, Any]:
+        return self._key_ring.jwks
 
-    def generate_access_token(self, subject: str, payload: dict[str, Any] = {}) -> str:
+    def generate_unlimited_access_token(self, subject: str, payload: dict[str, Any] | None = None) -> str:
+        return self.__sign_token(type=TokenType.ACCESS.value, subject=subject, payload=payload)[0]
+
+    def generate_access_token(self, subject: str, payload: dict[str, Any] | None = None) -> str:
+        return self.issue_access_token(subject=subject, payload=payload)[0]
+
+    def generate_refresh_token(self, subject: str, payload: dict[str, Any] | None = None) -> str:
+        return self.issue_refresh_token(subject=subject, payload=payload)[0]
+
+    def issue_access_token(self, subject: str, payload: dict[str, Any] | None = None) -> tuple[str, dict[str, Any]]:
+        """
+        Returns the token along with its claims, so callers need not decode it again.
+        """
         return self.__sign_token(
             type=TokenType.ACCESS.value,
             subject=subject,
@@ -23,7 +38,7 @@ class JWTAuth:
             ttl=self._config.access_token_ttl,
         )
 
-    def generate_refresh_token(self, subject: str, payload: dict[str, Any] = {}) -> str:
+    def issue_refresh_token(self, subject: str, payload: dict[str, Any] | None = None) -> tuple[str, dict[str, Any]]:
         return self.__sign_token(
             type=TokenType.REFRESH.value,
             subject=subject,
@@ -31,7 +46,15 @@ class JWTAuth:
             ttl=self._config.refresh_token_ttl,
         )
 
-    def __sign_token(self, type: str, subject: str, payload: dict[str, Any] = {}, ttl: timedelta = None) -> str:
+    def __sign_token(
+            self,
+            type: str,
+            subject: str,
+            payload: dict[str, Any] | None = None,
+            ttl: timedelta = None,
+        ) -> tuple[str, dict[str, Any]]:
+        # A copy: the caller's dict, or a shared default, must not collect claims.
+        payload = dict(payload or {})
         current_timestamp = convert_to_timestamp(datetime.now(tz=timezone.utc))
 
         data = dict(
@@ -44,14 +67,27 @@ class JWTAuth:
         )
         data.update(dict(exp=data['nbf'] + int(ttl.total_seconds()))) if ttl else None
         payload.update(data)
-        return jwt.encode(payload, self._config.secret, algorithm=self._config.algorithm)
+        key = self._key_ring.signing_key
+        if key is None:
+            return jwt.encode(payload, self._config.secret, algorithm=self._config.algorithm), payload
+        return jwt.encode(payload, key.private_key, algorithm=key.algorithm, headers={'kid': key.kid}), payload
 
     @staticmethod
     def __generate_jti() -> str:
         return str(uuid.uuid4())
 
     def verify_token(self, token) -> dict[str, Any]:
-        return jwt.decode(token, self._config.secret, algorithms=[self._config.algorithm])
+        kid = jwt.get_unverified_header(token).get('kid')
+        if kid is None:
+            if self._key_ring.signing_key is not None and not self.__legacy_secret_allowed():
+                raise jwt.InvalidTokenError("Token without kid")
+            return jwt.decode(token, self._config.secret, algorithms=[self._config.algorithm])
+        # Only the algorithm of the key itself, a token cannot pick another one.
+        key = self._key_ring.get(kid)
+        return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+    def __legacy_secret_allowed(self) -> bool:
+        return convert_to_timestamp(datetime.now(tz=timezone.utc)) < self._config.legacy_secret_until
 
     def get_jti(self, token) -> str:
         return self.verify_token(token)['jti']
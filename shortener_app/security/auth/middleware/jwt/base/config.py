@@ -7,4 +7,10 @@ class JWTConfig:
     secret: str
     algorithm: str = 'HS256'
     access_token_ttl: timedelta = None
-    refresh_token_ttl: timedelta = None
\ No newline at end of file
+    refresh_token_ttl: timedelta = None
+    # Directory of <kid>.pem / <kid>.pub.pem keys. With active_kid set tokens are
+    # signed with that key and tokens without a kid are rejected, unless checked
+    # with secret before legacy_secret_until (a unix timestamp) while they expire.
+    keys_dir: str | None = None
+    active_kid: str | None = None
+    legacy_secret_until: int = 0
\ No newline at end of file
@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from jwt.algorithms import ECAlgorithm, OKPAlgorithm, RSAAlgorithm
+from jwt.exceptions import InvalidTokenError
+
+
+# Key type -> (JWS algorithm, its JWK serializer).
+_ALGORITHMS = (
+    ((rsa.RSAPrivateKey, rsa.RSAPublicKey), 'RS256', RSAAlgorithm),
+    ((ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey), 'EdDSA', OKPAlgorithm),
+    ((ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey), 'ES256', ECAlgorithm),
+)
+
+
+def _algorithm(key) -> tuple[str, Any]:
+    for types, algorithm, serializer in _ALGORITHMS:
+        if isinstance(key, types):
+            if algorithm == 'ES256' and not isinstance(key.curve, ec.SECP256R1):
+                break
+            return algorithm, serializer
+    raise ValueError(f"Unsupported JWT key type: {type(key).__name__}")
+
+
+@dataclass(frozen=True)
+class JWTKey:
+    """
+    A parsed key, passed to PyJWT as an object so that no call parses PEM again.
+    ``private_key`` is ``None`` for retired keys kept only to verify tokens still alive.
+    """
+    kid: str
+    algorithm: str
+    public_key: Any
+    private_key: Any = None
+
+    @classmethod
+    def from_pem(cls, kid: str, data: bytes) -> 'JWTKey':
+        if b'PRIVATE KEY' in data:
+            private_key = serialization.load_pem_private_key(data, password=None)
+            public_key = private_key.public_key()
+        else:
+            private_key = None
+            public_key = serialization.load_pem_public_key(data)
+        return cls(kid=kid, algorithm=_algorithm(public_key)[0], public_key=public_key, private_key=private_key)
+
+    def to_jwk(self) -> dict[str, Any]:
+        jwk = _algorithm(self.public_key)[1].to_jwk(self.public_key, as_dict=True)
+        return dict(jwk, kid=self.kid, alg=self.algorithm, use='sig')
+
+
+class KeyRing:
+    """
+    Asymmetric keys by ``kid``: the active one signs, all of them verify.
+
+    Rotation: add the next key while the current one stays active, so that
+    verifiers pick it up from the JWKS; then make it active; once the tokens
+    of the old key have expired, drop the old key (or keep only its public
+    half until then).
+    """
+
+    def __init__(self, keys: Iterable[JWTKey], active_kid: str | None = None) -> None:
+        self._keys: dict[str, JWTKey] = {}
+        for key in keys:
+            # A private key wins over the public-only file of the same kid.
+            if key.kid not in self._keys or self._keys[key.kid].private_key is None:
+                self._keys[key.kid] = key
+        self.signing_key: JWTKey | None = None
+        if active_kid:
+            key = self._keys.get(active_kid)
+            if key is None or key.private_key is None:
+                raise ValueError(f"No private JWT key with kid {active_kid!r}")
+            self.signing_key = key
+        self.jwks = {'keys': [key.to_jwk() for key in self._keys.values()]}
+
+    @classmethod
+    def load(cls, path: str | None, active_kid: str | None = None) -> 'KeyRing':
+        """
+        Reads ``<kid>.pem`` (private) and ``<kid>.pub.pem`` (public only) files from ``path``.
+        """
+        keys = []
+        for file in sorted(Path(path).glob('*.pem')) if path else ():
+            kid = file.name.removesuffix('.pem').removesuffix('.pub')
+            keys.append(JWTKey.from_pem(kid, file.read_bytes()))
+        return cls(keys, active_kid)
+
+    def get(self, kid: str) -> JWTKey:
+        key = self._keys.get(kid)
+        if key is None:
+            raise InvalidTokenError(f"Unknown kid {kid!r}")
+        return key
+
+    def __len__(self) -> int:
+        return len(self._keys)
@@ -0,0 +1,70 @@
+import time
+from datetime import timedelta
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from shortener_app.security.auth.middleware.jwt.base.auth import JWTAuth
+from shortener_app.security.auth.middleware.jwt.base.config import JWTConfig
+
+
+SECRET = 'test-secret'
+
+
+def make_auth(keys_dir=None, active_kid=None, legacy_secret_until=0) -> JWTAuth:
+    return JWTAuth(JWTConfig(
+        secret=SECRET,
+        access_token_ttl=timedelta(minutes=5),
+        keys_dir=keys_dir,
+        active_kid=active_kid,
+        legacy_secret_until=legacy_secret_until,
+    ))
+
+
+@pytest.fixture
+def keys_dir(tmp_path) -> str:
+    key = ec.generate_private_key(ec.SECP256R1())
+    (tmp_path / 'k1.pem').write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def legacy_token() -> str:
+    return make_auth().generate_access_token('1')
+
+
+def test_kidless_token_without_key_ring(legacy_token):
+    assert make_auth().verify_token(legacy_token)['sub'] == '1'
+
+
+def test_kidless_token_while_ring_is_not_signing(keys_dir, legacy_token):
+    assert make_auth(keys_dir).verify_token(legacy_token)['sub'] == '1'
+
+
+def test_kidless_token_rejected_once_signing_key_is_set(keys_dir, legacy_token):
+    with pytest.raises(jwt.InvalidTokenError):
+        make_auth(keys_dir, 'k1').verify_token(legacy_token)
+
+
+def test_kidless_token_during_migration_window(keys_dir, legacy_token):
+    auth = make_auth(keys_dir, 'k1', legacy_secret_until=int(time.time()) + 60)
+    assert auth.verify_token(legacy_token)['sub'] == '1'
+
+
+def test_kidless_token_after_migration_window(keys_dir, legacy_token):
+    auth = make_auth(keys_dir, 'k1', legacy_secret_until=int(time.time()) - 1)
+    with pytest.raises(jwt.InvalidTokenError):
+        auth.verify_token(legacy_token)
+
+
+def test_token_of_active_key(keys_dir):
+    auth = make_auth(keys_dir, 'k1')
+    token = auth.generate_access_token('1')
+    assert jwt.get_unverified_header(token)['kid'] == 'k1'
+    assert auth.verify_token(token)['sub'] == '1'
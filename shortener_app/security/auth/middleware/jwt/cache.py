@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import time
+from base64 import urlsafe_b64decode
+from functools import lru_cache
+from typing import Any, Iterable
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from shortener_app.cache import MISSING, TTLCache, get_redis
+from shortener_app.config import get_settings
+from shortener_app.user.model import APIUser
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_unverified_jti(token: str) -> str | None:
+    """
+    Reads ``jti`` from the token body without verifying anything.
+    Only good as a cache key, the cached token is compared in full.
+    """
+    try:
+        body = token.split('.')[1]
+        return json.loads(urlsafe_b64decode(body + '=' * (-len(body) % 4))).get('jti')
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+class AuthCache:
+    """
+    Per-process cache for ``check_access_token``:
+    verified payloads by ``jti``, token owners by ``sub`` and a set of revoked ``jti``.
+    Login reads users by email through it as well, unknown emails included.
+    Revocations are optionally fanned out to the other workers over Redis pub/sub;
+    without it the other workers accept a revoked token until its cached payload
+    expires, so ``payload_ttl`` should then be a few seconds.
+    """
+
+    def __init__(
+            self,
+            *,
+            maxsize: int,
+            payload_ttl: int,
+            user_ttl: int,
+            revoked_ttl: int,
+            email_negative_ttl: int = 5,
+            redis: Redis | None = None,
+            channel: str = 'auth:revoked',
+        ) -> None:
+        self._payload_ttl = payload_ttl
+        self._payloads = TTLCache(maxsize=maxsize, ttl=payload_ttl)
+        self._users = TTLCache(maxsize=maxsize, ttl=user_ttl)
+        self._emails = TTLCache(maxsize=maxsize, ttl=user_ttl)
+        self._email_negative_ttl = email_negative_ttl
+        self._revoked = TTLCache(maxsize=maxsize, ttl=revoked_ttl)
+        self._redis = redis
+        self._channel = channel
+        self._listener: asyncio.Task | None = None
+
+    def get_payload(self, token: str) -> dict[str, Any] | None:
+        jti = get_unverified_jti(token)
+        if jti is None:
+            return None
+
+        cached = self._payloads.get(jti)
+        if cached is MISSING:
+            return None
+
+        cached_token, payload = cached
+        if cached_token != token:
+            return None
+        return payload
+
+    def put_payload(self, token: str, payload: dict[str, Any]) -> None:
+        ttl = self._payload_ttl
+        if payload.get('exp'):
+            ttl = min(ttl, payload['exp'] - time.time())
+        if ttl > 0:
+            self._payloads.set(payload['jti'], (token, payload), ttl=ttl)
+
+    def get_user(self, sub: str) -> APIUser | None:
+        user = self._users.get(sub)
+        return None if user is MISSING else user
+
+    def put_user(self, sub: str, user: APIUser) -> None:
+        # A detached copy, the loaded instance belongs to the request session.
+        self._users.set(sub, APIUser(id=user.id, email=user.email, password_hash=user.password_hash))
+
+    def get_user_by_email(self, email: str) -> APIUser | None:
+        """
+        Returns ``MISSING`` when the email is not cached, ``None`` for a cached unknown email.
+        """
+        return self._emails.get(email)
+
+    def put_user_by_email(self, email: str, user: APIUser | None) -> None:
+        if user is None:
+            self._emails.set(email, None, ttl=self._email_negative_ttl)
+        else:
+            self._emails.set(email, APIUser(id=user.id, email=user.email, password_hash=user.password_hash))
+
+    def forget_email(self, email: str) -> None:
+        self._emails.delete(email)
+
+    def is_revoked(self, jti: str) -> bool:
+        return self._revoked.get(jti, False)
+
+    async def revoke(self, jtis: Iterable[str]) -> None:
+        jtis = list(jtis)
+        if not jtis:
+            return
+
+        self._apply_revoked(jtis)
+        if self._redis is None:
+            return
+
+        try:
+            await self._redis.publish(self._channel, json.dumps(jtis))
+        except RedisError:
+            logger.warning("Auth cache: failed to publish revocations", exc_info=True)
+
+    def _apply_revoked(self, jtis: Iterable[str]) -> None:
+        for jti in jtis:
+            self._payloads.delete(jti)
+            self._revoked.set(jti, True)
+
+    def start(self) -> None:
+        if self._redis is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen(), name='auth-cache-listener')
+
+    async def stop(self) -> None:
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        try:
+            await self._listener
+        except asyncio.CancelledError:
+            pass
+        self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self._channel)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self._apply_revoked(json.loads(message['data']))
+            except RedisError:
+                logger.warning("Auth cache: revocation listener lost redis, reconnecting", exc_info=True)
+                # Anything published meanwhile is missed, so forget what may be stale.
+                self._payloads.clear()
+                await asyncio.sleep(1)
+
+
+@lru_cache
+def get_auth_cache() -> AuthCache:
+    settings = get_settings()
+    redis = get_redis()
+    payload_ttl = settings.AUTH_PAYLOAD_CACHE_TTL
+    if redis is None:
+        payload_ttl = min(payload_ttl, settings.AUTH_PAYLOAD_CACHE_LOCAL_TTL)
+    return AuthCache(
+        maxsize=settings.AUTH_CACHE_SIZE,
+        payload_ttl=payload_ttl,
+        user_ttl=settings.AUTH_USER_CACHE_TTL,
+        revoked_ttl=max(settings.ACCESS_TOKEN_TTL, settings.REFRESH_TOKEN_TTL),
+        email_negative_ttl=settings.AUTH_EMAIL_NEGATIVE_CACHE_TTL,
+        redis=redis,
+    )
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from shortener_app.cache import MISSING, TTLCache, get_redis
+from shortener_app.config import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationMode:
+    # Every issued jti is stored in issued_jwt_token and checked there.
+    JTI = 'jti'
+    # Tokens carry the generations of their user and device, revoking bumps a counter.
+    GENERATION = 'generation'
+
+
+def _user_key(user_id) -> str:
+    return f'u:{user_id}'
+
+
+def _device_key(user_id, device_id: str) -> str:
+    return f'd:{user_id}:{device_id}'
+
+
+class MemoryTokenGenerations:
+    """
+    Revocation counters for tokens: one per user and one per (user, device).
+    A token carries ``gen = [user generation, device generation]`` from the
+    moment it was issued and is valid while both are still current. Logout
+    bumps the device counter, refresh reuse bumps the user one, so nothing
+    grows with the number of tokens issued.
+
+    An entry lives ``ttl`` (the longest token lifetime) past its last use, by
+    then every token carrying it has expired. Counts in process only, so it
+    is for tests: with several workers a bump in one of them would revoke
+    the new tokens everywhere else. The app uses ``RedisTokenGenerations``.
+    """
+
+    def __init__(self, *, ttl: float) -> None:
+        self._ttl = ttl
+        self._generations: dict[str, tuple[int, float]] = {}
+        self._next_prune = time.monotonic() + ttl
+
+    def _get(self, key: str) -> int:
+        item = self._generations.get(key)
+        if item is None or item[1] <= time.monotonic():
+            return 0
+        return item[0]
+
+    def _set(self, key: str, generation: int) -> None:
+        now = time.monotonic()
+        self._generations[key] = (generation, now + self._ttl)
+        if now >= self._next_prune:
+            self._generations = {key: item for key, item in self._generations.items() if item[1] > now}
+            self._next_prune = now + self._ttl
+
+    async def current(self, user_id, device_id: str) -> list[int]:
+        """
+        The generations for a token issued now. Keeps the entries alive for its lifetime.
+        """
+        generation = [self._get(_user_key(user_id)), self._get(_device_key(user_id, device_id))]
+        for key, value in zip((_user_key(user_id), _device_key(user_id, device_id)), generation):
+            if value:
+                self._set(key, value)
+        return generation
+
+    async def is_current(self, user_id, device_id: str, generation: list[int]) -> bool:
+        return generation == [self._get(_user_key(user_id)), self._get(_device_key(user_id, device_id))]
+
+    async def bump_device(self, user_id, device_id: str) -> None:
+        key = _device_key(user_id, device_id)
+        self._set(key, self._get(key) + 1)
+
+    async def bump_user(self, user_id) -> None:
+        key = _user_key(user_id)
+        self._set(key, self._get(key) + 1)
+
+    async def rotate(self, user_id, device_id: str, generation: list[int]) -> list[int] | None:
+        """
+        Bumps the device if ``generation`` is current and returns the new generations,
+        ``None`` if the token was revoked or already rotated.
+        """
+        if not await self.is_current(user_id, device_id, generation):
+            return None
+        await self.bump_device(user_id, device_id)
+        return await self.current(user_id, device_id)
+
+    def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+# KEYS: the counter. ARGV: ttl, channel, local name.
+_BUMP_SCRIPT = """
+local generation = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('PUBLISH', ARGV[2], ARGV[3] .. '=' .. generation)
+return generation
+"""
+
+# KEYS: user and device counters. ARGV: their expected values, ttl, channel, device local name.
+_ROTATE_SCRIPT = """
+local user = tonumber(redis.call('GET', KEYS[1]) or '0')
+local device = tonumber(redis.call('GET', KEYS[2]) or '0')
+if user ~= tonumber(ARGV[1]) or device ~= tonumber(ARGV[2]) then
+    return -1
+end
+device = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if user > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+redis.call('PUBLISH', ARGV[4], ARGV[5] .. '=' .. device)
+return device
+"""
+
+
+class RedisTokenGenerations:
+    """
+    ``MemoryTokenGenerations`` kept in Redis and shared by all workers. Each
+    worker answers ``is_current`` from a local copy; bumps are published and
+    applied to every copy, a miss reads Redis once.
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            *,
+            ttl: int,
+            local_ttl: float,
+            maxsize: int,
+            prefix: str = 'auth:gen:',
+            channel: str = 'auth:generations',
+        ) -> None:
+        self._redis = redis
+        self._ttl = ttl
+        self._prefix = prefix
+        self._channel = channel
+        self._local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self._bump_script = redis.register_script(_BUMP_SCRIPT)
+        self._rotate_script = redis.register_script(_ROTATE_SCRIPT)
+        self._listener: asyncio.Task | None = None
+
+    async def current(self, user_id, device_id: str) -> list[int]:
+        names = (_user_key(user_id), _device_key(user_id, device_id))
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.mget([self._prefix + name for name in names])
+            for name in names:
+                # A no-op on counters that were never bumped.
+                pipe.expire(self._prefix + name, self._ttl)
+            values, *_ = await pipe.execute()
+        generation = [int(value or 0) for value in values]
+        for name, value in zip(names, generation):
+            self._apply(name, value)
+        return generation
+
+    async def is_current(self, user_id, device_id: str, generation: list[int]) -> bool:
+        names = (_user_key(user_id), _device_key(user_id, device_id))
+        current = [self._local.get(name) for name in names]
+        if MISSING in current:
+            values = await self._redis.mget([self._prefix + name for name in names])
+            for name, value in zip(names, values):
+                self._apply(name, int(value or 0))
+            current = [self._local.get(name, 0) for name in names]
+        return generation == current
+
+    async def bump_device(self, user_id, device_id: str) -> None:
+        await self._bump(_device_key(user_id, device_id))
+
+    async def bump_user(self, user_id) -> None:
+        await self._bump(_user_key(user_id))
+
+    async def _bump(self, name: str) -> None:
+        generation = await self._bump_script(keys=[self._prefix + name], args=[self._ttl, self._channel, name])
+        self._apply(name, int(generation))
+
+    def _apply(self, name: str, generation: int) -> None:
+        # Counters only grow: a late message must not bring back an older value.
+        current = self._local.get(name)
+        if current is MISSING or current < generation:
+            self._local.set(name, generation)
+
+    async def rotate(self, user_id, device_id: str, generation: list[int]) -> list[int] | None:
+        user_name, device_name = _user_key(user_id), _device_key(user_id, device_id)
+        device = int(await self._rotate_script(
+            keys=[self._prefix + user_name, self._prefix + device_name],
+            args=[*generation, self._ttl, self._channel, device_name],
+        ))
+        if device < 0:
+            return None
+        self._apply(device_name, device)
+        return [generation[0], device]
+
+    def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen(), name='token-generations-listener')
+
+    async def stop(self) -> None:
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        try:
+            await self._listener
+        except asyncio.CancelledError:
+            pass
+        self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self._channel)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            name, _, generation = message['data'].rpartition('=')
+                            self._apply(name, int(generation))
+            except RedisError:
+                logger.warning("Token generations: listener lost redis, reconnecting", exc_info=True)
+                # Bumps published meanwhile are missed, so forget what may be stale.
+                self._local.clear()
+                await asyncio.sleep(1)
+
+
+TokenGenerations = MemoryTokenGenerations | RedisTokenGenerations
+
+
+@lru_cache
+def get_token_generations() -> TokenGenerations | None:
+    settings = get_settings()
+    if settings.TOKEN_REVOCATION_MODE == RevocationMode.JTI:
+        return None
+    if settings.TOKEN_REVOCATION_MODE != RevocationMode.GENERATION:
+        raise ValueError(f"Unknown token revocation mode: {settings.TOKEN_REVOCATION_MODE}")
+
+    redis = get_redis()
+    if redis is None:
+        raise ValueError("TOKEN_REVOCATION_MODE=generation needs REDIS_ENABLED")
+    return RedisTokenGenerations(
+        redis,
+        ttl=max(settings.ACCESS_TOKEN_TTL, settings.REFRESH_TOKEN_TTL),
+        local_ttl=settings.AUTH_PAYLOAD_CACHE_TTL,
+        maxsize=settings.AUTH_CACHE_SIZE,
+    )
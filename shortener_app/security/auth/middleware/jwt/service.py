@@ -1,5 +1,5 @@
 from typing import Annotated
-from jwt import decode, InvalidTokenError
+from jwt import InvalidTokenError
 from fastapi import Depends, Request, Security
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import select
@@ -9,10 +9,12 @@ from fastapi.security.api_key import APIKeyHeader
 from shortener_app.database import get_db
 from shortener_app.user.model import APIUser
 from shortener_app.security.exceptions import JsonHTTPException
-from shortener_app.config import get_settings
+from shortener_app.monitoring import AUTH_CACHE_LOOKUPS
 from ...middleware.jwt.errors import AccessError
 from ...middleware.jwt.base.token_types import TokenType
-from ...middleware.jwt.utils import check_revoked
+from ...middleware.jwt.utils import check_revoked, get_jwt_auth
+from ...middleware.jwt.cache import get_auth_cache
+from ...middleware.jwt.generations import get_token_generations
 
 
 def __try_to_get_clear_token(authorization_header: str|None) -> str:
@@ -33,31 +35,46 @@ async def check_access_token(
 ) -> str:
     # clear_token = token
     clear_token = __try_to_get_clear_token(authorization_header=authorization_header)
+    auth_cache = get_auth_cache()
+    token_generations = get_token_generations()
 
-    try:
-        payload = decode(jwt=clear_token, key=get_settings().jwt_config.secret, algorithms=['HS256', 'RS256'])
-        if payload['type'] != TokenType.ACCESS.value:
-            raise JsonHTTPException(content=dict(AccessError.get_incorrect_token_type_error()), status_code=403)
-    except InvalidTokenError:
-        raise JsonHTTPException(content=dict(AccessError.get_invalid_token_error()), status_code=403)
-
-    # session: AsyncSession = await anext(get_db())
-    if await check_revoked(payload['jti'], session=session):
-        raise JsonHTTPException(content=dict(AccessError.get_token_revoked_error()), status_code=403)
-
-    result = await (
-        session
-        .execute(
-            select(APIUser)
-            .where(APIUser.id == payload["sub"])
+    payload = auth_cache.get_payload(clear_token)
+    AUTH_CACHE_LOOKUPS.labels(cache='payload', result='miss' if payload is None else 'hit').inc()
+    if payload is None:
+        try:
+            payload = get_jwt_auth().verify_token(clear_token)
+            if payload['type'] != TokenType.ACCESS.value:
+                raise JsonHTTPException(content=dict(AccessError.get_incorrect_token_type_error()), status_code=403)
+        except InvalidTokenError:
+            raise JsonHTTPException(content=dict(AccessError.get_invalid_token_error()), status_code=403)
+
+        # session: AsyncSession = await anext(get_db())
+        # Tokens with generations are checked below, on every request, without the database.
+        if token_generations is None or 'gen' not in payload:
+            if auth_cache.is_revoked(payload['jti']) or await check_revoked(payload['jti'], session=session):
+                raise JsonHTTPException(content=dict(AccessError.get_token_revoked_error()), status_code=403)
+        auth_cache.put_payload(clear_token, payload)
+
+    if token_generations is not None and 'gen' in payload:
+        if not await token_generations.is_current(payload['sub'], payload['device_id'], payload['gen']):
+            raise JsonHTTPException(content=dict(AccessError.get_token_revoked_error()), status_code=403)
+
+    user = auth_cache.get_user(payload['sub'])
+    AUTH_CACHE_LOOKUPS.labels(cache='user', result='miss' if user is None else 'hit').inc()
+    if user is None:
+        result = await (
+            session
+            .execute(
+                select(APIUser)
+                .where(APIUser.id == payload["sub"])
+            )
         )
-    )
-    user = result.scalar_one_or_none()
-    # user = await APIUser.filter(id=payload['sub']).first()
-    if not user:
-        raise JsonHTTPException(content=dict(AccessError.get_token_owner_not_found()), status_code=403)
+        user = result.scalar_one_or_none()
+        # user = await APIUser.filter(id=payload['sub']).first()
+        if not user:
+            raise JsonHTTPException(content=dict(AccessError.get_token_owner_not_found()), status_code=403)
+        auth_cache.put_user(payload['sub'], user)
 
     request.state.user = user
     request.state.device_id = payload['device_id']
-    await session.aclose()
     return authorization_header
\ No newline at end of file
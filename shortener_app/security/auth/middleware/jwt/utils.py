@@ -1,12 +1,20 @@
 import uuid
+from functools import lru_cache
+
 from jwt.exceptions import InvalidTokenError
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from shortener_app.config import get_settings
 from .base.auth import JWTAuth
 from shortener_app.security.auth.model import IssuedJWTToken
 
 
+@lru_cache
+def get_jwt_auth() -> JWTAuth:
+    return JWTAuth(config=get_settings().jwt_config)
+
+
 def generate_device_id() -> str:
     return str(uuid.uuid4())
 
@@ -1,6 +1,8 @@
+import datetime
+
 from shortener_app.database import Model, str_36
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey
+from sqlalchemy import DateTime, ForeignKey, Index
 
 
 class IssuedJWTToken(Model):
@@ -10,9 +12,16 @@ class IssuedJWTToken(Model):
     subject_id: Mapped[int] = mapped_column(ForeignKey('api_user.id', ondelete='CASCADE'), nullable=False)
     device_id: Mapped[str_36]
     revoked: Mapped[bool] = mapped_column(default=False)
+    # The token's exp. Past it the row only takes space, TokenPruner deletes it.
+    expired_time: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), index=True)
 
     subject = relationship("APIUser", back_populates="tokens")
 
+    # Lookups by (jti, revoked) are already served by the primary key.
+    __table_args__ = (
+        Index("ix_issued_jwt_token_subject_id_device_id", "subject_id", "device_id"),
+    )
+
 
     def __str__(self) -> str:
         return f'{self.subject}: {self.jti}'
\ No newline at end of file
@@ -0,0 +1,113 @@
+import asyncio
+import datetime
+import logging
+import time
+from functools import lru_cache
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from shortener_app.config import get_settings
+from shortener_app.database import async_session
+from shortener_app.monitoring import ISSUED_TOKENS_ROWS, TOKEN_PRUNE_DELETED, TOKEN_PRUNE_SECONDS
+from .model import IssuedJWTToken
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenPruner:
+    """
+    Periodically deletes ``issued_jwt_token`` rows of expired tokens, in batches
+    of ``batch_size`` committed one by one so that no sweep holds long locks.
+    Only expired rows go: a revoked row of a live token is what keeps it revoked.
+    Every worker runs one, the deletes do not conflict.
+    """
+
+    def __init__(
+            self,
+            session_factory: async_sessionmaker[AsyncSession],
+            *,
+            interval: float,
+            batch_size: int,
+            grace: datetime.timedelta,
+        ) -> None:
+        self._session_factory = session_factory
+        self._interval = interval
+        self._batch_size = batch_size
+        self._grace = grace
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='token-pruner')
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Token pruning failed, retrying on the next tick")
+            await asyncio.sleep(self._interval)
+
+    async def sweep(self) -> int:
+        started = time.perf_counter()
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - self._grace
+        deleted = 0
+        while True:
+            async with self._session_factory() as session:
+                expired = (
+                    select(IssuedJWTToken.jti)
+                    .where(IssuedJWTToken.expired_time < cutoff)
+                    .limit(self._batch_size)
+                )
+                result = await session.execute(
+                    delete(IssuedJWTToken)
+                    .where(IssuedJWTToken.jti.in_(expired))
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+            deleted += result.rowcount
+            TOKEN_PRUNE_DELETED.inc(result.rowcount)
+            if result.rowcount < self._batch_size:
+                break
+            # Let requests waiting for a connection in between.
+            await asyncio.sleep(0)
+
+        TOKEN_PRUNE_SECONDS.observe(time.perf_counter() - started)
+        ISSUED_TOKENS_ROWS.set(await self.count_rows())
+        return deleted
+
+    async def count_rows(self) -> int:
+        async with self._session_factory() as session:
+            if session.bind.dialect.name == 'postgresql':
+                # count(*) reads the whole table, the planner estimate is enough here.
+                result = await session.execute(
+                    text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'issued_jwt_token'::regclass")
+                )
+            else:
+                result = await session.execute(select(func.count()).select_from(IssuedJWTToken))
+            return max(result.scalar_one(), 0)
+
+
+@lru_cache
+def get_token_pruner() -> TokenPruner | None:
+    settings = get_settings()
+    if not settings.TOKEN_PRUNE_ENABLED:
+        return None
+    return TokenPruner(
+        async_session,
+        interval=settings.TOKEN_PRUNE_INTERVAL,
+        batch_size=settings.TOKEN_PRUNE_BATCH_SIZE,
+        grace=datetime.timedelta(seconds=settings.TOKEN_PRUNE_GRACE),
+    )
@@ -1,47 +1,61 @@
-from fastapi import Request
-from sqlalchemy import select, update
+import datetime
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from shortener_app.security.auth.errors import AuthError
 from shortener_app.security.auth.model import IssuedJWTToken
 from shortener_app.security.auth.dto import TokensDTO, UserCredentialsDTO
-from shortener_app.security.utils import get_sha256_hash
+from shortener_app.cache import MISSING
+from shortener_app.security.passwords import PasswordHasher
 from shortener_app.database.models import APIUser
 from .middleware.jwt.base.auth import JWTAuth
 from .middleware.jwt.base.token_types import TokenType
+from .middleware.jwt.cache import AuthCache
 from .middleware.jwt.errors import AccessError
-from .middleware.jwt.utils import check_revoked, generate_device_id, try_decode_token
+from .middleware.jwt.generations import TokenGenerations
+from .middleware.jwt.utils import generate_device_id, try_decode_token
 from .errors import ErrorObj
 
 
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
 class AuthService:
-    def __init__(self, jwt_auth: JWTAuth) -> None:
+    def __init__(
+            self,
+            jwt_auth: JWTAuth,
+            auth_cache: AuthCache,
+            password_hasher: PasswordHasher,
+            token_generations: TokenGenerations | None = None,
+        ) -> None:
         self._jwt_auth = jwt_auth
+        self._auth_cache = auth_cache
+        self._password_hasher = password_hasher
+        # Set in the 'generation' revocation mode, tokens are then not stored.
+        self._token_generations = token_generations
 
     async def register(
             self, 
             body: UserCredentialsDTO, 
             session: AsyncSession
         ) -> tuple[TokensDTO, None] | tuple[None, ErrorObj]:
-        result = await (
-            session
-            .execute(
-                select(APIUser)
-                .where(APIUser.email == body.email)
-            )
-        )
-        if result.scalar_one_or_none():
-            return None, AuthError.get_email_occupied_error()
-
         user = APIUser(
             email=body.email, 
-            password_hash=get_sha256_hash(line=body.password)
+            password_hash=await self._password_hasher.hash(body.password)
         )
         session.add(user)
-        await session.commit()
-        await session.refresh(user)
+        # The unique email index decides, no lookup beforehand.
+        try:
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            return None, AuthError.get_email_occupied_error()
+        self._auth_cache.forget_email(body.email)
 
-        access_token, refresh_token = await self._issue_tokens_for_user(user=user, session=session)
+        access_token, refresh_token = await self._issue_tokens_for_user(user_id=user.id, session=session)
 
         return TokensDTO(access_token=access_token, refresh_token=refresh_token), None
 
@@ -50,48 +64,67 @@ class AuthService:
             body: UserCredentialsDTO, 
             session: AsyncSession
         ) -> tuple[TokensDTO, None] | tuple[None, ErrorObj]:
-        result = await (
-            session
-            .execute(
-                select(APIUser)
-                .where(
-                    APIUser.email == body.email, 
-                    APIUser.password_hash == get_sha256_hash(line=body.password)
-                )
-            )
-        )
-        user = result.scalar_one_or_none()
-        
-        if not user:
+        user = await self._get_user_by_email(email=body.email, session=session)
+
+        if user is None:
+            await self._password_hasher.verify_unknown(body.password)
+            return None, AuthError.get_invalid_credentials_error()
+        if not await self._password_hasher.verify(body.password, user.password_hash):
             return None, AuthError.get_invalid_credentials_error()
 
-        access_token, refresh_token = await self._issue_tokens_for_user(user=user, session=session)
+        if self._password_hasher.needs_rehash(user.password_hash):
+            # Committed together with the new tokens.
+            await session.execute(
+                update(APIUser)
+                .where(APIUser.id == user.id)
+                .values(password_hash=await self._password_hasher.hash(body.password))
+            )
+            self._auth_cache.forget_email(body.email)
+
+        access_token, refresh_token = await self._issue_tokens_for_user(user_id=user.id, session=session)
 
         return TokensDTO(access_token=access_token, refresh_token=refresh_token), None
 
+    async def _get_user_by_email(self, email: str, session: AsyncSession) -> APIUser | None:
+        user = self._auth_cache.get_user_by_email(email)
+        if user is not MISSING:
+            return user
+
+        result = await session.execute(select(APIUser).where(APIUser.email == email))
+        user = result.scalar_one_or_none()
+        self._auth_cache.put_user_by_email(email, user)
+        return user
+
     async def logout(
             self, 
             user: APIUser, 
             device_id: str, 
             session: AsyncSession
         ) -> None:
-        await (
+        if self._token_generations is not None:
+            await self._token_generations.bump_device(user.id, device_id)
+            return
+
+        result = await (
             session
             .execute(
                 update(IssuedJWTToken)
                 .where(
                     IssuedJWTToken.subject_id == user.id, 
-                    IssuedJWTToken.device_id == device_id)
+                    IssuedJWTToken.device_id == device_id,
+                    IssuedJWTToken.revoked == False,
+                    IssuedJWTToken.expired_time > _utcnow())
                 .values(revoked = True)
+                .returning(IssuedJWTToken.jti)
             )
         )
+        revoked = result.scalars().all()
         await session.commit()
+        await self._auth_cache.revoke(revoked)
         # await user.tokens.filter(device_id=device_id).update(revoked=True)
 
     async def update_tokens(
         self, 
-        # user: APIUser,
-        request: Request,
         refresh_token: str, 
         session: AsyncSession,
     ) -> tuple[TokensDTO, None] | tuple[None, ErrorObj]:
@@ -102,69 +135,110 @@ class AuthService:
 
         if payload['type'] != TokenType.REFRESH.value:
             return None, AccessError.get_incorrect_token_type_error()
-        
+
+        subject_id = int(payload['sub'])
+        device_id = payload['device_id']
+        if self._token_generations is not None and 'gen' in payload:
+            return await self._rotate_generation(subject_id, device_id, payload['gen'], session)
+
+        # One transaction, two statements: revoke the device's live tokens, then
+        # issue the new pair. The presented token has to be among the revoked ones.
         result = await (
             session
             .execute(
-                select(APIUser)
-                .where(APIUser.id==payload["sub"])
+                update(IssuedJWTToken)
+                .where(
+                    IssuedJWTToken.subject_id == subject_id, 
+                    IssuedJWTToken.device_id == device_id,
+                    IssuedJWTToken.revoked == False,
+                    IssuedJWTToken.expired_time > _utcnow())
+                .values(revoked = True)
+                .returning(IssuedJWTToken.jti)
             )
         )
-        user = result.scalar_one_or_none()
+        revoked = result.scalars().all()
 
-        if user is None:
-            return None, AccessError.get_incorrect_token_type_error()
         # Если обновленный токен пробуют обновить ещё раз,
         # нужно отменить все выущенные на пользователя токены и вернуть ошибку
-        if await check_revoked(payload['jti'], session=session):
-            await (
+        if payload['jti'] not in revoked:
+            result = await (
                 session
                 .execute(
                     update(IssuedJWTToken)
-                    .where(IssuedJWTToken.subject_id == user.id)
+                    .where(
+                        IssuedJWTToken.subject_id == subject_id,
+                        IssuedJWTToken.revoked == False,
+                        IssuedJWTToken.expired_time > _utcnow())
                     .values(revoked = True)
+                    .returning(IssuedJWTToken.jti)
                 )
             )
+            revoked += result.scalars().all()
             await session.commit()
+            await self._auth_cache.revoke(revoked)
+            if self._token_generations is not None:
+                await self._token_generations.bump_user(subject_id)
             return None, AccessError.get_token_already_revoked_error()
 
-        device_id = payload['device_id']
-        await (
-            session
-            .execute(
-                update(IssuedJWTToken)
-                .where(
-                    IssuedJWTToken.subject_id == user.id, 
-                    IssuedJWTToken.device_id == device_id)
-                .values(revoked = True)
-            )
-        )
-        access_token, refresh_token = await self._issue_tokens_for_user(user=user, session=session, device_id=device_id)
-        request.state.user = user
+        access_token, refresh_token = await self._issue_tokens_for_user(
+            user_id=subject_id, session=session, device_id=device_id)
+        await self._auth_cache.revoke(revoked)
+
+        return TokensDTO(access_token=access_token, refresh_token=refresh_token), None
+
+    async def _rotate_generation(
+            self,
+            subject_id: int,
+            device_id: str,
+            generation: list[int],
+            session: AsyncSession,
+        ) -> tuple[TokensDTO, None] | tuple[None, ErrorObj]:
+        generation = await self._token_generations.rotate(subject_id, device_id, generation)
+        # Reuse of a rotated or revoked refresh token: revoke everything of the user.
+        if generation is None:
+            await self._token_generations.bump_user(subject_id)
+            return None, AccessError.get_token_already_revoked_error()
+
+        access_token, refresh_token = await self._issue_tokens_for_user(
+            user_id=subject_id, session=session, device_id=device_id, generation=generation)
 
         return TokensDTO(access_token=access_token, refresh_token=refresh_token), None
 
     async def _issue_tokens_for_user(
             self, 
-            user: APIUser, 
+            user_id: int, 
             session: AsyncSession,
-            device_id: str = generate_device_id(),
+            device_id: str | None = None,
+            generation: list[int] | None = None,
         ) -> tuple[str, str]:
-        access_token = self._jwt_auth.generate_access_token(subject=str(user.id), payload={'device_id': device_id})
-        refresh_token = self._jwt_auth.generate_refresh_token(subject=str(user.id), payload={'device_id': device_id})
-
-        raw_tokens = [self._jwt_auth.get_raw_jwt(token) for token in [access_token, refresh_token]]
-        new_tokens = [
-                IssuedJWTToken(
-                    subject_id=user.id,
-                    jti=token_payload['jti'],
+        """
+        Signs an access/refresh pair, records both in one INSERT and commits.
+        In the 'generation' mode the pair carries the current generations instead.
+        """
+        device_id = device_id or generate_device_id()
+        payload = {'device_id': device_id}
+        if self._token_generations is not None:
+            payload['gen'] = generation or await self._token_generations.current(user_id, device_id)
+        access_token, access_claims = self._jwt_auth.issue_access_token(subject=str(user_id), payload=payload)
+        refresh_token, refresh_claims = self._jwt_auth.issue_refresh_token(subject=str(user_id), payload=payload)
+
+        if self._token_generations is not None:
+            await session.commit()
+            return access_token, refresh_token
+
+        await session.execute(
+            insert(IssuedJWTToken)
+            .values([
+                dict(
+                    subject_id=user_id,
+                    jti=claims['jti'],
                     device_id=device_id,
-                    # expired_time=token_payload['exp']
+                    revoked=False,
+                    expired_time=datetime.datetime.fromtimestamp(claims['exp'], tz=datetime.timezone.utc),
                 )
-                for token_payload in raw_tokens
-            ]
-        session.add_all(new_tokens)
+                for claims in (access_claims, refresh_claims)
+            ])
+        )
         await session.commit()
-        
 
-        return access_token, refresh_token
\ No newline at end of file
+        return access_token, refresh_token
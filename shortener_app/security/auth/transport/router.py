@@ -4,22 +4,33 @@ from fastapi import APIRouter, Depends, Request, Security
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from shortener_app.security.errors import get_bad_request_error_response
+from shortener_app.security.errors import get_bad_request_error_response, get_too_many_requests_error_response
+from shortener_app.security.passwords import get_password_hasher
 from shortener_app.security.response import ErrorOut, SuccessOut
 from shortener_app.config import get_settings
 from shortener_app.database.config import get_db
 from ..middleware.jwt.service import check_access_token
+from ..errors import AuthError
+from ..limiter import LoginLimiter, get_login_limiter
 from ..service import AuthService
-from ..middleware.jwt.base.auth import JWTAuth
+from ..middleware.jwt.utils import get_jwt_auth
+from ..middleware.jwt.cache import get_auth_cache
+from ..middleware.jwt.generations import get_token_generations
 from .request import UpdateTokensIn, UserCredentialsIn
 from .response import TokensOut
 
 
 auth_router = APIRouter(prefix='/auth', tags=['auth'])
+jwks_router = APIRouter(tags=['auth'])
 
 @lru_cache
 def get_auth_service() -> AuthService:
-    return AuthService(jwt_auth=JWTAuth(config=get_settings().jwt_config))
+    return AuthService(
+        jwt_auth=get_jwt_auth(),
+        auth_cache=get_auth_cache(),
+        password_hasher=get_password_hasher(),
+        token_generations=get_token_generations(),
+    )
 
 
 @auth_router.post(
@@ -27,14 +38,20 @@ def get_auth_service() -> AuthService:
     responses={
         200: {'model': TokensOut},
         400: {'model': ErrorOut},
+        429: {'model': ErrorOut},
     },
 )
 async def register(
     request: Request,
     body: UserCredentialsIn,
     auth_service: AuthService = Depends(get_auth_service),
+    login_limiter: LoginLimiter = Depends(get_login_limiter),
     db: AsyncSession = Depends(get_db),
 ) -> TokensOut:
+    retry_after = await login_limiter.check(request)
+    if retry_after:
+        return get_too_many_requests_error_response(AuthError.get_too_many_attempts_error(), retry_after)
+
     data, error = await auth_service.register(body=body, session=db)
 
     if error:
@@ -48,14 +65,20 @@ async def register(
     responses={
         200: {'model': TokensOut},
         400: {'model': ErrorOut},
+        429: {'model': ErrorOut},
     },
 )
 async def login(
     request: Request,
     body: UserCredentialsIn,
     auth_service: AuthService = Depends(get_auth_service),
+    login_limiter: LoginLimiter = Depends(get_login_limiter),
     db: AsyncSession = Depends(get_db),
 ) -> TokensOut:
+    retry_after = await login_limiter.check(request, email=body.email)
+    if retry_after:
+        return get_too_many_requests_error_response(AuthError.get_too_many_attempts_error(), retry_after)
+
     data, error = await auth_service.login(body=body, session=db)
 
     if error:
@@ -97,11 +120,19 @@ async def update_tokens(
 ) -> TokensOut:
     data, error = await auth_service.update_tokens(
         # user=request.state.user, 
-        request=request,
         **body.model_dump(), 
         session=db)
 
     if error:
         return get_bad_request_error_response(error=error)
 
-    return data
\ No newline at end of file
+    return data
+
+
+@jwks_router.get(path='/.well-known/jwks.json')
+async def jwks() -> JSONResponse:
+    # Public keys for services verifying our tokens locally.
+    return JSONResponse(
+        content=get_jwt_auth().jwks,
+        headers={'Cache-Control': f'public, max-age={get_settings().JWKS_MAX_AGE}'},
+    )
@@ -28,4 +28,10 @@ def get_error_response(error: ErrorObj, status: int) -> JSONResponse:
 
 
 def get_bad_request_error_response(error: ErrorObj) -> JSONResponse:
-    return get_error_response(error, status=400)
\ No newline at end of file
+    return get_error_response(error, status=400)
+
+
+def get_too_many_requests_error_response(error: ErrorObj, retry_after: int) -> JSONResponse:
+    response = get_error_response(error, status=429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
\ No newline at end of file
@@ -0,0 +1,84 @@
+import asyncio
+import hashlib
+import hmac
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from shortener_app.config import get_settings
+from .utils import get_sha256_hash
+
+
+class PasswordScheme:
+    SHA256 = 'sha256'
+    PBKDF2_SHA256 = 'pbkdf2_sha256'
+
+
+class PasswordHasher:
+    """
+    Hashes and checks passwords. Bare sha256 digests, the format stored so far,
+    stay valid; with ``pbkdf2_sha256`` new hashes are stored as
+    ``pbkdf2_sha256$<iterations>$<salt>$<hash>`` and ``needs_rehash`` tells
+    which old ones to upgrade. Slow hashes run in a bounded thread pool,
+    off the event loop.
+    """
+
+    def __init__(self, scheme: str, iterations: int, workers: int) -> None:
+        if scheme not in (PasswordScheme.SHA256, PasswordScheme.PBKDF2_SHA256):
+            raise ValueError(f"Unknown password hash scheme: {scheme}")
+        self._scheme = scheme
+        self._iterations = iterations
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._dummy_hash: str | None = None
+
+    async def hash(self, password: str) -> str:
+        if self._scheme == PasswordScheme.SHA256:
+            return get_sha256_hash(line=password)
+        return await self._run(self._pbkdf2, password, secrets.token_hex(16), self._iterations)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        scheme, _, params = password_hash.partition('$')
+        if scheme != PasswordScheme.PBKDF2_SHA256:
+            # A single sha256 is cheaper than the hop to a thread.
+            return hmac.compare_digest(get_sha256_hash(line=password), password_hash)
+
+        try:
+            iterations, salt, _ = params.split('$')
+            iterations = int(iterations)
+        except ValueError:
+            return False
+        computed = await self._run(self._pbkdf2, password, salt, iterations)
+        return hmac.compare_digest(computed, password_hash)
+
+    async def verify_unknown(self, password: str) -> bool:
+        """
+        Takes as long as ``verify`` for a user that exists, so that the response
+        time does not tell which emails are registered. Always ``False``.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.hash(secrets.token_hex(16))
+        await self.verify(password, self._dummy_hash)
+        return False
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        if self._scheme == PasswordScheme.SHA256:
+            return False
+        return not password_hash.startswith(f'{PasswordScheme.PBKDF2_SHA256}${self._iterations}$')
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    @staticmethod
+    def _pbkdf2(password: str, salt: str, iterations: int) -> str:
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations)
+        return f'{PasswordScheme.PBKDF2_SHA256}${iterations}${salt}${digest.hex()}'
+
+
+@lru_cache
+def get_password_hasher() -> PasswordHasher:
+    settings = get_settings()
+    return PasswordHasher(
+        scheme=settings.PASSWORD_HASH_SCHEME,
+        iterations=settings.PASSWORD_HASH_ITERATIONS,
+        workers=settings.PASSWORD_HASH_WORKERS,
+    )